@@ -126,7 +126,7 @@ def check_student_database():
             pkl_path = os.path.join(students_path, pkl)
             size_mb = os.path.getsize(pkl_path) / (1024 * 1024)  # Chuyển sang MB
             print(f"   - {pkl} ({size_mb:.2f} MB)")
-        print(f"\n   💡 TIP: If recognition is inaccurate, delete cache:")
+        print(f"\n   💡 Changed images are detected at startup (CHECK_IMAGES_ON_STARTUP); to force a rebuild:")
         print(f"       Remove-Item \"{students_path}\\*.pkl\" -Force")
     else:
         # Không có file cache
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Utility script to check the import-time budget of the entry points
+Script tiện ích kiểm tra thời gian import của main.py và main_gui.py
+- Chạy `python -X importtime` trong tiến trình mới (không dùng cache module của tiến trình hiện tại)
+- Báo cáo tổng thời gian, các module import chậm nhất và các thư viện nặng bị import quá sớm
+- Trả mã thoát 1 khi vượt ngân sách hoặc khi deepface/tensorflow/cv2/pandas bị import lúc khởi động
+"""
+# Import các thư viện cần thiết
+import os  # Thao tác với file/thư mục
+import subprocess  # Chạy tiến trình con
+import sys  # Thao tác với hệ thống
+
+# Thư mục gốc của project (để tiến trình con import được các module)
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Ngân sách thời gian import (ms) cho từng điểm khởi động
+IMPORT_BUDGET_MS = {
+    'main': 500,
+    'main_gui': 500
+}
+
+# Các thư viện nặng chỉ được import khi thật sự dùng
+HEAVY_MODULES = ('deepface', 'tensorflow', 'keras', 'cv2', 'pandas')
+
+# Số lần đo (lấy lần nhanh nhất để giảm nhiễu)
+RUNS = 3
+
+
+def measure_import(module_name: str):
+    """
+    Import a module in a fresh interpreter and parse the -X importtime report
+    Import module trong một tiến trình Python mới và đọc báo cáo -X importtime
+
+    Returns:
+        Tuple (tổng thời gian ms, {module: thời gian tích lũy ms}) hoặc (None, lỗi) nếu import thất bại
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        # Dòng cuối của traceback là lỗi thật sự
+        lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        return None, lines[-1] if lines else f"exit code {result.returncode}"
+
+    # Mỗi dòng: "import time: self [us] | cumulative | imported package"
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        modules[name] = int(parts[1]) / 1000.0
+
+    return modules.get(module_name, 0.0), modules
+
+
+def check_import_time():
+    """
+    Check every entry point against its budget and report regressions
+    Kiểm tra từng điểm khởi động với ngân sách và báo cáo các vi phạm
+    """
+    # In tiêu đề báo cáo
+    print("=" * 60)
+    print("⏱️  IMPORT TIME REPORT")
+    print("=" * 60)
+
+    regressions = []
+    for module_name, budget_ms in IMPORT_BUDGET_MS.items():
+        print(f"\n{module_name}.py (budget {budget_ms} ms)")
+        print("-" * 60)
+
+        # Đo nhiều lần, giữ lần nhanh nhất
+        best_total, best_modules = None, {}
+        for _ in range(RUNS):
+            total_ms, modules = measure_import(module_name)
+            if total_ms is None:
+                print(f"⚠️  Import failed: {modules}")
+                regressions.append(f"{module_name}: import failed")
+                break
+            if best_total is None or total_ms < best_total:
+                best_total, best_modules = total_ms, modules
+        if best_total is None:
+            continue
+
+        # Các module tốn thời gian nhất (thời gian tích lũy, gồm cả module con)
+        slowest = sorted(
+            ((name, ms) for name, ms in best_modules.items() if name != module_name),
+            key=lambda item: item[1],
+            reverse=True
+        )[:10]
+        for name, ms in slowest:
+            print(f"  {ms:>9.1f} ms  {name}")
+
+        # Thư viện nặng bị import ngay lúc khởi động
+        heavy = sorted({
+            name.split('.')[0] for name in best_modules
+            if name.split('.')[0] in HEAVY_MODULES
+        })
+
+        status = "✓" if best_total <= budget_ms and not heavy else "✗"
+        print(f"\n{status} Total: {best_total:.1f} ms / {budget_ms} ms")
+        if best_total > budget_ms:
+            regressions.append(f"{module_name}: {best_total:.1f} ms > {budget_ms} ms")
+        if heavy:
+            print(f"✗ Heavy modules imported at startup: {', '.join(heavy)}")
+            regressions.append(f"{module_name}: imports {', '.join(heavy)} at startup")
+
+    print("\n" + "=" * 60)
+    if regressions:
+        print("❌ Import-time regressions:")
+        for regression in regressions:
+            print(f"   - {regression}")
+    else:
+        print("✅ All entry points are within budget")
+    print("=" * 60)
+    return not regressions
+
+
+if __name__ == "__main__":
+    # Mã thoát khác 0 khi có vi phạm (dùng được trong CI)
+    sys.exit(0 if check_import_time() else 1)
@@ -10,8 +10,10 @@ echo to force fresh face recognition.
 echo.
 echo Use this when:
 echo   - Recognition is inaccurate
-echo   - After adding new images
-echo   - Weekly maintenance
+echo   - After changing the model
+echo.
+echo Added/changed/removed images are detected
+echo automatically at startup (CHECK_IMAGES_ON_STARTUP).
 echo.
 echo =========================================
 echo.
@@ -22,6 +24,7 @@ if /i "%confirm%"=="Y" (
     echo.
     echo Deleting cache files...
     del /F /Q "data\students\*.pkl" 2>nul
+    del /F /Q "data\gallery\*.npz" 2>nul
 
     if %ERRORLEVEL% EQU 0 (
         echo.
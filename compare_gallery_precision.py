@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Utility script to compare quantized gallery storage against float32
+Script tiện ích so sánh độ chính xác tìm kiếm giữa gallery float16/int8 và float32
+- Dùng chính các embedding đã đăng ký của model hiện tại
+- Báo cáo recall@1, recall@k và dung lượng của từng kiểu lưu trữ
+"""
+# Import các thư viện cần thiết
+import os  # Thao tác với file/thư mục
+import sys  # Thao tác với hệ thống
+
+# Thêm thư mục gốc của project vào path để import được các module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Import cấu hình và các thành phần gallery
+from src.config.config import config
+from src.factories.factory import FaceRecognitionStrategyFactory
+from src.gallery import quantized_store
+
+
+def compare_gallery_precision(model_name: str = None, top_k: int = None):
+    """
+    Compare top-k recall of every quantized store type against float32
+    So sánh recall top-k của từng kiểu lưu trữ lượng tử với float32
+    """
+    model_name = model_name or config.DEFAULT_MODEL
+    top_k = top_k or config.GALLERY_TOP_K
+
+    # In tiêu đề báo cáo
+    print("=" * 60)
+    print(f"📏 GALLERY PRECISION REPORT ({model_name})")
+    print("=" * 60)
+
+    # Nạp gallery của model (dùng cache embedding nếu có)
+    strategy = FaceRecognitionStrategyFactory.create_strategy(model_name)
+    vectors = strategy.get_gallery().live_vectors()
+
+    if vectors.shape[0] == 0:
+        print("⚠️  Gallery is empty. Register students first.")
+        return
+
+    print(f"\nEmbeddings: {vectors.shape[0]} x {vectors.shape[1]}")
+    print(f"Current store: {config.GALLERY_STORE_DTYPE}\n")
+    print(f"{'Store':<10}{'Recall@1':>10}{f'Recall@{top_k}':>12}{'Size (MB)':>12}{'vs float32':>12}")
+    print("-" * 56)
+
+    for dtype in quantized_store.STORE_DTYPES:
+        report = quantized_store.measure_recall(vectors, dtype, top_k=top_k)
+        ratio = report['quantized_mb'] / report['float32_mb'] if report['float32_mb'] else 0.0
+        print(f"{dtype:<10}{report['recall_at_1']:>10.2%}{report['recall_at_k']:>12.2%}"
+              f"{report['quantized_mb']:>12.2f}{ratio:>12.0%}")
+
+    print(f"{'float32':<10}{1:>10.2%}{1:>12.2%}{report['float32_mb']:>12.2f}{1:>12.0%}")
+    print("\n💡 Set GALLERY_STORE_DTYPE=float16 or int8 in .env to use a memory-mapped store")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    # Cho phép chỉ định model qua tham số dòng lệnh
+    compare_gallery_precision(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk student enrollment from a CSV file
+Script nhập hàng loạt sinh viên từ file CSV (một khóa tuyển sinh mới)
+
+Cách dùng:
+    python import_students.py students.csv [--restart]
+
+CSV có các cột: student_id, full_name, class_name, email (không bắt buộc), image_glob
+(ví dụ: photos/2025001/*.jpg, tương đối theo thư mục chứa file CSV).
+Bị ngắt giữa chừng thì chạy lại cùng lệnh để tiếp tục từ checkpoint; --restart để nhập lại từ đầu.
+"""
+# Import các thư viện cần thiết
+import os  # Thao tác với file/thư mục
+import sys  # Đọc tham số dòng lệnh
+
+# Thêm thư mục gốc của project vào path để import được các module
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.config.config import config
+from src.controllers.controllers import StudentController
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not args:
+        print("Usage: python import_students.py <students.csv> [--restart]")
+        return
+
+    print("=" * 70)
+    print("  BULK STUDENT IMPORT")
+    print("=" * 70)
+    print(f"CSV file:     {args[0]}")
+    print(f"Model:        {config.DEFAULT_MODEL}")
+    print(f"Workers:      {config.IMPORT_WORKERS} process(es), {config.IMPORT_CHUNK_SIZE} students per batch")
+    print("=" * 70)
+
+    result = StudentController().bulk_import_students(args[0], restart='--restart' in sys.argv)
+    if not result['success']:
+        print(f"\n✗ {result['message']}")
+        return
+
+    summary = result['summary']
+    print("\n" + "=" * 70)
+    print("IMPORT COMPLETE!" if not summary.cancelled else "IMPORT STOPPED (run again to resume)")
+    print("=" * 70)
+    print(f"\nRows in CSV:            {summary.total_rows}")
+    print(f"Students imported:      {summary.imported}")
+    print(f"Already imported:       {summary.resumed}")
+    print(f"Rejected:               {len(summary.rejected)}")
+    print(f"Images embedded:        {summary.embedded}/{summary.images}")
+    print(f"Quality warnings:       {summary.warnings}")
+    print(f"Invalid images skipped: {summary.invalid_images}")
+    print(f"\nElapsed:                {summary.elapsed:.1f}s")
+    print(f"Throughput:             {summary.students_per_second:.1f} students/s, "
+          f"{summary.images_per_second:.1f} images/s")
+
+    if summary.rejected:
+        print("\nFirst 10 rejected rows:")
+        for key, reason in list(summary.rejected.items())[:10]:
+            print(f"  - {key}: {reason}")
+    print("=" * 70)
+
+
+# Bắt buộc với nhóm tiến trình (spawn): tiến trình con import lại file này
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\nImport interrupted by user. Run again to resume from the last checkpoint.")
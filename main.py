@@ -5,7 +5,6 @@ Hệ thống điểm danh nhận diện khuôn mặt
 # Import các thư viện cần thiết
 import os  # Xử lý file và thư mục
 import sys  # Truy cập các tham số hệ thống
-from datetime import date  # Xử lý ngày tháng
 
 # Import các controller để xử lý logic
 from src.controllers.controllers import StudentController, AttendanceController, FaceRecognitionController
@@ -29,6 +28,14 @@ class AttendanceApplication:
         self.running = True  # Biến trạng thái chạy ứng dụng
         self.current_model = config.DEFAULT_MODEL  # Mô hình nhận diện hiện tại
 
+        # Ảnh sinh viên bị thêm/sửa/xóa bằng tay: embed lại đúng các ảnh đó trước khi nạp gallery
+        if config.CHECK_IMAGES_ON_STARTUP:
+            self.attendance_controller.sync_image_changes()
+
+        # Nạp model trên luồng nền để lần điểm danh đầu tiên không phải chờ
+        if config.WARMUP_ON_STARTUP:
+            self.attendance_controller.start_model_warmup()
+
     def run(self):
         """Chạy vòng lặp chính của ứng dụng"""
         # Hiển thị thông tin khởi tạo
@@ -37,8 +44,8 @@ class AttendanceApplication:
         # Vòng lặp chính
         while self.running:
             try:
-                # Hiển thị menu
-                self.view.display_menu()
+                # Hiển thị menu (kèm trạng thái sẵn sàng của model)
+                self.view.display_menu(self.attendance_controller.get_model_status())
                 # Lấy lựa chọn từ người dùng
                 choice = self.view.get_choice()
 
@@ -83,6 +90,9 @@ class AttendanceApplication:
             '13': self.change_model,  # Thay đổi mô hình
             '14': self.view_models,  # Xem danh sách mô hình
             '15': self.test_recognition,  # Kiểm tra nhận diện
+            '16': self.take_attendance_folder,  # Điểm danh hàng loạt từ thư mục
+            '17': self.take_attendance_group,  # Điểm danh cả lớp từ một ảnh
+            '18': self.run_kiosk_mode,  # Điểm danh liên tục từ webcam
             '0': self.exit_application  # Thoát ứng dụng
         }
 
@@ -316,11 +326,14 @@ class AttendanceApplication:
             self.view.pause()
             return
 
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
         self.view.display_info("Processing... Please wait.")
 
         result = self.attendance_controller.take_attendance_from_image(
             image_path=image_path,
-            model_name=self.current_model
+            model_name=self.current_model,
+            class_name=class_name or None
         )
 
         if result['success']:
@@ -333,6 +346,65 @@ class AttendanceApplication:
 
         self.view.pause()
 
+    def take_attendance_folder(self):
+        """Take attendance for every image in a folder (batched recognition)"""
+        print("\n" + "="*60)
+        print("TAKE ATTENDANCE FROM FOLDER")
+        print("="*60)
+        print(f"Current model: {self.current_model}")
+
+        folder_path = self.view.get_input("Enter folder path")
+
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        self.view.display_info("Processing... Please wait.")
+
+        result = self.attendance_controller.take_attendance_from_folder(
+            folder_path=folder_path,
+            model_name=self.current_model,
+            class_name=class_name or None
+        )
+
+        if result['success']:
+            self.view.display_batch_attendance(result)
+            self.view.display_success(result['message'])
+        else:
+            self.view.display_error(result['message'])
+
+        self.view.pause()
+
+    def take_attendance_group(self):
+        """Take attendance for every face in a group photo"""
+        print("\n" + "="*60)
+        print("TAKE ATTENDANCE FROM GROUP PHOTO")
+        print("="*60)
+        print(f"Current model: {self.current_model}")
+
+        image_path = self.view.get_input("Enter group photo path")
+
+        if not os.path.exists(image_path):
+            self.view.display_error("Image file not found")
+            self.view.pause()
+            return
+
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        self.view.display_info("Processing... Please wait.")
+
+        result = self.attendance_controller.take_attendance_from_group_photo(
+            image_path=image_path,
+            model_name=self.current_model,
+            class_name=class_name or None
+        )
+
+        if result['success']:
+            self.view.display_batch_attendance(result)
+            self.view.display_success(result['message'])
+        else:
+            self.view.display_error(result['message'])
+
+        self.view.pause()
+
     def take_attendance_webcam(self):
         """Take attendance from webcam"""
         print("\n" + "="*60)
@@ -340,15 +412,14 @@ class AttendanceApplication:
         print("="*60)
         print(f"Current model: {self.current_model}")
 
-        temp_path = os.path.join(config.ATTENDANCE_LOG_PATH, f"temp_capture_{date.today()}.jpg")
-
-        image_path = CameraUtility.capture_from_webcam(temp_path)
+        # Khung hình được giữ trong bộ nhớ và nhận diện trực tiếp (không ghi file tạm)
+        frame = CameraUtility.capture_frame_from_webcam()
 
-        if image_path:
+        if frame is not None:
             self.view.display_info("Processing... Please wait.")
 
             result = self.attendance_controller.take_attendance_from_image(
-                image_path=image_path,
+                image_path=frame,
                 model_name=self.current_model
             )
 
@@ -357,19 +428,51 @@ class AttendanceApplication:
                 print(f"\nStudent: {result['student_name']} ({result['student_id']})")
                 print(f"Confidence: {result['confidence']:.2%}")
                 print(f"Model: {result['model_used']}")
-
-                # Clean up temp file on success
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
             else:
                 self.view.display_error(result['message'])
-                # Keep temp file for debugging when failed
-                print(f"\n💡 Tip: Temp image saved at {temp_path} for debugging")
+
+            if result.get('capture_path'):
+                print(f"\n💡 Capture saved for audit at {result['capture_path']}")
         else:
             self.view.display_error("No image captured")
 
         self.view.pause()
 
+    def run_kiosk_mode(self):
+        """Continuous webcam attendance until ESC is pressed"""
+        print("\n" + "="*60)
+        print("KIOSK MODE")
+        print("="*60)
+        print(f"Current model: {self.current_model}")
+
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        result = self.attendance_controller.start_kiosk(
+            model_name=self.current_model,
+            class_name=class_name or None
+        )
+        if not result['success']:
+            self.view.display_error(result['message'])
+            self.view.pause()
+            return
+
+        # Xem trước trên luồng chính, các giai đoạn nhận diện chạy trên luồng nền
+        kiosk = self.attendance_controller.kiosk
+        CameraUtility.show_live_preview(
+            get_frame=lambda: kiosk.latest_frame,
+            get_faces=lambda: kiosk.latest_faces,
+            get_status=kiosk.status_lines
+        )
+
+        result = self.attendance_controller.stop_kiosk()
+        if result['success']:
+            self.view.display_kiosk_summary(result)
+            self.view.display_success(result['message'])
+        else:
+            self.view.display_error(result['message'])
+
+        self.view.pause()
+
     def view_today_attendance(self):
         """View today's attendance"""
         print("\n" + "="*60)
@@ -453,7 +556,7 @@ class AttendanceApplication:
         result = self.attendance_controller.get_available_models()
 
         if result['success']:
-            self.view.display_models_list(result['models'], self.current_model)
+            self.view.display_models_list(result['models'], self.current_model, result.get('resident'))
 
             model_choice = self.view.get_input("Enter model number or name")
 
@@ -490,7 +593,7 @@ class AttendanceApplication:
         result = self.attendance_controller.get_available_models()
 
         if result['success']:
-            self.view.display_models_list(result['models'], self.current_model)
+            self.view.display_models_list(result['models'], self.current_model, result.get('resident'))
         else:
             self.view.display_error(result['message'])
 
@@ -7,7 +7,7 @@ import os  # Thư viện để xử lý đường dẫn file và thư mục
 import sys  # Thư viện để truy cập các tham số và chức năng của hệ thống
 import tkinter as tk  # Thư viện GUI Tkinter
 from tkinter import filedialog, messagebox  # Các hộp thoại chọn file và thông báo
-from datetime import date  # Thư viện để làm việc với ngày tháng
+from typing import Any, Callable  # Type hints
 
 # Sử dụng UTF-8 trên Windows console
 if sys.platform == 'win32':
@@ -30,6 +30,7 @@ from src.controllers.controllers import (
 # import các view và tiện ích
 from src.views.tkinter_views import TkinterView  # View GUI Tkinter
 from src.utils.utils import CameraUtility, ImageValidator  # Các tiện ích camera và xác thực ảnh
+from src.utils.worker_pool import WorkerPool, WorkerTask  # Nhóm luồng nền cho các thao tác lâu
 from src.config.config import config  # Cấu hình hệ thống
 
 # Lớp chính của ứng dụng GUI
@@ -52,17 +53,84 @@ class AttendanceApplicationGUI:
         self.view = TkinterView(root)  # Khởi tạo view Tkinter để tương tác với người dùng
         self.running = True  # Biến trạng thái chạy của ứng dụng
         self.current_model = config.DEFAULT_MODEL  # Mô hình nhận diện khuôn mặt hiện tại (mặc định từ config)
+        # Nhóm luồng nền: nhận diện, tăng cường dữ liệu, liệt kê không làm treo cửa sổ
+        self.workers = WorkerPool(config.GUI_WORKER_THREADS)
+
+        # Ảnh sinh viên bị thêm/sửa/xóa bằng tay: embed lại đúng các ảnh đó trước khi nạp gallery
+        if config.CHECK_IMAGES_ON_STARTUP:
+            self.attendance_controller.sync_image_changes()
+
+        # Nạp model trên luồng nền để lần điểm danh đầu tiên không phải chờ
+        if config.WARMUP_ON_STARTUP:
+            self.attendance_controller.start_model_warmup()
 
         # Hiển thị thông tin khởi tạo
         self.view.display_info(f"System initialized with model: {self.current_model}")
 
         # Khởi động menu chính
         self.show_menu()
+        # Theo dõi trạng thái warm-up để cập nhật nhãn trên tiêu đề
+        self.poll_model_status()
+        # Nhận kết quả từ các luồng nền
+        self.pump_workers()
 
     def show_menu(self):
         """Hiển thị menu chính"""
         # Gọi view để hiển thị menu và truyền hàm xử lý lựa chọn
-        self.view.display_menu(self.handle_choice)
+        self.view.display_menu(self.handle_choice, self.attendance_controller.get_model_status())
+
+    def poll_model_status(self):
+        """Cập nhật trạng thái model mỗi 500ms cho tới khi warm-up kết thúc (chạy trên luồng Tkinter)"""
+        status = self.attendance_controller.get_model_status()
+        self.view.update_model_status(status)
+        if status.get('success') and status['state'] in ('pending', 'loading') and config.WARMUP_ON_STARTUP:
+            self.root.after(500, self.poll_model_status)
+
+    def pump_workers(self):
+        """Chuyển kết quả và tiến độ từ các luồng nền về luồng Tkinter (mỗi 50ms)"""
+        self.workers.pump()
+        if self.running:
+            self.root.after(50, self.pump_workers)
+
+    def run_in_background(
+        self,
+        message: str,
+        work: Callable[[WorkerTask], Any],
+        on_done: Callable[[Any], None],
+        cancellable: bool = False,
+        show_window: bool = True
+    ) -> WorkerTask:
+        """
+        Chạy một thao tác lâu trên luồng nền, kết quả được hiển thị trên luồng Tkinter
+
+        Args:
+            message: Thông điệp trong cửa sổ tiến độ
+            work: Hàm chạy trên luồng nền, nhận WorkerTask (task.report_progress dùng làm progress callback)
+            on_done: Nhận kết quả của work
+            cancellable: Hiện nút Cancel trong cửa sổ tiến độ
+            show_window: Hiện cửa sổ tiến độ (tắt với thao tác nhanh như liệt kê)
+
+        Returns:
+            WorkerTask: Công việc đã gửi
+        """
+        window = None
+
+        # Đóng cửa sổ tiến độ rồi hiển thị kết quả
+        def finish(callback: Callable, *args):
+            self.view.close_processing(window)
+            callback(*args)
+
+        task = self.workers.submit(
+            message,
+            work,
+            on_done=lambda result: finish(on_done, result),
+            on_error=lambda e: finish(self.view.display_error, f"Error: {str(e)}"),
+            on_progress=lambda done, total, text: self.view.update_processing(window, done, total, text or None),
+            on_cancel=lambda: finish(self.view.display_warning, f"{message}\n\nCancelled.")
+        )
+        if show_window:
+            window = self.view.show_processing(message, on_cancel=task.cancel if cancellable else None)
+        return task
 
     # Xử lý lựa chọn từ menu
     def handle_choice(self, choice: str):
@@ -92,6 +160,9 @@ class AttendanceApplicationGUI:
             '16': self.augment_student_data,  # Tăng cường dữ liệu một sinh viên
             '17': self.augment_all_students_data,  # Tăng cường dữ liệu tất cả sinh viên
             '18': self.clean_augmented_data,  # Xóa ảnh đã tăng cường
+            '19': self.take_attendance_folder,  # Điểm danh hàng loạt từ thư mục
+            '20': self.take_attendance_group,  # Điểm danh cả lớp từ một ảnh
+            '21': self.run_kiosk_mode,  # Điểm danh liên tục từ webcam
             '0': self.exit_application  # Thoát ứng dụng
         }
 
@@ -291,10 +362,16 @@ class AttendanceApplicationGUI:
 
     def list_students(self):
         """Liệt kê tất cả sinh viên"""
-        # Gọi controller để lấy danh sách sinh viên
-        result = self.student_controller.list_all_students()
+        # Lấy danh sách trên luồng nền, hiển thị khi có kết quả
+        self.run_in_background(
+            "Loading students...",
+            lambda task: self.student_controller.list_all_students(),
+            self.show_students_list,
+            show_window=False
+        )
 
-        # Hiển thị kết quả
+    def show_students_list(self, result: dict):
+        """Hiển thị kết quả liệt kê sinh viên"""
         if result['success']:
             # Hiển thị danh sách sinh viên
             self.view.display_students_list(result['students'])
@@ -379,16 +456,23 @@ class AttendanceApplicationGUI:
         if not image_path:
             return
 
-        # Hiển thị thông báo đang xử lý
-        self.view.show_processing("Processing... Please wait.")
-
-        # Gọi controller để thực hiện điểm danh
-        result = self.attendance_controller.take_attendance_from_image(
-            image_path=image_path,  # Đường dẫn file ảnh
-            model_name=self.current_model  # Mô hình nhận diện hiện tại
+        # Hỏi lớp để giới hạn phạm vi nhận diện (bỏ trống = tất cả sinh viên)
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        # Gọi controller trên luồng nền để thực hiện điểm danh
+        model_name = self.current_model
+        self.run_in_background(
+            "Recognizing face... Please wait.",
+            lambda task: self.attendance_controller.take_attendance_from_image(
+                image_path=image_path,  # Đường dẫn file ảnh
+                model_name=model_name,  # Mô hình nhận diện hiện tại
+                class_name=class_name or None  # Chỉ tìm trong sinh viên của lớp (nếu có)
+            ),
+            self.show_attendance_result
         )
 
-        # Hiển thị kết quả
+    def show_attendance_result(self, result: dict):
+        """Hiển thị kết quả điểm danh từ một ảnh"""
         if result['success']:
             # Tạo thông báo chi tiết về kết quả điểm danh
             message = f"{result['message']}\n\n"
@@ -400,50 +484,139 @@ class AttendanceApplicationGUI:
             # Hiển thị lỗi nếu không nhận diện được
             self.view.display_error(result['message'])
 
+    def take_attendance_folder(self):
+        """Điểm danh hàng loạt từ một thư mục ảnh (nhận diện theo lô)"""
+        # Mở hộp thoại chọn thư mục
+        folder_path = filedialog.askdirectory(title="Select folder of attendance images")
+
+        # Nếu không chọn thư mục, thoát khỏi hàm
+        if not folder_path:
+            return
+
+        # Hỏi lớp để giới hạn phạm vi nhận diện (bỏ trống = tất cả sinh viên)
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        # Gọi controller trên luồng nền, báo tiến độ sau mỗi lô và cho phép hủy
+        model_name = self.current_model
+        self.run_in_background(
+            "Recognizing images in folder...",
+            lambda task: self.attendance_controller.take_attendance_from_folder(
+                folder_path=folder_path,
+                model_name=model_name,
+                class_name=class_name or None,
+                progress=lambda done, total: task.report_progress(done, total, f"Processed {done}/{total} images")
+            ),
+            self.show_bulk_attendance_result,
+            cancellable=True
+        )
+
+    def show_bulk_attendance_result(self, result: dict):
+        """Hiển thị kết quả điểm danh hàng loạt (thư mục ảnh hoặc ảnh cả lớp)"""
+        if result['success']:
+            message = f"{result['message']}\n\n"
+            # Liệt kê sinh viên đã điểm danh và các ảnh thất bại
+            for item in result['marked']:
+                message += f"✓ {item['student_name']} ({item['student_id']}) - {item['confidence']:.2%}\n"
+            for item in result['failed']:
+                message += f"✗ {item['image']}: {item['message']}\n"
+            self.view.display_success(message)
+        else:
+            self.view.display_error(result['message'])
+
+    def take_attendance_group(self):
+        """Điểm danh cả lớp từ một ảnh chụp nhiều khuôn mặt"""
+        # Mở hộp thoại chọn ảnh chụp cả lớp
+        image_path = filedialog.askopenfilename(
+            title="Select group photo for attendance",
+            filetypes=[("Image files", "*.jpg *.jpeg *.png"), ("All files", "*.*")]
+        )
+
+        # Nếu không chọn ảnh, thoát khỏi hàm
+        if not image_path:
+            return
+
+        # Hỏi lớp để giới hạn phạm vi nhận diện (bỏ trống = tất cả sinh viên)
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        # Gọi controller trên luồng nền để nhận diện mọi khuôn mặt và điểm danh hàng loạt
+        model_name = self.current_model
+        self.run_in_background(
+            "Recognizing faces in group photo... Please wait.",
+            lambda task: self.attendance_controller.take_attendance_from_group_photo(
+                image_path=image_path,
+                model_name=model_name,
+                class_name=class_name or None
+            ),
+            self.show_bulk_attendance_result
+        )
+
     def take_attendance_webcam(self):
         """Điểm danh từ webcam"""
-        # Tạo đường dẫn file tạm để lưu ảnh chụp từ webcam
-        temp_path = os.path.join(config.ATTENDANCE_LOG_PATH, f"temp_capture_{date.today()}.jpg")
-
-        # Chụp ảnh từ webcam
-        image_path = CameraUtility.capture_from_webcam(temp_path)
+        # Chụp ảnh từ webcam (khung hình giữ trong bộ nhớ, không ghi file tạm)
+        frame = CameraUtility.capture_frame_from_webcam()
 
         # Nếu chụp ảnh thành công
-        if image_path:
-            # Hiển thị thông báo đang xử lý
-            self.view.show_processing("Processing... Please wait.")
-
-            # Gọi controller để thực hiện điểm danh
-            result = self.attendance_controller.take_attendance_from_image(
-                image_path=image_path,  # Đường dẫn ảnh vừa chụp
-                model_name=self.current_model  # Mô hình nhận diện hiện tại
+        if frame is not None:
+            # Gọi controller trên luồng nền để thực hiện điểm danh
+            model_name = self.current_model
+            self.run_in_background(
+                "Recognizing face... Please wait.",
+                lambda task: self.attendance_controller.take_attendance_from_image(
+                    image_path=frame,  # Khung hình vừa chụp
+                    model_name=model_name  # Mô hình nhận diện hiện tại
+                ),
+                self.show_attendance_result
             )
-
-            # Hiển thị kết quả
-            if result['success']:
-                # Tạo thông báo chi tiết về kết quả điểm danh
-                message = f"{result['message']}\n\n"
-                message += f"Student: {result['student_name']} ({result['student_id']})\n"
-                message += f"Confidence: {result['confidence']:.2%}\n"  # Độ tin cậy dạng %
-                message += f"Model: {result['model_used']}"  # Mô hình đã sử dụng
-                self.view.display_success(message)
-
-                # Xóa file tạm sau khi điểm danh thành công
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            else:
-                # Hiển thị lỗi nếu không nhận diện được
-                self.view.display_error(result['message'])
         else:
             # Thông báo lỗi nếu không chụp được ảnh
             self.view.display_error("No image captured")
 
+    def run_kiosk_mode(self):
+        """Điểm danh liên tục từ webcam (chế độ kiosk) cho tới khi bấm ESC"""
+        # Hỏi lớp để giới hạn phạm vi nhận diện (bỏ trống = tất cả sinh viên)
+        class_name = self.view.get_input("Enter class name to restrict search (leave empty for all students)")
+
+        result = self.attendance_controller.start_kiosk(
+            model_name=self.current_model,
+            class_name=class_name or None
+        )
+        if not result['success']:
+            self.view.display_error(result['message'])
+            return
+
+        # Cửa sổ xem trước của OpenCV (giống chụp ảnh từ webcam), nhận diện chạy trên luồng nền
+        kiosk = self.attendance_controller.kiosk
+        CameraUtility.show_live_preview(
+            get_frame=lambda: kiosk.latest_frame,
+            get_faces=lambda: kiosk.latest_faces,
+            get_status=kiosk.status_lines
+        )
+
+        # Hiển thị danh sách sinh viên đã điểm danh và số liệu từng giai đoạn
+        result = self.attendance_controller.stop_kiosk()
+        if result['success']:
+            message = f"{result['message']}\n\n"
+            for item in result['marked']:
+                message += f"✓ {item['student_name']} ({item['student_id']}) - {item['confidence']:.2%}\n"
+            message += "\n"
+            for name, stage in result['stages'].items():
+                message += f"{name}: {stage['processed']} processed, {stage['dropped']} dropped, {stage['rate']:.1f}/s\n"
+            self.view.display_success(message)
+        else:
+            self.view.display_error(result['message'])
+
     def view_today_attendance(self):
         """Xem danh sách điểm danh hôm nay"""
-        # Gọi controller để lấy danh sách điểm danh hôm nay
-        result = self.attendance_controller.get_today_attendance()
+        # Lấy danh sách điểm danh hôm nay trên luồng nền
+        self.run_in_background(
+            "Loading attendance...",
+            lambda task: self.attendance_controller.get_today_attendance(),
+            self.show_attendance_list,
+            show_window=False
+        )
 
-        # Hiển thị kết quả
+    def show_attendance_list(self, result: dict):
+        """Hiển thị danh sách điểm danh theo ngày"""
         if result['success']:
             # Hiển thị danh sách điểm danh với ngày tháng
             self.view.display_attendance_list(result['records'], result['date'])
@@ -460,16 +633,13 @@ class AttendanceApplicationGUI:
         if not session_date:
             session_date = None
 
-        # Gọi controller để lấy danh sách điểm danh theo ngày
-        result = self.attendance_controller.get_attendance_by_date(session_date)
-
-        # Hiển thị kết quả
-        if result['success']:
-            # Hiển thị danh sách điểm danh với ngày tháng
-            self.view.display_attendance_list(result['records'], result['date'])
-        else:
-            # Hiển thị lỗi nếu có vấn đề
-            self.view.display_error(result['message'])
+        # Lấy danh sách điểm danh theo ngày trên luồng nền
+        self.run_in_background(
+            "Loading attendance...",
+            lambda task: self.attendance_controller.get_attendance_by_date(session_date),
+            self.show_attendance_list,
+            show_window=False
+        )
 
     def view_student_history(self):
         """Xem lịch sử điểm danh của sinh viên"""
@@ -479,16 +649,21 @@ class AttendanceApplicationGUI:
         if not student_id:
             return
 
-        # Gọi controller để lấy lịch sử điểm danh của sinh viên
-        result = self.attendance_controller.get_student_attendance_history(student_id)
+        # Hiển thị danh sách lịch sử điểm danh
+        def show_history(result: dict):
+            if result['success']:
+                self.view.display_attendance_list(result['records'])
+            else:
+                # Hiển thị lỗi nếu có vấn đề
+                self.view.display_error(result['message'])
 
-        # Hiển thị kết quả
-        if result['success']:
-            # Hiển thị danh sách lịch sử điểm danh
-            self.view.display_attendance_list(result['records'])
-        else:
-            # Hiển thị lỗi nếu có vấn đề
-            self.view.display_error(result['message'])
+        # Lấy lịch sử điểm danh của sinh viên trên luồng nền
+        self.run_in_background(
+            "Loading attendance history...",
+            lambda task: self.attendance_controller.get_student_attendance_history(student_id),
+            show_history,
+            show_window=False
+        )
 
     def generate_report(self):
         """Tạo báo cáo điểm danh"""
@@ -499,18 +674,24 @@ class AttendanceApplicationGUI:
         if not session_date:
             session_date = None
 
-        # Gọi controller để tạo báo cáo
-        result = self.attendance_controller.generate_report(session_date)
+        # Hiển thị báo cáo khi có kết quả
+        def show_report(result: dict):
+            if result['success']:
+                # Hiển thị báo cáo thống kê
+                self.view.display_attendance_report(result['report'])
+                # Cũng hiển thị danh sách chi tiết
+                self.view.display_attendance_list(result['report']['records'], result['report']['date'])
+            else:
+                # Hiển thị lỗi nếu có vấn đề
+                self.view.display_error(result['message'])
 
-        # Hiển thị kết quả
-        if result['success']:
-            # Hiển thị báo cáo thống kê
-            self.view.display_attendance_report(result['report'])
-            # Cũng hiển thị danh sách chi tiết
-            self.view.display_attendance_list(result['report']['records'], result['report']['date'])
-        else:
-            # Hiển thị lỗi nếu có vấn đề
-            self.view.display_error(result['message'])
+        # Gọi controller trên luồng nền để tạo báo cáo
+        self.run_in_background(
+            "Generating report...",
+            lambda task: self.attendance_controller.generate_report(session_date),
+            show_report,
+            show_window=False
+        )
 
     def change_model(self):
         """Thay đổi mô hình nhận diện khuôn mặt"""
@@ -520,7 +701,7 @@ class AttendanceApplicationGUI:
         # Nếu lấy danh sách thành công
         if result['success']:
             # Hiển thị danh sách các mô hình và mô hình hiện tại
-            self.view.display_models_list(result['models'], self.current_model)
+            self.view.display_models_list(result['models'], self.current_model, result.get('resident'))
 
             # Hỏi người dùng chọn mô hình (có thể nhập số thứ tự hoặc tên mô hình)
             model_choice = self.view.get_input("Enter model number or name")
@@ -566,7 +747,7 @@ class AttendanceApplicationGUI:
         # Hiển thị kết quả
         if result['success']:
             # Hiển thị danh sách các mô hình và mô hình hiện tại
-            self.view.display_models_list(result['models'], self.current_model)
+            self.view.display_models_list(result['models'], self.current_model, result.get('resident'))
         else:
             # Hiển thị lỗi nếu có vấn đề
             self.view.display_error(result['message'])
@@ -597,19 +778,21 @@ class AttendanceApplicationGUI:
 
         # Nếu có ảnh và file tồn tại
         if image_path and os.path.exists(image_path):
-            # Hiển thị thông báo đang xử lý
-            self.view.show_processing("Processing... Please wait.")
-
-            # Gọi controller để nhận diện khuôn mặt (không ghi điểm danh)
-            result = self.face_controller.recognize_face(image_path, self.current_model)
-
-            # Hiển thị kết quả
-            if result['success']:
-                # Hiển thị kết quả nhận diện
-                self.view.display_recognition_result(result)
-            else:
-                # Hiển thị lỗi nếu không nhận diện được
-                self.view.display_error(result['message'])
+            # Hiển thị kết quả nhận diện
+            def show_result(result: dict):
+                if result['success']:
+                    self.view.display_recognition_result(result)
+                else:
+                    # Hiển thị lỗi nếu không nhận diện được
+                    self.view.display_error(result['message'])
+
+            # Gọi controller trên luồng nền để nhận diện khuôn mặt (không ghi điểm danh)
+            model_name = self.current_model
+            self.run_in_background(
+                "Recognizing face... Please wait.",
+                lambda task: self.face_controller.recognize_face(image_path, model_name),
+                show_result
+            )
         else:
             # Thông báo lỗi nếu không có ảnh hoặc file không tồn tại
             self.view.display_error("No image provided or file not found")
@@ -647,13 +830,15 @@ class AttendanceApplicationGUI:
         if not confirm:
             return
 
-        # Hiển thị thông báo đang xử lý
-        self.view.show_processing("Augmenting data... Please wait.")
-
-        # Gọi controller để tăng cường dữ liệu
-        result = self.augmentation_controller.augment_student(student_id, num_augmented)
+        # Gọi controller trên luồng nền để tăng cường dữ liệu
+        self.run_in_background(
+            f"Augmenting data for {student_id}... Please wait.",
+            lambda task: self.augmentation_controller.augment_student(student_id, num_augmented),
+            self.show_augment_result
+        )
 
-        # Hiển thị kết quả
+    def show_augment_result(self, result: dict):
+        """Hiển thị kết quả tăng cường dữ liệu cho một sinh viên"""
         if result['success']:
             # Tạo thông báo chi tiết về kết quả
             message = f"{result['message']}\n\n"
@@ -694,13 +879,19 @@ class AttendanceApplicationGUI:
         if not confirm:
             return
 
-        # Hiển thị thông báo đang xử lý (quá trình này có thể mất nhiều thời gian)
-        self.view.show_processing("Augmenting all students... This may take a while.")
-
-        # Gọi controller để tăng cường dữ liệu cho tất cả sinh viên
-        result = self.augmentation_controller.augment_all_students(num_augmented)
+        # Gọi controller trên luồng nền (quá trình này có thể mất nhiều thời gian), báo tiến độ và cho phép hủy
+        self.run_in_background(
+            "Augmenting all students... This may take a while.",
+            lambda task: self.augmentation_controller.augment_all_students(
+                num_augmented,
+                progress=lambda done, total: task.report_progress(done, total, f"Augmented {done}/{total} students")
+            ),
+            self.show_augment_all_result,
+            cancellable=True
+        )
 
-        # Hiển thị kết quả
+    def show_augment_all_result(self, result: dict):
+        """Hiển thị kết quả tăng cường dữ liệu cho tất cả sinh viên"""
         if result['success']:
             # Lấy thống kê từ kết quả
             stats = result['stats']
@@ -769,8 +960,10 @@ class AttendanceApplicationGUI:
             "Exit",
             "Are you sure you want to exit?"
         )
-        # Nếu xác nhận, thoát ứng dụng
+        # Nếu xác nhận, hủy các công việc nền và thoát ứng dụng
         if confirm:
+            self.running = False
+            self.workers.shutdown()
             self.root.quit()
 
 
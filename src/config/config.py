@@ -34,11 +34,33 @@ class Config:
         # Khoảng cách để so sánh đặc trưng khuôn mặt
         #os.getenv lấy giá trị từ biến môi trường, nếu không có thì sử dụng giá trị mặc định 'cosine'
         self.DISTANCE_METRIC = os.getenv('DISTANCE_METRIC', 'cosine')
+        # Giới hạn bộ nhớ (MB) cho các model được giữ thường trú, vượt quá sẽ loại model ít dùng nhất (LRU)
+        self.MODEL_CACHE_BUDGET_MB = float(os.getenv('MODEL_CACHE_BUDGET_MB', '1024'))
+        # Khởi động model trên luồng nền khi mở ứng dụng (tùy chọn nạp trước mọi model trong AVAILABLE_MODELS)
+        self.WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() == 'true'
+        self.PRELOAD_ALL_MODELS = os.getenv('PRELOAD_ALL_MODELS', 'false').lower() == 'true'
+        # Số luồng nền của giao diện Tkinter (nhận diện, tăng cường dữ liệu, liệt kê)
+        self.GUI_WORKER_THREADS = int(os.getenv('GUI_WORKER_THREADS', '2'))
+        # Nhập sinh viên hàng loạt từ CSV: số tiến trình embed (mỗi tiến trình nạp model riêng, 1 = chạy tuần tự)
+        # và số sinh viên mỗi lô (một transaction, một lần lưu gallery và checkpoint mỗi lô)
+        self.IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', str(min(4, os.cpu_count() or 1))))
+        self.IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '200'))
 
         # Paths
         self.STUDENT_DATABASE_PATH = os.getenv('STUDENT_DATABASE_PATH', 'data/students')
         self.ATTENDANCE_LOG_PATH = os.getenv('ATTENDANCE_LOG_PATH', 'data/attendance_logs')
         self.MODELS_PATH = 'models'
+        # Thư mục lưu cache embedding của gallery (mỗi model/detector một file)
+        self.GALLERY_CACHE_PATH = os.getenv('GALLERY_CACHE_PATH', 'data/gallery')
+        # Danh mục số ảnh của từng sinh viên (tránh duyệt thư mục ở mỗi lần nhận diện)
+        self.IMAGE_MANIFEST_PATH = os.getenv('IMAGE_MANIFEST_PATH', 'data/image_manifest.json')
+        # Khi khởi động: so thư mục sinh viên với manifest (kích thước/mtime, hash khi cần) và embed lại ảnh thay đổi
+        self.CHECK_IMAGES_ON_STARTUP = os.getenv('CHECK_IMAGES_ON_STARTUP', 'true').lower() == 'true'
+        # Tầng đĩa của cache phát hiện khuôn mặt (để trống = chỉ giữ trong bộ nhớ)
+        self.DETECTION_CACHE_PATH = os.getenv('DETECTION_CACHE_PATH', '')
+        # Ảnh webcam được nhận diện trực tiếp trong bộ nhớ; chỉ ghi ra đĩa khi bật lưu vết (audit)
+        self.SAVE_CAPTURES_FOR_AUDIT = os.getenv('SAVE_CAPTURES_FOR_AUDIT', 'false').lower() == 'true'
+        self.AUDIT_CAPTURE_PATH = os.path.join(self.ATTENDANCE_LOG_PATH, 'captures')
 
         # Face Recognition Settings
         # STRICTER thresholds to prevent false positives (wrong person matches)
@@ -49,6 +71,18 @@ class Config:
             'ArcFace': 0.68       # Stricter: was 0.85 - prevents false matches
         }
 
+        # Cascade mode: fast model first, heavy model only for ambiguous faces
+        self.CASCADE_FAST_MODEL = os.getenv('CASCADE_FAST_MODEL', 'Facenet')
+        self.CASCADE_HEAVY_MODEL = os.getenv('CASCADE_HEAVY_MODEL', 'ArcFace')
+        self.CASCADE_MARGIN = float(os.getenv('CASCADE_MARGIN', '0.08'))  # Min distance gap to the runner-up student
+        self.CASCADE_CANDIDATES = 20  # Gallery samples searched to find the runner-up student
+        # Hệ số nhân khoảng cách của model nặng để đưa về thang của model nhanh.
+        # 0 = tự suy ra từ tỉ lệ ngưỡng (ngưỡng nhanh / ngưỡng nặng): xấp xỉ tuyến tính, chưa hiệu chỉnh,
+        # nên đo lại trên dữ liệu thật và đặt giá trị riêng nếu tỉ lệ chấp nhận sai lệch
+        self.CASCADE_HEAVY_DISTANCE_SCALE = float(os.getenv('CASCADE_HEAVY_DISTANCE_SCALE', '0'))
+        # Khoảng cách của Cascade dùng thang của model nhanh
+        self.RECOGNITION_THRESHOLD['Cascade'] = self.RECOGNITION_THRESHOLD.get(self.CASCADE_FAST_MODEL, 0.4)
+
         # Minimum confidence required for attendance (0.6 = 60%)
         self.MIN_CONFIDENCE_FOR_ATTENDANCE = 0.60
 
@@ -56,6 +90,66 @@ class Config:
         self.NUM_FACE_SAMPLES = 10  # Number of sample images to capture per student
         self.SAMPLE_CAPTURE_DELAY = 0.5  # Delay between captures (seconds)
 
+        # Embedding gallery search
+        self.GALLERY_TOP_K = 5  # Number of nearest samples returned per query
+        self.GALLERY_COMPACT_RATIO = 0.25  # Compact buffers once this fraction of rows is tombstoned
+        # Kiểu lưu vector: float32 (RAM), float16 hoặc int8 (file memmap dùng chung giữa các tiến trình)
+        self.GALLERY_STORE_DTYPE = os.getenv('GALLERY_STORE_DTYPE', 'float32')
+        self.PROTOTYPES_PER_STUDENT = 3  # Centroid embeddings kept per student for the shortlist pass
+        self.PROTOTYPE_SHORTLIST = 10  # Students whose individual samples are rescored
+        self.PROTOTYPE_MIN_GALLERY = 1000  # Below this many samples, search the whole gallery directly
+
+        # Approximate nearest-neighbour (IVF) index for university-scale galleries
+        self.ANN_ENABLED = os.getenv('ANN_ENABLED', 'false').lower() == 'true'
+        self.ANN_MIN_GALLERY = int(os.getenv('ANN_MIN_GALLERY', '50000'))  # Exact/prototype search below this
+        self.ANN_NLIST = int(os.getenv('ANN_NLIST', '0'))  # Inverted lists (0 = 4 * sqrt(gallery size))
+        self.ANN_NPROBE = int(os.getenv('ANN_NPROBE', '16'))  # Lists scanned per query: higher = better recall, slower
+        self.ANN_RETRAIN_GROWTH = 2.0  # Retrain centroids once the gallery grows by this factor
+
+        # Roster-scoped recognition
+        self.ROSTER_CACHE_SIZE = 32  # Class rosters whose gallery rows are kept precomputed
+
+        # Batched recognition
+        self.RECOGNITION_BATCH_SIZE = int(os.getenv('RECOGNITION_BATCH_SIZE', '16'))  # Face crops per forward pass
+        self.GROUP_CANDIDATES_PER_FACE = 20  # Gallery samples considered per face when assigning a group photo
+
+        # Kiosk mode: continuous webcam attendance (capture -> detect -> embed/search -> write)
+        self.KIOSK_CAMERA_INDEX = int(os.getenv('KIOSK_CAMERA_INDEX', '0'))
+        self.KIOSK_DETECT_WIDTH = int(os.getenv('KIOSK_DETECT_WIDTH', '320'))  # Frames are downscaled to this width for detection
+        self.KIOSK_EMBED_WORKERS = int(os.getenv('KIOSK_EMBED_WORKERS', '2'))  # Embed/search worker threads
+        self.KIOSK_FRAME_QUEUE_SIZE = 4  # Frames waiting for detection (oldest dropped when full)
+        self.KIOSK_FACE_QUEUE_SIZE = 32  # Face crops waiting for embedding (newest dropped when full)
+        self.KIOSK_MIN_FACE_SIZE = 60  # Min face width in full-resolution pixels
+        self.KIOSK_COOLDOWN_SECONDS = 30  # Ignore repeat recognitions of the same student
+        self.KIOSK_WRITE_INTERVAL = 1.0  # Seconds between batched attendance writes
+
+        # Face tracking across frames: each person is embedded once per appearance, later frames only move the box
+        self.TRACK_IOU_THRESHOLD = float(os.getenv('TRACK_IOU_THRESHOLD', '0.3'))  # Min overlap to continue a track
+        self.TRACK_MAX_CENTROID_SHIFT = 0.5  # Fallback match: centre moved less than this fraction of the box size
+        self.TRACK_MAX_MISSED_SECONDS = 1.0  # Track is dropped after the face is missing this long
+        self.TRACK_MIN_CONFIDENCE = float(os.getenv('TRACK_MIN_CONFIDENCE', '0.7'))  # Stop re-embedding once identity reaches this
+        self.TRACK_MAX_ATTEMPTS = 5  # Embeddings per track before giving up on an unknown face
+        self.TRACK_RETRY_INTERVAL = 0.5  # Seconds between embedding attempts for an unresolved track
+
+        # Shared face detectors (Haar cascade / OpenCV DNN) for webcam previews and image validation
+        self.FACE_DETECTOR = os.getenv('FACE_DETECTOR', 'haar')  # haar, dnn (falls back to haar if model files are missing)
+        self.DNN_FACE_PROTO_PATH = os.path.join('data', 'models', 'deploy.prototxt')
+        self.DNN_FACE_MODEL_PATH = os.path.join('data', 'models', 'res10_300x300_ssd_iter_140000.caffemodel')
+        self.DNN_FACE_CONFIDENCE = 0.5
+        self.DETECT_PREVIEW_WIDTH = int(os.getenv('DETECT_PREVIEW_WIDTH', '320'))  # Preview frames are downscaled to this width
+        self.DETECT_ROI_MARGIN = 0.5  # Search around last frame's faces, widened by this fraction per side
+        self.DETECT_FULL_FRAME_INTERVAL = 10  # Full-frame search every N frames to pick up new faces
+
+        # Enrollment: detect, check and embed samples when a student is registered (not at the first check-in)
+        self.ENROLL_EMBED_ON_REGISTER = os.getenv('ENROLL_EMBED_ON_REGISTER', 'true').lower() == 'true'
+        self.ENROLL_MIN_FACE_SIZE = 80  # Smallest face side (px) without a "too small" warning
+        self.ENROLL_MIN_SHARPNESS = 50.0  # Laplacian variance below this is reported as blurry
+        self.ENROLL_BRIGHTNESS_RANGE = (50, 210)  # Mean face brightness outside this is too dark/bright
+
+        # Detection-result cache (keyed by image content hash)
+        self.DETECTION_CACHE_SIZE = int(os.getenv('DETECTION_CACHE_SIZE', '64'))  # Images kept in memory
+        self.EMBEDDING_CACHE_SIZE = 256  # Probe embeddings kept per model, keyed by image content hash
+
         # Ensure directories exist
         self._create_directories()
 
@@ -67,29 +161,35 @@ class Config:
             self.STUDENT_DATABASE_PATH,
             self.ATTENDANCE_LOG_PATH,
             self.MODELS_PATH,
+            self.GALLERY_CACHE_PATH,
             'data/models'  # For Haar Cascade
         ]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
 
-        # Initialize Haar Cascade to avoid Unicode path issues
-        self._init_haar_cascade()
+        # Haar Cascade được copy ở lần dùng đầu tiên (get_haar_cascade_path), không import cv2 lúc khởi động
+
+    def get_haar_cascade_path(self) -> str:
+        """
+        Local Haar Cascade path, copied from OpenCV on first use
+        Đường dẫn Haar Cascade cục bộ (tránh lỗi đường dẫn Unicode), chỉ import cv2 khi cần
+        """
+        cascade_dest = os.path.join('data', 'models', 'haarcascade_frontalface_default.xml')
+        if os.path.exists(cascade_dest):
+            return cascade_dest
+
+        import cv2
+        cascade_src = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        self._init_haar_cascade(cascade_src, cascade_dest)
+        # Fallback to OpenCV default path
+        return cascade_dest if os.path.exists(cascade_dest) else cascade_src
 
-    def _init_haar_cascade(self):
+    def _init_haar_cascade(self, cascade_src: str, cascade_dest: str):
         """Copy Haar Cascade to local directory to avoid Unicode path issues"""
         try:
-            import cv2
             import shutil
 
-            cascade_dest = os.path.join('data', 'models', 'haarcascade_frontalface_default.xml')
-
-            # Skip if already exists
-            if os.path.exists(cascade_dest):
-                return
-
             # Copy from OpenCV installation
-            cascade_src = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
-
             if os.path.exists(cascade_src):
                 shutil.copy(cascade_src, cascade_dest)
         except Exception as e:
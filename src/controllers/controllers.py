@@ -3,13 +3,21 @@ Lớp Controller xử lý tương tác người dùng (Mẫu thiết kế MVC)
 Controller là tầng trung gian giữa View và Service/Model
 """
 # Import các thư viện cần thiết
-from typing import Optional, Dict, Any, List  # Type hints
-from datetime import date  # Xử lý ngày tháng
+from typing import Optional, Dict, Any, List, Callable  # Type hints
+from datetime import date, datetime  # Xử lý ngày tháng
 import os  # Xử lý file và thư mục
+import time  # Đo thời gian xử lý
 
 # Import các lớp Service và Model
 from src.services.services import StudentService, AttendanceService, FaceRecognitionService
+from src.services.kiosk import KioskPipeline
+from src.services.bulk_import import BulkImportService
 from src.models.models import Student, AttendanceRecord, FaceRecognitionResult
+from src.gallery.embedding_gallery import IMAGE_EXTENSIONS, gallery_manager
+from src.gallery.image_manifest import image_manifest
+from src.config.config import config
+from src.utils.detection_cache import ImageSource
+from src.utils.utils import CameraUtility
 
 
 class StudentController:
@@ -59,8 +67,9 @@ class StudentController:
                 message += f' with {num_images} face sample(s)'
             return {
                 'success': True,
-                'message': message,
-                'student': student
+                'message': message + self._quality_note(),
+                'student': student,
+                'quality': [report.to_dict() for report in self.service.last_enrollment]
             }
         except ValueError as e:
             # Bắt lỗi giá trị không hợp lệ (ví dụ: sinh viên đã tồn tại)
@@ -106,8 +115,9 @@ class StudentController:
             num_images = len(image_paths) if image_paths else 1
             return {
                 'success': True,
-                'message': f'{num_images} face image(s) added for student {student_id}',
-                'student': student
+                'message': f'{num_images} face image(s) added for student {student_id}' + self._quality_note(),
+                'student': student,
+                'quality': [report.to_dict() for report in self.service.last_enrollment]
             }
         except ValueError as e:
             return {
@@ -120,6 +130,58 @@ class StudentController:
                 'message': f'Error adding face image: {str(e)}'
             }
 
+    def bulk_import_students(
+        self,
+        csv_path: str,
+        restart: bool = False,
+        progress: Callable[[int, int], bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Nhập hàng loạt sinh viên từ file CSV (student_id, full_name, class_name, email, image_glob)
+
+        Args:
+            csv_path: Đường dẫn file CSV
+            restart: Bỏ qua checkpoint, nhập lại từ đầu
+            progress: Gọi với (số sinh viên đã xử lý, tổng số); trả về False để dừng
+
+        Returns:
+            Dictionary chứa trạng thái, thông điệp và ImportSummary
+        """
+        if not os.path.exists(csv_path):
+            return {
+                'success': False,
+                'message': f'CSV file not found: {csv_path}'
+            }
+        try:
+            summary = BulkImportService().import_csv(csv_path, restart=restart, progress=progress)
+            message = f'Bulk import: {summary.summary()}'
+            if summary.cancelled:
+                message += ' (cancelled, run again to resume)'
+            return {
+                'success': True,
+                'message': message,
+                'summary': summary
+            }
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error importing students: {str(e)}'
+            }
+
+    def _quality_note(self) -> str:
+        """Ghi chú số ảnh mẫu có cảnh báo chất lượng của lần đăng ký gần nhất"""
+        flagged = [r for r in self.service.last_enrollment if not r.ok]
+        if not flagged:
+            return ''
+        return f' ({len(flagged)} sample(s) with quality warnings: ' + '; '.join(
+            f"{os.path.basename(r.path)}: {', '.join(r.issues)}" for r in flagged
+        ) + ')'
+
     def get_student_info(self, student_id: str) -> Dict[str, Any]:
         """Lấy thông tin sinh viên theo ID"""
         try:
@@ -230,27 +292,160 @@ class AttendanceController:
         """Khởi tạo AttendanceController với các service cần thiết"""
         self.service = AttendanceService()  # Service xử lý logic điểm danh
         self.recognition_service = FaceRecognitionService()  # Service nhận diện khuôn mặt
+        self.kiosk: Optional[KioskPipeline] = None  # Pipeline điểm danh liên tục (chế độ kiosk)
+
+    def start_model_warmup(self, preload_all: bool = None) -> Dict[str, Any]:
+        """Khởi động model nhận diện trên luồng nền"""
+        try:
+            started = self.recognition_service.start_warmup(preload_all)
+            return {
+                'success': True,
+                'started': started
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error starting model warm-up: {str(e)}'
+            }
+
+    def sync_image_changes(self) -> Dict[str, Any]:
+        """Kiểm tra ảnh sinh viên bị thêm/sửa/xóa trực tiếp trên đĩa và cập nhật gallery tương ứng"""
+        try:
+            diff = self.recognition_service.sync_image_changes()
+            return {
+                'success': True,
+                'message': f'Student images: {diff.summary()}' if diff else 'Student images are up to date',
+                'added': len(diff.added),
+                'changed': len(diff.changed),
+                'removed': len(diff.removed),
+                'students': sorted(diff.students)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error checking student images: {str(e)}'
+            }
+
+    def get_model_status(self) -> Dict[str, Any]:
+        """Lấy trạng thái sẵn sàng của model nhận diện hiện tại"""
+        try:
+            status = self.recognition_service.get_warmup_status()
+            return {
+                'success': True,
+                **status
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error getting model status: {str(e)}'
+            }
+
+    def start_kiosk(self, model_name: str = None, class_name: str = None, status: str = 'present') -> Dict[str, Any]:
+        """
+        Bắt đầu chế độ kiosk: điểm danh liên tục từ webcam
+
+        Args:
+            model_name: Tên mô hình nhận diện sử dụng (không bắt buộc)
+            class_name: Chỉ nhận diện trong sinh viên của lớp này (không bắt buộc)
+            status: Trạng thái điểm danh (mặc định: 'present')
+
+        Returns:
+            Dictionary cho biết kiosk đã khởi động hay chưa
+        """
+        try:
+            if self.kiosk and self.kiosk.running:
+                return {
+                    'success': False,
+                    'message': 'Kiosk mode is already running'
+                }
+
+            kiosk = KioskPipeline(model_name=model_name, class_name=class_name, status=status)
+            if kiosk.roster is not None and not kiosk.roster:
+                return {
+                    'success': False,
+                    'message': 'No students found in the selected class/roster'
+                }
+            kiosk.start()
+            self.kiosk = kiosk
+            return {
+                'success': True,
+                'message': 'Kiosk mode started'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error starting kiosk mode: {str(e)}'
+            }
+
+    def get_kiosk_stats(self) -> Dict[str, Any]:
+        """Lấy số liệu từng giai đoạn của kiosk (độ sâu hàng đợi, tốc độ, số sinh viên đã điểm danh)"""
+        if not self.kiosk:
+            return {
+                'success': False,
+                'message': 'Kiosk mode is not running'
+            }
+        return {
+            'success': True,
+            'running': self.kiosk.running,
+            **self.kiosk.stats()
+        }
+
+    def stop_kiosk(self) -> Dict[str, Any]:
+        """Dừng chế độ kiosk và trả về danh sách sinh viên đã điểm danh"""
+        if not self.kiosk:
+            return {
+                'success': False,
+                'message': 'Kiosk mode is not running'
+            }
+        try:
+            stats = self.kiosk.stop()
+            marked = [
+                {
+                    'student_id': result.student_id,
+                    'student_name': result.student_name,
+                    'confidence': result.confidence
+                }
+                for result in self.kiosk.marked
+            ]
+            return {
+                'success': True,
+                'message': f'Kiosk mode stopped: attendance marked for {len(marked)} students',
+                'marked': marked,
+                **stats
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error stopping kiosk mode: {str(e)}'
+            }
+        finally:
+            self.kiosk = None
 
     def take_attendance_from_image(
         self,
-        image_path: str,
+        image_path: ImageSource,
         model_name: str = None,
-        status: str = 'present'
+        status: str = 'present',
+        class_name: str = None,
+        roster: List[str] = None
     ) -> Dict[str, Any]:
         """
         Điểm danh bằng cách nhận diện khuôn mặt từ ảnh
 
         Args:
-            image_path: Đường dẫn đến ảnh
+            image_path: Đường dẫn ảnh, khung hình BGR (ndarray) hoặc ảnh đã mã hóa (bytes);
+                        khung hình webcam được nhận diện trực tiếp, không ghi ra file tạm
             model_name: Tên mô hình nhận diện sử dụng (không bắt buộc)
             status: Trạng thái điểm danh (mặc định: 'present')
+            class_name: Chỉ nhận diện trong sinh viên của lớp này (không bắt buộc)
+            roster: Danh sách mã sinh viên của buổi học (không bắt buộc)
 
         Returns:
             Dictionary chứa kết quả điểm danh
         """
         try:
-            # Kiểm tra file ảnh có tồn tại không
-            if not os.path.exists(image_path):
+            # Kiểm tra file ảnh có tồn tại không (chỉ khi truyền đường dẫn)
+            if isinstance(image_path, str) and not os.path.exists(image_path):
                 return {
                     'success': False,
                     'message': 'Image file not found'
@@ -260,8 +455,19 @@ class AttendanceController:
             if model_name:
                 self.recognition_service.change_model(model_name)
 
+            # Giới hạn tìm kiếm trong danh sách lớp nếu được chỉ định
+            roster = self.recognition_service.resolve_roster(class_name, roster)
+            if roster is not None and not roster:
+                return {
+                    'success': False,
+                    'message': 'No students found in the selected class/roster'
+                }
+
             # Nhận diện khuôn mặt trong ảnh
-            result = self.recognition_service.recognize_student(image_path)
+            result = self.recognition_service.recognize_student(image_path, roster)
+
+            # Lưu ảnh webcam để đối chiếu sau này (chỉ khi bật SAVE_CAPTURES_FOR_AUDIT)
+            capture_path = self._save_audit_capture(image_path, result)
 
             # Nếu không nhận diện được sinh viên nào
             if not result.success:
@@ -271,7 +477,8 @@ class AttendanceController:
                     'success': False,
                     'recognized': False,  # Luôn trả về key này
                     'message': error_message,
-                    'recognition_result': result
+                    'recognition_result': result,
+                    'capture_path': capture_path
                 }
 
             # Đánh dấu điểm danh
@@ -290,14 +497,16 @@ class AttendanceController:
                     'student_name': result.student_name,
                     'confidence': result.confidence,
                     'model_used': result.model_used,
-                    'attendance': attendance
+                    'attendance': attendance,
+                    'capture_path': capture_path
                 }
             except ValueError as e:
                 # Lỗi khi đánh dấu điểm danh (ví dụ: đã điểm danh rồi)
                 return {
                     'success': False,
                     'message': str(e),
-                    'recognition_result': result
+                    'recognition_result': result,
+                    'capture_path': capture_path
                 }
 
         except Exception as e:
@@ -306,6 +515,232 @@ class AttendanceController:
                 'message': f'Error taking attendance: {str(e)}'
             }
 
+    def _save_audit_capture(self, image: ImageSource, result: FaceRecognitionResult) -> Optional[str]:
+        """
+        Lưu ảnh chụp từ webcam vào AUDIT_CAPTURE_PATH/<ngày>/ nếu bật SAVE_CAPTURES_FOR_AUDIT
+
+        Returns:
+            Đường dẫn ảnh đã lưu, hoặc None (không bật lưu vết, ảnh vốn đã là file, hoặc lỗi ghi)
+        """
+        if not config.SAVE_CAPTURES_FOR_AUDIT or isinstance(image, str):
+            return None
+        now = datetime.now()
+        file_name = f"{now:%H%M%S_%f}_{result.student_id or 'unknown'}.jpg"
+        try:
+            return CameraUtility.save_frame(image, os.path.join(config.AUDIT_CAPTURE_PATH, str(now.date()), file_name))
+        except Exception as e:
+            print(f"⚠ Could not save audit capture: {str(e)}")
+            return None
+
+    def take_attendance_from_folder(
+        self,
+        folder_path: str,
+        model_name: str = None,
+        status: str = 'present',
+        class_name: str = None,
+        roster: List[str] = None,
+        progress: Callable[[int, int], bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Điểm danh hàng loạt từ một thư mục ảnh (nhận diện theo lô)
+
+        Args:
+            folder_path: Thư mục chứa ảnh
+            model_name: Tên mô hình nhận diện sử dụng (không bắt buộc)
+            status: Trạng thái điểm danh (mặc định: 'present')
+            class_name: Chỉ nhận diện trong sinh viên của lớp này (không bắt buộc)
+            roster: Danh sách mã sinh viên của buổi học (không bắt buộc)
+            progress: Nhận (số ảnh đã xử lý, tổng số ảnh) sau mỗi lô; trả về False để dừng (không bắt buộc)
+
+        Returns:
+            Dictionary chứa kết quả điểm danh cho từng ảnh ('cancelled' = True nếu dừng giữa chừng)
+        """
+        try:
+            if not os.path.isdir(folder_path):
+                return {
+                    'success': False,
+                    'message': 'Folder not found'
+                }
+
+            image_paths = sorted(
+                os.path.join(folder_path, name)
+                for name in os.listdir(folder_path)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not image_paths:
+                return {
+                    'success': False,
+                    'message': 'No images found in folder'
+                }
+
+            # Thay đổi mô hình nếu được chỉ định
+            if model_name:
+                self.recognition_service.change_model(model_name)
+
+            roster = self.recognition_service.resolve_roster(class_name, roster)
+            if roster is not None and not roster:
+                return {
+                    'success': False,
+                    'message': 'No students found in the selected class/roster'
+                }
+
+            marked = []
+            failed = []
+            processed = 0
+            cancelled = False
+            start = time.time()
+
+            # Nhận diện theo từng phần để báo tiến độ và dừng được giữa chừng
+            chunk_size = max(1, config.RECOGNITION_BATCH_SIZE) if progress else len(image_paths)
+            for chunk_start in range(0, len(image_paths), chunk_size):
+                chunk = image_paths[chunk_start:chunk_start + chunk_size]
+                results = self.recognition_service.recognize_students_batch(chunk, roster)
+
+                for image_path, result in zip(chunk, results):
+                    image_name = os.path.basename(image_path)
+                    if not result.success:
+                        failed.append({
+                            'image': image_name,
+                            'message': result.error_message or 'No student recognized in the image'
+                        })
+                        continue
+
+                    try:
+                        self.service.mark_attendance(
+                            student_id=result.student_id,
+                            confidence_score=result.confidence,
+                            model_used=result.model_used,
+                            status=status
+                        )
+                        marked.append({
+                            'image': image_name,
+                            'student_id': result.student_id,
+                            'student_name': result.student_name,
+                            'confidence': result.confidence
+                        })
+                    except ValueError as e:
+                        # Đã điểm danh rồi hoặc sinh viên không tồn tại
+                        failed.append({'image': image_name, 'message': str(e)})
+
+                processed += len(chunk)
+                if progress and progress(processed, len(image_paths)) is False:
+                    cancelled = processed < len(image_paths)
+                    break
+
+            elapsed = time.time() - start
+            message = (f'Attendance marked for {len(marked)}/{processed} images '
+                       f'({processed / max(elapsed, 1e-6):.1f} images/s)')
+            if cancelled:
+                message += f' - cancelled after {processed}/{len(image_paths)} images'
+
+            return {
+                'success': True,
+                'message': message,
+                'marked': marked,
+                'failed': failed,
+                'total': len(image_paths),
+                'processed': processed,
+                'cancelled': cancelled,
+                'elapsed': elapsed
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error taking attendance: {str(e)}'
+            }
+
+    def take_attendance_from_group_photo(
+        self,
+        image_path: str,
+        model_name: str = None,
+        status: str = 'present',
+        class_name: str = None,
+        roster: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Điểm danh cả lớp từ một ảnh chụp nhiều khuôn mặt
+
+        Args:
+            image_path: Đường dẫn đến ảnh chụp cả lớp
+            model_name: Tên mô hình nhận diện sử dụng (không bắt buộc)
+            status: Trạng thái điểm danh (mặc định: 'present')
+            class_name: Chỉ nhận diện trong sinh viên của lớp này (không bắt buộc)
+            roster: Danh sách mã sinh viên của buổi học (không bắt buộc)
+
+        Returns:
+            Dictionary chứa kết quả điểm danh cho từng khuôn mặt
+        """
+        try:
+            if not os.path.exists(image_path):
+                return {
+                    'success': False,
+                    'message': 'Image file not found'
+                }
+
+            # Thay đổi mô hình nếu được chỉ định
+            if model_name:
+                self.recognition_service.change_model(model_name)
+
+            roster = self.recognition_service.resolve_roster(class_name, roster)
+            if roster is not None and not roster:
+                return {
+                    'success': False,
+                    'message': 'No students found in the selected class/roster'
+                }
+
+            start = time.time()
+            results = self.recognition_service.recognize_students_in_group(image_path, roster)
+            elapsed = time.time() - start
+
+            if not results:
+                return {
+                    'success': False,
+                    'message': 'No faces detected in the image'
+                }
+
+            # Đánh dấu điểm danh hàng loạt cho các khuôn mặt nhận diện được
+            recognized = [result for result in results if result.success]
+            bulk = self.service.mark_attendance_bulk(recognized, status=status)
+            marked_ids = {record.student_id for record in bulk['marked']}
+            skipped = {item['student_id']: item['message'] for item in bulk['skipped']}
+
+            marked = []
+            failed = []
+            for face_idx, result in enumerate(results, 1):
+                face_label = f"Face {face_idx}"
+                if result.student_id in marked_ids and result.success:
+                    marked.append({
+                        'image': face_label,
+                        'student_id': result.student_id,
+                        'student_name': result.student_name,
+                        'confidence': result.confidence
+                    })
+                elif result.success:
+                    failed.append({'image': face_label, 'message': skipped.get(result.student_id, 'Not marked')})
+                else:
+                    failed.append({'image': face_label, 'message': result.error_message or 'No student recognized'})
+
+            return {
+                'success': True,
+                'message': f'Attendance marked for {len(marked)} students ({len(results)} faces detected)',
+                'marked': marked,
+                'failed': failed,
+                'total': len(results),
+                'elapsed': elapsed
+            }
+
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error taking attendance: {str(e)}'
+            }
+
     def get_student_attendance_history(self, student_id: str) -> Dict[str, Any]:
         """Get attendance history for a student"""
         try:
@@ -419,9 +854,15 @@ class AttendanceController:
         """Get list of available recognition models"""
         try:
             models = self.recognition_service.get_available_models()
+            # Kích thước (MB) của các model đang thường trú trong bộ nhớ
+            resident = {
+                entry['model']: entry['size_mb']
+                for entry in self.recognition_service.get_resident_models()
+            }
             return {
                 'success': True,
-                'models': models
+                'models': models,
+                'resident': resident
             }
         except Exception as e:
             return {
@@ -530,6 +971,10 @@ class DataAugmentationController:
                 num_augmented=num_augmented
             )
 
+            # Embed only the new augmented images into loaded galleries
+            gallery_manager.sync_student(student_id)
+            image_manifest.refresh_student(student_id)
+
             return {
                 'success': True,
                 'message': f'Created {created} augmented images for {student_id}',
@@ -545,12 +990,13 @@ class DataAugmentationController:
                 'message': f'Error augmenting student data: {str(e)}'
             }
 
-    def augment_all_students(self, num_augmented: int = 5) -> Dict[str, Any]:
+    def augment_all_students(self, num_augmented: int = 5, progress: Callable[[int, int], bool] = None) -> Dict[str, Any]:
         """
         Augment images for all students
 
         Args:
             num_augmented: Number of augmented images per original image
+            progress: Called with (students done, total students); return False to stop
 
         Returns:
             Dictionary with statistics
@@ -564,12 +1010,20 @@ class DataAugmentationController:
 
             stats = self.augment_existing_dataset(
                 self.data_dir,
-                augmentation_per_image=num_augmented
+                augmentation_per_image=num_augmented,
+                progress=progress
             )
 
+            # Embed only the new augmented images into loaded galleries
+            self._sync_all_students()
+
+            message = f'Augmented {stats["students_processed"]} students'
+            if stats.get('cancelled'):
+                message += ' (cancelled)'
+
             return {
                 'success': True,
-                'message': f'Augmented {stats["students_processed"]} students',
+                'message': message,
                 'stats': stats
             }
 
@@ -607,6 +1061,9 @@ class DataAugmentationController:
                         os.remove(file_path)
                         deleted_count += 1
 
+                gallery_manager.sync_student(student_id)
+                image_manifest.refresh_student(student_id)
+
                 return {
                     'success': True,
                     'message': f'Deleted {deleted_count} augmented images for {student_id}',
@@ -625,6 +1082,8 @@ class DataAugmentationController:
                             os.remove(file_path)
                             deleted_count += 1
 
+                self._sync_all_students()
+
                 return {
                     'success': True,
                     'message': f'Deleted {deleted_count} augmented images from all students',
@@ -636,3 +1095,10 @@ class DataAugmentationController:
                 'success': False,
                 'message': f'Error cleaning augmented images: {str(e)}'
             }
+
+    def _sync_all_students(self):
+        """Propagate image changes of every student folder to loaded galleries and the image manifest"""
+        student_ids = [name for name in os.listdir(self.data_dir) if os.path.isdir(os.path.join(self.data_dir, name))]
+        for student_id in student_ids:
+            gallery_manager.sync_student(student_id)
+        image_manifest.refresh_students(student_ids)
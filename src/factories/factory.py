@@ -1,31 +1,331 @@
 """
 Factory Pattern for creating Face Recognition Strategies
 """
-from typing import Dict, Type
+import gc
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+from src.config.config import config
+from src.strategies.model_spec import ModelSpec, register_model_spec
 from src.strategies.face_recognition_strategy import (
     IFaceRecognitionStrategy,
+    RecognitionEngine,
     VGGFaceStrategy,
     FacenetStrategy,
     ArcFaceStrategy,
-    Facenet512Strategy
+    Facenet512Strategy,
+    CascadeStrategy
 )
 
 
+@dataclass
+class ResidentModel:
+    """Một model đang thường trú trong bộ nhớ"""
+    strategy: IFaceRecognitionStrategy
+    model_bytes: int  # Dung lượng mạng nhận diện
+    detector_bytes: int  # Dung lượng bộ phát hiện khuôn mặt (dùng chung giữa các model)
+    load_seconds: float  # Thời gian nạp lần đầu
+    last_used: float = field(default_factory=time.time)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded recognition models (Singleton)
+    Bộ nhớ đệm dùng chung cho các model đã nạp
+    - Khóa theo (tên model, detector)
+    - Loại bỏ model ít dùng nhất (LRU) khi tổng dung lượng vượt MODEL_CACHE_BUDGET_MB
+    - Mọi FaceRecognitionService dùng chung một instance strategy cho mỗi khóa,
+      nên chuyển qua lại giữa các model không phải nạp lại mạng
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelRegistry, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # OrderedDict: phần tử đầu là model ít được dùng gần đây nhất
+        self._models: "OrderedDict[Tuple[str, str], ResidentModel]" = OrderedDict()
+        # Model đang được nạp: khóa -> Future trả về strategy (luồng khác chờ Future, không chờ lock)
+        self._loading: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.RLock()
+        self.budget_bytes = int(config.MODEL_CACHE_BUDGET_MB * 1024 * 1024)
+        self._initialized = True
+
+    def get_strategy(
+        self,
+        model_name: str,
+        strategy_class: Callable[[], IFaceRecognitionStrategy],
+        load: bool = True
+    ) -> IFaceRecognitionStrategy:
+        """
+        Get the shared strategy for a model, loading it on first use
+        Lấy strategy dùng chung của một model, nạp model ở lần dùng đầu tiên
+
+        Args:
+            model_name: Tên model
+            strategy_class: Lớp strategy dùng để khởi tạo khi model chưa thường trú
+            load: False = không nạp model nếu chưa thường trú (trả về strategy chưa nạp, không đăng ký)
+        """
+        with self._lock:
+            strategy = strategy_class()
+            key = (model_name, strategy.detection_backend)
+
+            resident = self._models.get(key)
+            if resident is not None:
+                # Đánh dấu vừa được dùng (chuyển về cuối hàng đợi LRU)
+                resident.last_used = time.time()
+                self._models.move_to_end(key)
+                return resident.strategy
+
+            if not load:
+                return strategy
+
+            pending = self._loading.get(key)
+            if pending is None:
+                # Luồng này nạp model; các luồng khác cần cùng model sẽ chờ Future này
+                pending = self._loading[key] = Future()
+                loader = True
+            else:
+                loader = False
+
+        if not loader:
+            return pending.result()
+
+        # Nạp trọng số và warm-up ngoài lock: menu/GUI vẫn đọc được trạng thái trong lúc nạp
+        start = time.time()
+        try:
+            sizes = strategy.load_model()
+        except Exception as e:
+            # Không nạp trước được (ví dụ thiếu trọng số): DeepFace sẽ tự nạp khi dùng
+            print(f"⚠ Could not preload {model_name}: {str(e)}")
+            sizes = {'model': 0, 'detector': 0}
+        except BaseException as e:
+            # Bị ngắt giữa chừng: bỏ đánh dấu đang nạp để luồng sau nạp lại, báo lỗi cho luồng đang chờ
+            with self._lock:
+                del self._loading[key]
+            pending.set_exception(e)
+            raise
+        load_seconds = time.time() - start
+
+        with self._lock:
+            self._models[key] = ResidentModel(
+                strategy=strategy,
+                model_bytes=sizes['model'],
+                detector_bytes=sizes['detector'],
+                load_seconds=load_seconds
+            )
+            del self._loading[key]
+            print(f"✓ Loaded {model_name} ({sizes['model'] / (1024 * 1024):.0f} MB) in {load_seconds:.1f}s")
+            self._evict_over_budget(keep=key)
+        pending.set_result(strategy)
+        return strategy
+
+    def resident_models(self) -> List[Dict[str, object]]:
+        """
+        Report resident models and their estimated memory size
+        Báo cáo các model đang thường trú và dung lượng ước tính
+
+        Returns:
+            Danh sách dict theo thứ tự LRU (ít dùng nhất trước); model đang nạp chưa có trong danh sách
+        """
+        with self._lock:
+            return [
+                {
+                    'model': key[0],
+                    'detector': key[1],
+                    'size_mb': (entry.model_bytes + entry.detector_bytes) / (1024 * 1024),
+                    'load_seconds': entry.load_seconds,
+                    'last_used': entry.last_used
+                }
+                for key, entry in self._models.items()
+            ]
+
+    def total_bytes(self) -> int:
+        """Tổng dung lượng thường trú (detector dùng chung chỉ tính một lần)"""
+        with self._lock:
+            detectors = {key[1]: entry.detector_bytes for key, entry in self._models.items()}
+            return sum(entry.model_bytes for entry in self._models.values()) + sum(detectors.values())
+
+    def evict(self, model_name: str, detection_backend: str = None) -> bool:
+        """
+        Evict a model from memory
+        Loại một model khỏi bộ nhớ
+
+        Returns:
+            True nếu có model bị loại
+        """
+        with self._lock:
+            key = (model_name, detection_backend or config.DETECTION_BACKEND)
+            entry = self._models.pop(key, None)
+            if entry is None:
+                return False
+
+            detector_in_use = any(k[1] == key[1] for k in self._models)
+            # Mạng dùng chung (Facenet vừa đứng riêng vừa nằm trong Cascade) chỉ giải phóng khi không còn ai dùng
+            networks_in_use = frozenset(
+                name for other in self._models.values() for name in other.strategy.network_names()
+            )
+            entry.strategy.unload_model(unload_detector=not detector_in_use, keep_networks=networks_in_use)
+            gc.collect()
+            print(f"♻ Evicted {model_name} from model cache")
+            return True
+
+    def _evict_over_budget(self, keep: Tuple[str, str]):
+        """Loại các model ít dùng nhất cho tới khi tổng dung lượng nằm trong ngân sách"""
+        while self.total_bytes() > self.budget_bytes:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                # Chỉ còn model vừa nạp: giữ lại dù vượt ngân sách
+                break
+            self.evict(*victim)
+
+
+# Global model registry instance
+model_registry = ModelRegistry()
+
+
+class ModelWarmup:
+    """
+    Background model warm-up at startup (Singleton)
+    Khởi động trước model trên luồng nền khi ứng dụng mở
+    - Nạp DEFAULT_MODEL và detector, chạy một lần suy luận giả, nạp gallery embedding
+    - Tùy chọn nạp trước các model còn lại trong AVAILABLE_MODELS (PRELOAD_ALL_MODELS)
+    - Trạng thái từng model ('pending', 'loading', 'ready', 'failed') để view hiển thị
+    Lần nhận diện đầu tiên không còn phải chờ dựng đồ thị TensorFlow và nạp trọng số.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelWarmup, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._states: Dict[str, str] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = None
+        self.finished_at = None
+        self._initialized = True
+
+    def start(self, model_name: str = None, preload_all: bool = None) -> bool:
+        """
+        Start warming up on a daemon thread
+        Bắt đầu khởi động model trên luồng nền (bỏ qua nếu đang chạy)
+
+        Args:
+            model_name: Model chính (mặc định DEFAULT_MODEL), luôn được nạp trước
+            preload_all: Nạp thêm các model khác trong AVAILABLE_MODELS (mặc định PRELOAD_ALL_MODELS)
+
+        Returns:
+            True nếu luồng warm-up được khởi động
+        """
+        model_name = model_name or config.DEFAULT_MODEL
+        if preload_all is None:
+            preload_all = config.PRELOAD_ALL_MODELS
+        names = [model_name]
+        if preload_all:
+            names += [m for m in config.AVAILABLE_MODELS if m != model_name]
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            for name in names:
+                if self._states.get(name) != 'ready':
+                    self._states[name] = 'pending'
+                    self._events.setdefault(name, threading.Event()).clear()
+            self.started_at = time.time()
+            self.finished_at = None
+            self._thread = threading.Thread(target=self._run, args=(names,), name="model-warmup", daemon=True)
+            self._thread.start()
+        return True
+
+    def is_ready(self, model_name: str = None) -> bool:
+        """Model đã được khởi động xong chưa"""
+        with self._lock:
+            return self._states.get(model_name or config.DEFAULT_MODEL) == 'ready'
+
+    def wait(self, model_name: str = None, timeout: float = None) -> bool:
+        """Chờ model khởi động xong (True nếu sẵn sàng, False nếu hết thời gian hoặc lỗi)"""
+        with self._lock:
+            event = self._events.get(model_name or config.DEFAULT_MODEL)
+        if event is None:
+            return False
+        event.wait(timeout)
+        return self.is_ready(model_name)
+
+    def status(self) -> Dict[str, str]:
+        """Trạng thái khởi động của từng model"""
+        with self._lock:
+            return dict(self._states)
+
+    def _run(self, names: List[str]):
+        """Nạp lần lượt từng model (model chính trước)"""
+        primary = names[0]
+        for name in names:
+            if self.is_ready(name):
+                continue
+            if name != primary:
+                # Đánh dấu model chính vừa được dùng để LRU không loại nó khi nạp model khác
+                FaceRecognitionStrategyFactory.create_strategy(primary, load=False)
+            self._set_state(name, 'loading')
+            start = time.time()
+            try:
+                strategy = FaceRecognitionStrategyFactory.create_strategy(name)
+                strategy.detect_stage.warm_up()
+                strategy.get_gallery()
+                self._set_state(name, 'ready')
+                print(f"🔥 {name} warmed up in {time.time() - start:.1f}s")
+            except Exception as e:
+                self._set_state(name, 'failed')
+                print(f"⚠ Warm-up of {name} failed: {str(e)}")
+        self.finished_at = time.time()
+
+    def _set_state(self, name: str, state: str):
+        with self._lock:
+            self._states[name] = state
+            if state in ('ready', 'failed'):
+                self._events.setdefault(name, threading.Event()).set()
+
+
+# Global model warm-up instance
+model_warmup = ModelWarmup()
+
+
 class FaceRecognitionStrategyFactory:
     """Lớp factory để tạo các chiến lược nhận diện khuôn mặt khác nhau"""
 
-    _strategies: Dict[str, Type[IFaceRecognitionStrategy]] = {
+    _strategies: Dict[str, Callable[[], IFaceRecognitionStrategy]] = {
         'VGG-Face': VGGFaceStrategy,
         'Facenet': FacenetStrategy,
         'ArcFace': ArcFaceStrategy,
-        'Facenet512': Facenet512Strategy
+        'Facenet512': Facenet512Strategy,
+        'Cascade': CascadeStrategy
     }
 
     # @class method để tạo chiến lược dựa trên tên mô hình
     @classmethod
-    def create_strategy(cls, model_name: str) -> IFaceRecognitionStrategy:
+    def create_strategy(cls, model_name: str, load: bool = True) -> IFaceRecognitionStrategy:
         """
         Định nghĩa phương thức tạo nhận diện khuôn mặt dựa trên tên mô hình
+        Strategy được lấy từ ModelRegistry nên model chỉ nạp một lần cho cả tiến trình
+        (load=False: không nạp model nếu chưa thường trú, để warm-up nạp trên luồng nền)
         """
 
         # Tìm lớp chiến lược tương ứng với tên mô hình
@@ -40,7 +340,7 @@ class FaceRecognitionStrategyFactory:
                 f"Available models: {available_models}"
             )
 
-        return strategy_class()
+        return model_registry.get_strategy(model_name, strategy_class, load=load)
 
     # @class method để lấy danh sách các mô hình có sẵn
     @classmethod
@@ -49,7 +349,12 @@ class FaceRecognitionStrategyFactory:
         return list(cls._strategies.keys())
 
     @classmethod
-    def register_strategy(cls, model_name: str, strategy_class: Type[IFaceRecognitionStrategy]):
+    def get_resident_models(cls) -> List[Dict[str, object]]:
+        """Get loaded models with their resident memory size"""
+        return model_registry.resident_models()
+
+    @classmethod
+    def register_strategy(cls, model_name: str, strategy_class: Callable[[], IFaceRecognitionStrategy]):
         """
         Register a new strategy (for extensibility)
 
@@ -59,3 +364,14 @@ class FaceRecognitionStrategyFactory:
         """
         cls._strategies[model_name] = strategy_class
 
+    @classmethod
+    def register_model_spec(cls, spec: ModelSpec):
+        """
+        Register a new model as a spec of the unified recognition engine
+        Đăng ký model mới chỉ bằng ModelSpec (không cần viết lớp strategy)
+
+        Args:
+            spec: Thông số model (tên DeepFace, kích thước đầu vào, số chiều, chuẩn hóa, ngưỡng)
+        """
+        register_model_spec(spec)
+        cls._strategies[spec.name] = partial(RecognitionEngine, spec)
@@ -0,0 +1,155 @@
+"""
+Approximate nearest-neighbour index for large embedding galleries
+Chỉ mục tìm kiếm gần đúng (IVF) cho gallery lớn, thuần NumPy
+- Huấn luyện nlist tâm cụm (coarse centroids) bằng spherical k-means trên một mẫu con
+- Mỗi dòng gallery thuộc danh sách đảo (inverted list) của tâm cụm gần nhất
+- Truy vấn chỉ duyệt nprobe danh sách gần nhất thay vì toàn bộ gallery
+  (nprobe lớn hơn: recall cao hơn, chậm hơn)
+"""
+import math
+import os
+from typing import List, Optional
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized gallery rows
+    Chỉ mục IVF trên các dòng gallery đã chuẩn hóa L2
+
+    Chỉ tâm cụm được lưu ra đĩa (phần tốn thời gian huấn luyện);
+    việc gán dòng vào danh sách được tính lại khi nạp, chỉ tốn một phép nhân ma trận.
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8):
+        self.nlist = nlist  # 0 = tự chọn theo kích thước gallery
+        self.nprobe = nprobe
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.trained_size = 0  # Số dòng gallery lúc huấn luyện
+        self.clear()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids.shape[0] > 0
+
+    @property
+    def dimension(self) -> int:
+        return self.centroids.shape[1]
+
+    def clear(self) -> None:
+        """Xóa toàn bộ danh sách đảo (giữ lại tâm cụm đã huấn luyện)"""
+        self._lists: List[List[int]] = [[] for _ in range(self.centroids.shape[0])]
+        self._arrays: List[Optional[np.ndarray]] = [None] * len(self._lists)
+
+    def train(self, vectors: np.ndarray, max_samples: int = 100000, iterations: int = 10) -> None:
+        """
+        Train coarse centroids on (a sample of) the gallery
+        Huấn luyện tâm cụm trên một mẫu con của gallery
+
+        Args:
+            vectors: Ma trận (N, D) các dòng đã chuẩn hóa L2
+            max_samples: Số mẫu tối đa dùng để huấn luyện
+            iterations: Số vòng lặp k-means
+        """
+        n = vectors.shape[0]
+        nlist = self.nlist or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        # Lấy mẫu con tất định để huấn luyện nhanh và lặp lại được
+        rng = np.random.default_rng(0)
+        sample_size = min(n, max(nlist * 32, 1), max_samples)
+        sample = vectors[rng.choice(n, sample_size, replace=False)] if sample_size < n else vectors
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            nonempty = counts > 0
+            # Cụm rỗng giữ nguyên tâm cũ
+            centroids[nonempty] = sums[nonempty]
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids = centroids / np.maximum(norms, 1e-12)
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = n
+        self.clear()
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Assign gallery rows to their nearest inverted list
+        Gán các dòng gallery vào danh sách đảo của tâm cụm gần nhất
+
+        Args:
+            rows: Chỉ số dòng trong gallery
+            vectors: Các vector (đã chuẩn hóa L2) tương ứng
+        """
+        if len(rows) == 0:
+            return
+        assignment = np.argmax(np.atleast_2d(vectors) @ self.centroids.T, axis=1)
+        for row, list_id in zip(np.atleast_1d(rows), assignment):
+            self._lists[list_id].append(int(row))
+            self._arrays[list_id] = None
+
+    def search(self, q: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """
+        Candidate gallery rows for a normalized query
+        Lấy các dòng ứng viên từ nprobe danh sách gần truy vấn nhất
+
+        Returns:
+            Mảng chỉ số dòng gallery (có thể chứa dòng đã tombstone, phía gọi tự lọc)
+        """
+        nprobe = min(max(nprobe or self.nprobe, 1), self.centroids.shape[0])
+        scores = self.centroids @ q
+        if nprobe < scores.shape[0]:
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(scores.shape[0])
+
+        candidates = [self._list_array(int(j)) for j in probes]
+        candidates = [c for c in candidates if c.size]
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(candidates)
+
+    def save(self, path: str) -> None:
+        """Lưu tâm cụm ra file .npz (ghi tạm rồi thay thế để không hỏng file)"""
+        tmp_file = path + '.tmp.npz'
+        np.savez(
+            tmp_file,
+            centroids=self.centroids,
+            trained_size=np.array(self.trained_size, dtype=np.int64),
+            nlist=np.array(self.nlist, dtype=np.int64)
+        )
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path: str, nlist: int = 0, nprobe: int = 8) -> Optional['IVFIndex']:
+        """
+        Load trained centroids; None if missing, unreadable or trained with another nlist
+        Nạp tâm cụm đã huấn luyện; trả về None nếu không dùng được
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data['nlist']) != nlist:
+                    return None
+                index = cls(nlist=nlist, nprobe=nprobe)
+                index.centroids = np.ascontiguousarray(data['centroids'], dtype=np.float32)
+                index.trained_size = int(data['trained_size'])
+            index.clear()
+            return index
+        except Exception as e:
+            print(f"⚠ ANN index unreadable, retraining: {str(e)}")
+            return None
+
+    def _list_array(self, list_id: int) -> np.ndarray:
+        """Mảng NumPy của một danh sách đảo (chỉ chuyển đổi lại khi danh sách thay đổi)"""
+        array = self._arrays[list_id]
+        if array is None:
+            array = np.array(self._lists[list_id], dtype=np.int64)
+            self._arrays[list_id] = array
+        return array
@@ -0,0 +1,902 @@
+"""
+Resident embedding gallery for fast face search
+Gallery embedding thường trú trong bộ nhớ
+- Nạp embedding của tất cả ảnh sinh viên MỘT lần vào ma trận float32 liên tục, đã chuẩn hóa L2
+- Mỗi dòng ma trận gắn với một nhãn số nguyên (chỉ số sinh viên)
+- Truy vấn top-k bằng một phép nhân ma trận (BLAS) và np.argpartition,
+  thay cho việc gọi DeepFace.find (đọc pickle + dựng DataFrame) ở mỗi lần nhận diện
+- Cập nhật tăng dần: chỉ embed ảnh mới, đánh dấu xóa (tombstone) ảnh đã bị xóa
+- Tìm kiếm hai giai đoạn khi gallery lớn: so với vài embedding đại diện (prototype) của mỗi sinh viên
+  để lọc danh sách ứng viên, sau đó chỉ tính lại các mẫu của những sinh viên đó
+- Tùy chọn chỉ mục IVF (ANN_ENABLED) cho gallery rất lớn
+- Tìm kiếm giới hạn trong danh sách lớp (roster): tập dòng của mỗi roster được tính sẵn và dùng lại
+- Tùy chọn lưu vector dạng float16/int8 trong file ánh xạ bộ nhớ (GALLERY_STORE_DTYPE)
+"""
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.config import config
+from src.gallery import quantized_store
+from src.gallery.ann_index import IVFIndex
+
+# Các định dạng ảnh được đưa vào gallery
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Hàm trích xuất embedding: nhận đường dẫn ảnh, trả về vector (mảng rỗng nếu thất bại)
+EmbedFunction = Callable[[str], np.ndarray]
+
+
+@dataclass
+class GalleryMatch:
+    """Một kết quả tìm kiếm trong gallery"""
+    student_id: str  # Mã sinh viên của mẫu khớp
+    identity: str  # Đường dẫn ảnh mẫu khớp
+    distance: float  # Khoảng cách theo DISTANCE_METRIC
+    similarity: float  # Cosine similarity
+
+
+class EmbeddingGallery:
+    """
+    In-memory embedding gallery for one (model, detector) pair
+    Gallery embedding cho một cặp (model, detector)
+
+    Dữ liệu được lưu trong các buffer có dung lượng dự trữ (tăng gấp đôi khi đầy):
+    - _vectors: ma trận (capacity, D) float32, C-contiguous, mỗi dòng đã chuẩn hóa L2
+    - _norms: độ dài gốc của từng embedding (dùng cho metric 'euclidean')
+    - _labels: nhãn int32 của từng dòng, trỏ vào _label_names
+    - _alive: False nếu dòng đã bị đánh dấu xóa (tombstone)
+    - _mtimes: thời điểm sửa đổi của file ảnh lúc được embed
+    Chỉ _count dòng đầu tiên là hợp lệ.
+
+    Với GALLERY_STORE_DTYPE là float16/int8, sau mỗi lần lưu _vectors được thay bằng
+    np.memmap chỉ đọc của file store (kèm _scales cho int8); dòng mới được thêm vào
+    bản sao float32 trong RAM cho tới lần lưu kế tiếp.
+
+    Lớp prototype (tâm cụm embedding của từng sinh viên) được dựng lại lười biếng,
+    chỉ cho những sinh viên có dòng thay đổi kể từ lần tìm kiếm trước.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        detection_backend: str,
+        distance_metric: str = None,
+        database_path: str = None,
+        cache_dir: str = None
+    ):
+        self.model_name = model_name
+        self.detection_backend = detection_backend
+        self.distance_metric = distance_metric or config.DISTANCE_METRIC
+        self.database_path = database_path or config.STUDENT_DATABASE_PATH
+        self.cache_dir = cache_dir or config.GALLERY_CACHE_PATH
+        self.store_dtype = config.GALLERY_STORE_DTYPE  # float32 (RAM), float16 hoặc int8 (memmap)
+
+        self._lock = threading.RLock()  # Bảo vệ dữ liệu khi nhiều luồng cùng truy cập
+        self._embed_fn: Optional[EmbedFunction] = None  # Hàm embed được giữ lại cho cập nhật tăng dần
+        self._loaded = False
+        self._ann: Optional[IVFIndex] = None  # Chỉ mục IVF, chỉ dựng khi gallery đủ lớn
+        self._ann_rows = 0  # Số dòng đầu buffer đã được gán vào chỉ mục IVF
+        self._version = 0  # Tăng mỗi khi các dòng thay đổi, dùng để làm mới cache roster
+        # Cache roster: tập mã sinh viên -> (phiên bản, các dòng còn hiệu lực của roster)
+        self._roster_rows: "OrderedDict[FrozenSet[str], Tuple[int, np.ndarray]]" = OrderedDict()
+        self._store_file: Optional[str] = None  # File store lượng tử mà cache .npz đang trỏ tới
+        self._reset()
+
+    def _reset(self) -> None:
+        """Xóa toàn bộ dữ liệu trong bộ nhớ"""
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._scales = np.empty(0, dtype=np.float32)  # Hệ số tỉ lệ int8 (1.0 với float32/float16)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._labels = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._mtimes = np.empty(0, dtype=np.float64)
+        self._paths: List[str] = []
+        self._path_rows: Dict[str, int] = {}  # Đường dẫn ảnh -> chỉ số dòng còn hiệu lực
+        self._label_names: List[str] = []
+        self._label_index: Dict[str, int] = {}
+        self._failed: Dict[str, float] = {}  # Ảnh không trích xuất được embedding -> mtime
+        self._count = 0
+        self._dead = 0
+        self._version += 1
+        # Lớp prototype: nhãn -> (các dòng còn hiệu lực, ma trận tâm cụm)
+        self._label_rows: Dict[int, np.ndarray] = {}
+        self._label_protos: Dict[int, np.ndarray] = {}
+        self._dirty_labels: set = set()
+        self._proto_matrix = np.empty((0, 0), dtype=np.float32)
+        self._proto_labels = np.empty(0, dtype=np.int32)
+        if self._ann is not None:
+            # Chỉ số dòng thay đổi: gán lại từ đầu, tâm cụm vẫn dùng được
+            self._ann.clear()
+            self._ann_rows = 0
+
+    @property
+    def size(self) -> int:
+        """Số vector còn hiệu lực trong gallery"""
+        return self._count - self._dead
+
+    @property
+    def dimension(self) -> int:
+        """Số chiều embedding (0 nếu gallery rỗng)"""
+        return self._vectors.shape[1]
+
+    @property
+    def is_memory_mapped(self) -> bool:
+        """True nếu vector đang được đọc trực tiếp từ file store (memmap)"""
+        return isinstance(self._vectors, np.memmap)
+
+    @property
+    def num_students(self) -> int:
+        """Số sinh viên có ít nhất một embedding"""
+        with self._lock:
+            alive_labels = self._labels[:self._count][self._alive[:self._count]]
+            return int(np.unique(alive_labels).size)
+
+    def has_student(self, student_id: str) -> bool:
+        """Sinh viên có ít nhất một mẫu còn hiệu lực trong gallery"""
+        with self._lock:
+            return self._roster_candidates(frozenset([student_id])).size > 0
+
+    def has_image(self, path: str) -> bool:
+        """Ảnh có embedding còn hiệu lực trong gallery"""
+        with self._lock:
+            return path in self._path_rows
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def cache_file(self) -> str:
+        """Đường dẫn file cache .npz của gallery"""
+        safe_model = self.model_name.replace('-', '').lower()
+        return os.path.join(self.cache_dir, f"gallery_{safe_model}_{self.detection_backend}.npz")
+
+    @property
+    def ann_file(self) -> str:
+        """Đường dẫn file tâm cụm của chỉ mục IVF"""
+        safe_model = self.model_name.replace('-', '').lower()
+        return os.path.join(self.cache_dir, f"ivf_{safe_model}_{self.detection_backend}.npz")
+
+    def load(self, embed_fn: EmbedFunction, invalidated: FrozenSet[str] = frozenset()) -> None:
+        """
+        Load the gallery once (from cache, embedding only images missing from it)
+        Nạp gallery một lần duy nhất
+
+        - Đọc cache .npz nếu có
+        - Chỉ trích xuất embedding cho các ảnh mới hoặc đã bị thay đổi (mtime khác)
+        - Loại bỏ các dòng mà file ảnh đã bị xóa
+
+        Args:
+            embed_fn: Hàm trích xuất embedding cho một ảnh
+            invalidated: Ảnh có nội dung đã đổi theo image manifest (embed lại dù mtime trùng)
+        """
+        with self._lock:
+            if self._loaded:
+                return
+
+            self._embed_fn = embed_fn
+            entries = self._scan_database()
+            cached = self._read_cache()
+
+            # Giữ lại các embedding có ảnh vẫn còn tồn tại và chưa bị sửa đổi
+            self._reset()
+            self._store_file = cached['store_file']
+            keep = []
+            for path, _, mtime in cached['rows']:
+                entry = entries.get(path)
+                keep.append(entry is not None and (mtime is None or entry[1] == mtime) and path not in invalidated)
+            kept = sum(keep)
+
+            for path, mtime in cached['failed'].items():
+                entry = entries.get(path)
+                if entry is not None and entry[1] == mtime and path not in invalidated:
+                    self._failed[path] = mtime
+
+            cached_paths = {row[0] for row, k in zip(cached['rows'], keep) if k}
+            pending = [p for p in entries if p not in cached_paths and p not in self._failed]
+
+            if (cached['store'] is not None and cached['store_dtype'] == self.store_dtype
+                    and kept == len(cached['rows']) and not pending):
+                # Cache khớp hoàn toàn: dùng thẳng file store qua memmap, không sao chép vào RAM
+                self._adopt_store(cached, entries)
+            else:
+                for (path, idx, _), k in zip(cached['rows'], keep):
+                    if k:
+                        self._append(path, entries[path][0], cached['raw'](idx), entries[path][1])
+
+            if pending:
+                print(f"🧠 Building {self.model_name} gallery: embedding {len(pending)} new image(s)...")
+            self._embed_and_append(pending, entries)
+
+            self._loaded = True
+            # Lưu lại nếu dữ liệu thay đổi hoặc GALLERY_STORE_DTYPE khác định dạng của cache
+            wanted_dtype = self.store_dtype if self.store_dtype in quantized_store.STORE_DTYPES else None
+            format_changed = bool(cached['rows']) and cached['store_dtype'] != wanted_dtype
+            if kept != len(cached['rows']) or pending or format_changed:
+                self.save()
+
+            print(f"✓ {self.model_name} gallery ready: {self.size} embeddings, "
+                  f"{self.num_students} students")
+
+    def invalidate(self, paths: Iterable[str]) -> None:
+        """
+        Drop rows of images whose content changed, so the next sync_student re-embeds them
+        Bỏ các dòng của ảnh có nội dung đã đổi (sync_student tiếp theo sẽ embed lại)
+        """
+        with self._lock:
+            for path in paths:
+                self._tombstone(path)
+                self._failed.pop(path, None)
+
+    def add_embeddings(self, items: Iterable[Tuple[str, str, np.ndarray, float]]) -> int:
+        """
+        Add embeddings computed elsewhere (e.g. by bulk-import worker processes)
+        Thêm các embedding đã được tính sẵn, không lưu file (người gọi gọi save() một lần sau cùng)
+
+        Args:
+            items: Các bộ (đường dẫn ảnh, mã sinh viên, embedding, mtime); embedding rỗng = ảnh lỗi
+
+        Returns:
+            Số embedding được thêm
+        """
+        added = 0
+        with self._lock:
+            for path, student_id, embedding, mtime in items:
+                embedding = np.asarray(embedding, dtype=np.float32).ravel()
+                if embedding.size == 0:
+                    self._failed[path] = mtime
+                    continue
+                if path in self._path_rows:
+                    self._tombstone(path)
+                self._append(path, student_id, embedding, mtime)
+                added += 1
+            self._maybe_compact()
+        return added
+
+    def sync_student(self, student_id: str) -> Tuple[int, int]:
+        """
+        Bring one student's rows in line with their image folder
+        Đồng bộ các dòng của một sinh viên với thư mục ảnh của họ
+
+        - Ảnh mới hoặc bị ghi đè: chỉ embed những ảnh đó
+        - Ảnh đã bị xóa (hoặc cả thư mục bị xóa): đánh dấu tombstone
+        Chi phí chỉ bằng số ảnh thay đổi của sinh viên, không dựng lại cả gallery.
+
+        Returns:
+            Tuple (số ảnh được thêm, số dòng bị xóa)
+        """
+        if not self._loaded:
+            # Gallery chưa nạp: lần nạp tới sẽ tự đối chiếu với thư mục
+            return 0, 0
+
+        entries = self._scan_student(student_id)
+
+        with self._lock:
+            existing = {p: r for p, r in self._path_rows.items()
+                        if self._label_names[self._labels[r]] == student_id}
+            stale = [p for p, r in existing.items()
+                     if p not in entries or entries[p][1] != self._mtimes[r]]
+            for path in stale:
+                self._tombstone(path)
+            for path in list(self._failed):
+                if path in entries and self._failed[path] != entries[path][1]:
+                    del self._failed[path]
+            pending = [p for p in entries if p not in self._path_rows and p not in self._failed]
+
+        # Embed ngoài lock để không chặn các truy vấn đang chạy
+        added = self._embed_and_append(pending, entries)
+
+        if stale or pending:
+            with self._lock:
+                self._maybe_compact()
+                self.save()
+            print(f"✓ {self.model_name} gallery updated for {student_id}: "
+                  f"+{added} embedded, -{len(stale)} removed")
+        return added, len(stale)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 5,
+        exhaustive: bool = False,
+        student_ids: Optional[Iterable[str]] = None
+    ) -> List[GalleryMatch]:
+        """
+        Find the top-k nearest samples to a query embedding
+        Tìm top-k mẫu gần nhất với embedding truy vấn
+
+        Một phép nhân ma trận-vector (BLAS) cho toàn bộ gallery,
+        sau đó np.argpartition để lấy k phần tử lớn nhất mà không cần sắp xếp toàn bộ.
+        Khi gallery có từ PROTOTYPE_MIN_GALLERY dòng trở lên, trước tiên so với các prototype
+        để chọn PROTOTYPE_SHORTLIST sinh viên, rồi chỉ tính lại mẫu của những sinh viên đó.
+        Khi bật ANN_ENABLED và gallery có từ ANN_MIN_GALLERY dòng, ứng viên lấy từ
+        ANN_NPROBE danh sách gần nhất của chỉ mục IVF.
+
+        Args:
+            query: Embedding truy vấn (chưa cần chuẩn hóa)
+            top_k: Số kết quả cần lấy
+            exhaustive: Bỏ qua lớp prototype, so với toàn bộ gallery
+            student_ids: Chỉ tìm trong các sinh viên này (roster của lớp/buổi học)
+
+        Returns:
+            Danh sách GalleryMatch, sắp xếp theo khoảng cách tăng dần
+        """
+        q, q_norm = self._prepare_query(query)
+        if q is None:
+            return []
+
+        # Lấy snapshot để không giữ lock trong lúc tính toán
+        with self._lock:
+            n = self._count
+            matrix = self._vectors[:n]
+            scales = self._scales[:n]
+            norms = self._norms[:n]
+            labels = self._labels[:n]
+            alive = self._alive[:n].copy() if self._dead else None
+            paths = self._paths
+            label_names = self._label_names
+            available = self.size
+
+            candidates = None
+            if student_ids is not None:
+                # Roster nhỏ: so khớp chính xác trên tập dòng đã tính sẵn
+                candidates = self._roster_candidates(frozenset(student_ids))
+                available = candidates.size
+            elif not exhaustive and matrix.shape[1] == q.shape[0]:
+                if config.ANN_ENABLED and available >= config.ANN_MIN_GALLERY:
+                    candidates = self._ann_candidates(q)
+                elif available >= config.PROTOTYPE_MIN_GALLERY:
+                    self._refresh_prototypes()
+                    candidates = self._shortlist_rows(q, top_k)
+
+        if available == 0 or matrix.shape[1] != q.shape[0]:
+            return []
+
+        if candidates is not None and candidates.size == 0:
+            return []
+        if candidates is not None:
+            # Giai đoạn 2: chỉ tính lại các mẫu của các ứng viên
+            similarities = quantized_store.dot(matrix, scales, q, candidates)
+            rows = candidates
+        else:
+            similarities = quantized_store.dot(matrix, scales, q)
+            if alive is not None:
+                similarities[~alive] = -np.inf
+            rows = None
+
+        m = similarities.shape[0]
+        k = min(max(top_k, 1), available, m)
+        if k < m:
+            top = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top = np.arange(m)
+        top = top[np.argsort(-similarities[top], kind='stable')][:k]
+
+        top_sims = similarities[top]
+        if rows is not None:
+            top = rows[top]
+        distances = self._to_distance(top_sims, q_norm, norms[top])
+
+        return [
+            GalleryMatch(
+                student_id=label_names[labels[i]],
+                identity=paths[i],
+                distance=float(d),
+                similarity=float(s)
+            )
+            for i, d, s in zip(top, distances, top_sims)
+        ]
+
+    def save(self) -> None:
+        """
+        Persist the live rows to the .npz cache file
+        Lưu các dòng còn hiệu lực ra file cache .npz
+        """
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if self.store_dtype in quantized_store.STORE_DTYPES:
+                self._save_quantized()
+                return
+
+            rows = np.flatnonzero(self._alive[:self._count])
+            raw = self._rows_float32(rows) * self._norms[rows, None]
+            tmp_file = self.cache_file + '.tmp.npz'
+            np.savez(
+                tmp_file,
+                vectors=raw.astype(np.float32),
+                paths=np.array([self._paths[r] for r in rows], dtype=str),
+                mtimes=self._mtimes[rows],
+                failed=np.array(list(self._failed.keys()), dtype=str),
+                failed_mtimes=np.array(list(self._failed.values()), dtype=np.float64)
+            )
+            os.replace(tmp_file, self.cache_file)
+            # Chuyển từ store lượng tử về float32: file store cũ không còn được dùng
+            quantized_store.remove_store(self._store_file)
+            self._store_file = None
+
+    def live_vectors(self) -> np.ndarray:
+        """Bản sao float32 (đã chuẩn hóa) của các dòng còn hiệu lực"""
+        with self._lock:
+            return self._rows_float32(np.flatnonzero(self._alive[:self._count]))
+
+    def _save_quantized(self) -> None:
+        """
+        Persist rows to a quantized .npy store and switch to a read-only memmap of it
+        Lưu vector ra file store float16/int8, sau đó đọc trực tiếp qua memmap (gọi khi đang giữ lock)
+        """
+        if self._dead:
+            # File store chỉ chứa dòng còn hiệu lực: dồn buffer để chỉ số dòng khớp với file
+            self._compact()
+
+        n = self._count
+        store_file = self._store_file
+        if n == 0:
+            store_file = None
+            mapped, scales = None, np.empty(0, dtype=np.float32)
+        elif self.is_memory_mapped and store_file:
+            # Vector không đổi kể từ lần lưu trước (chỉ metadata thay đổi)
+            mapped, scales = self._vectors, self._scales[:n]
+        else:
+            safe_model = self.model_name.replace('-', '').lower()
+            store_file = os.path.join(
+                self.cache_dir,
+                f"gallery_{safe_model}_{self.detection_backend}_{self.store_dtype}_{int(time.time() * 1000)}.npy"
+            )
+            scales = quantized_store.write_store(store_file, self._rows_float32, n, self.dimension, self.store_dtype)
+            mapped = quantized_store.open_store(store_file)
+
+        tmp_file = self.cache_file + '.tmp.npz'
+        np.savez(
+            tmp_file,
+            paths=np.array(self._paths[:n], dtype=str),
+            mtimes=self._mtimes[:n],
+            norms=self._norms[:n],
+            scales=scales,
+            store=np.array(os.path.basename(store_file) if store_file else ''),
+            store_dtype=np.array(self.store_dtype),
+            failed=np.array(list(self._failed.keys()), dtype=str),
+            failed_mtimes=np.array(list(self._failed.values()), dtype=np.float64)
+        )
+        os.replace(tmp_file, self.cache_file)
+
+        if store_file != self._store_file:
+            quantized_store.remove_store(self._store_file)
+            self._store_file = store_file
+        if mapped is not None:
+            # Giải phóng buffer float32 trong RAM, đọc vector trực tiếp từ file
+            self._vectors = mapped
+            self._scales = np.array(scales, dtype=np.float32)
+
+    def _adopt_store(self, cached: Dict[str, object], entries: Dict[str, Tuple[str, float]]) -> None:
+        """Dùng trực tiếp file store đã ánh xạ làm ma trận vector (gọi khi đang giữ lock)"""
+        paths = [row[0] for row in cached['rows']]
+        n = len(paths)
+        self._vectors = cached['store']
+        self._scales = np.array(cached['scales'], dtype=np.float32)
+        self._norms = np.array(cached['norms'], dtype=np.float32)
+        self._labels = np.array([self._label_for(entries[p][0]) for p in paths], dtype=np.int32)
+        self._alive = np.ones(n, dtype=bool)
+        self._mtimes = np.array([entries[p][1] for p in paths], dtype=np.float64)
+        self._paths = paths
+        self._path_rows = {p: i for i, p in enumerate(paths)}
+        self._count = n
+        self._dirty_labels.update(range(len(self._label_names)))
+        self._version += 1
+
+    def _rows_float32(self, index) -> np.ndarray:
+        """Đọc các dòng (đã chuẩn hóa) về float32, giải lượng tử nếu cần"""
+        return quantized_store.dequantize(self._vectors, self._scales, index)
+
+    def _scan_database(self) -> Dict[str, Tuple[str, float]]:
+        """
+        List every student image under the database path
+        Liệt kê tất cả ảnh sinh viên: {đường dẫn ảnh: (mã sinh viên, mtime)}
+        """
+        entries: Dict[str, Tuple[str, float]] = {}
+        if not os.path.exists(self.database_path):
+            return entries
+
+        with os.scandir(self.database_path) as it:
+            student_ids = sorted(e.name for e in it if e.is_dir())
+        for student_id in student_ids:
+            entries.update(self._scan_student(student_id))
+        return entries
+
+    def _scan_student(self, student_id: str) -> Dict[str, Tuple[str, float]]:
+        """Liệt kê ảnh của một sinh viên: {đường dẫn ảnh: (mã sinh viên, mtime)}"""
+        student_dir = os.path.join(self.database_path, student_id)
+        if not os.path.isdir(student_dir):
+            return {}
+
+        with os.scandir(student_dir) as it:
+            files = sorted((e for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)),
+                           key=lambda e: e.name)
+            return {os.path.join(student_dir, e.name): (student_id, e.stat().st_mtime) for e in files}
+
+    def _read_cache(self) -> Dict[str, object]:
+        """
+        Đọc file cache; trả về dictionary:
+        - 'rows': [(path, chỉ số dòng, mtime)], 'raw': hàm chỉ số -> vector gốc float32
+        - 'failed': {path: mtime}
+        - 'store', 'store_file', 'store_dtype', 'scales', 'norms': store lượng tử (None nếu cache float32)
+        """
+        empty = {'rows': [], 'raw': None, 'failed': {}, 'store': None, 'store_file': None, 'store_dtype': None}
+        if not os.path.exists(self.cache_file):
+            return empty
+        try:
+            result = dict(empty)
+            with np.load(self.cache_file) as data:
+                paths = [str(p) for p in data['paths']]
+                # Cache cũ không có mtime: tin tưởng các dòng đã có
+                mtimes = list(data['mtimes']) if 'mtimes' in data.files else [None] * len(paths)
+                failed_paths = [str(p) for p in data['failed']]
+                failed_mtimes = (list(data['failed_mtimes']) if 'failed_mtimes' in data.files
+                                 else [None] * len(failed_paths))
+
+                if 'vectors' in data.files:
+                    vectors = data['vectors']
+                    result['raw'] = lambda i: vectors[i]
+                else:
+                    store_name = str(data['store'])
+                    norms = data['norms']
+                    scales = data['scales']
+                    store = (quantized_store.open_store(os.path.join(self.cache_dir, store_name))
+                             if store_name else np.empty((0, 0), dtype=np.float16))
+                    result.update(
+                        store=store,
+                        store_file=os.path.join(self.cache_dir, store_name) if store_name else None,
+                        store_dtype=str(data['store_dtype']),
+                        scales=scales,
+                        norms=norms,
+                        raw=lambda i: quantized_store.dequantize(store, scales, np.array([i]))[0] * norms[i]
+                    )
+
+            result['rows'] = [(path, i, mtime) for i, (path, mtime) in enumerate(zip(paths, mtimes))]
+            result['failed'] = dict(zip(failed_paths, failed_mtimes))
+            return result
+        except Exception as e:
+            print(f"⚠ Gallery cache unreadable, rebuilding: {str(e)}")
+            return empty
+
+    def _embed_and_append(self, paths: List[str], entries: Dict[str, Tuple[str, float]]) -> int:
+        """Embed các ảnh trong danh sách và thêm vào gallery; trả về số ảnh thêm thành công"""
+        added = 0
+        for path in paths:
+            student_id, mtime = entries[path]
+            embedding = np.asarray(self._embed_fn(path), dtype=np.float32).ravel()
+            with self._lock:
+                if embedding.size == 0:
+                    self._failed[path] = mtime
+                    continue
+                if path in self._path_rows:
+                    self._tombstone(path)
+                self._append(path, student_id, embedding, mtime)
+                added += 1
+        return added
+
+    def _append(self, path: str, student_id: str, vector: np.ndarray, mtime: float) -> None:
+        """Thêm một vector vào cuối buffer (tăng gấp đôi dung lượng khi đầy)"""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self._count == 0 and self.dimension != vector.size:
+            # Buffer rỗng: khởi tạo theo số chiều của embedding đầu tiên
+            self._vectors = np.empty((0, vector.size), dtype=np.float32)
+        elif vector.size != self.dimension:
+            print(f"⚠ Skipping {path}: embedding size {vector.size} != {self.dimension}")
+            return
+
+        # Store ánh xạ luôn vừa đúng _count dòng, nên dòng mới luôn chuyển về buffer float32
+        if self._count == self._vectors.shape[0]:
+            self._grow(max(64, self._count * 2))
+
+        row = self._count
+        norm = float(np.linalg.norm(vector))
+        self._vectors[row] = vector / norm if norm > 0 else vector
+        self._scales[row] = 1.0
+        self._norms[row] = norm
+        self._labels[row] = self._label_for(student_id)
+        self._dirty_labels.add(int(self._labels[row]))
+        self._version += 1
+        self._alive[row] = True
+        self._mtimes[row] = mtime if mtime is not None else 0.0
+        self._paths.append(path)
+        self._path_rows[path] = row
+        self._count += 1
+
+    def _grow(self, capacity: int) -> None:
+        """Cấp phát lại các buffer với dung lượng mới, giữ nguyên dữ liệu cũ"""
+        n = self._count
+        vectors = np.empty((capacity, self.dimension), dtype=np.float32)
+        vectors[:n] = self._rows_float32(slice(0, n))
+        self._vectors = vectors
+        self._scales = np.ones(capacity, dtype=np.float32)  # Buffer RAM luôn là float32
+        self._norms = np.resize(self._norms[:n], capacity)
+        self._labels = np.resize(self._labels[:n], capacity)
+        self._alive = np.resize(self._alive[:n], capacity)
+        self._mtimes = np.resize(self._mtimes[:n], capacity)
+
+    def _label_for(self, student_id: str) -> int:
+        """Lấy (hoặc tạo mới) nhãn số nguyên cho mã sinh viên"""
+        label = self._label_index.get(student_id)
+        if label is None:
+            label = len(self._label_names)
+            self._label_names.append(student_id)
+            self._label_index[student_id] = label
+        return label
+
+    def _tombstone(self, path: str) -> None:
+        """Đánh dấu xóa dòng ứng với một ảnh"""
+        row = self._path_rows.pop(path, None)
+        if row is not None and self._alive[row]:
+            self._alive[row] = False
+            self._dead += 1
+            self._dirty_labels.add(int(self._labels[row]))
+            self._version += 1
+
+    def _maybe_compact(self) -> None:
+        """Dồn buffer khi số dòng tombstone vượt quá ngưỡng"""
+        if self._dead < max(16, int(self._count * config.GALLERY_COMPACT_RATIO)):
+            return
+        self._compact()
+
+    def _compact(self) -> None:
+        """Dựng lại buffer chỉ với các dòng còn hiệu lực"""
+        rows = np.flatnonzero(self._alive[:self._count])
+        vectors = self._rows_float32(rows) * self._norms[rows, None]
+        paths = [self._paths[r] for r in rows]
+        student_ids = [self._label_names[self._labels[r]] for r in rows]
+        mtimes = self._mtimes[rows]
+        failed = self._failed
+
+        self._reset()
+        self._failed = failed
+        for path, student_id, vector, mtime in zip(paths, student_ids, vectors, mtimes):
+            self._append(path, student_id, vector, float(mtime))
+
+    def _roster_candidates(self, roster: FrozenSet[str]) -> np.ndarray:
+        """Các dòng còn hiệu lực của một roster, lấy từ cache nếu gallery chưa thay đổi (gọi khi đang giữ lock)"""
+        cached = self._roster_rows.get(roster)
+        if cached is not None and cached[0] == self._version:
+            self._roster_rows.move_to_end(roster)
+            return cached[1]
+
+        labels = [self._label_index[sid] for sid in roster if sid in self._label_index]
+        n = self._count
+        mask = np.isin(self._labels[:n], np.array(labels, dtype=np.int32)) & self._alive[:n]
+        rows = np.flatnonzero(mask)
+
+        self._roster_rows[roster] = (self._version, rows)
+        self._roster_rows.move_to_end(roster)
+        while len(self._roster_rows) > config.ROSTER_CACHE_SIZE:
+            self._roster_rows.popitem(last=False)
+        return rows
+
+    def _ann_candidates(self, q: np.ndarray) -> Optional[np.ndarray]:
+        """Lấy các dòng ứng viên (còn hiệu lực) từ chỉ mục IVF (gọi khi đang giữ lock)"""
+        ann = self._ensure_ann()
+        if ann is None:
+            return None
+        candidates = ann.search(q, config.ANN_NPROBE)
+        return candidates[self._alive[candidates]]
+
+    def _ensure_ann(self) -> Optional[IVFIndex]:
+        """
+        Build, load or refresh the IVF index (gọi khi đang giữ lock)
+        - Nạp tâm cụm từ đĩa nếu có, nếu không thì huấn luyện và lưu lại
+        - Huấn luyện lại khi gallery lớn gấp ANN_RETRAIN_GROWTH lần so với lúc huấn luyện
+        - Gán các dòng mới (thêm sau lần dùng trước) vào danh sách đảo
+        """
+        rows = np.flatnonzero(self._alive[:self._count])
+        ann = self._ann
+        if ann is None:
+            ann = IVFIndex.load(self.ann_file, config.ANN_NLIST, config.ANN_NPROBE)
+            if ann is not None and ann.dimension != self.dimension:
+                ann = None
+        retrain = ann is None or rows.size > ann.trained_size * config.ANN_RETRAIN_GROWTH
+
+        if retrain:
+            print(f"🧭 Training {self.model_name} ANN index on {rows.size} embeddings...")
+            ann = ann or IVFIndex(config.ANN_NLIST, config.ANN_NPROBE)
+            ann.train(self._rows_float32(rows))
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                ann.save(self.ann_file)
+            except OSError as e:
+                print(f"⚠ Could not save ANN index: {str(e)}")
+
+        if self._ann is not ann:
+            self._ann = ann
+            self._ann_rows = 0
+        if retrain:
+            self._ann_rows = 0
+
+        # Chỉ gán các dòng chưa có trong chỉ mục (dòng mới luôn nằm ở cuối buffer)
+        if self._ann_rows < self._count:
+            new_rows = np.arange(self._ann_rows, self._count)
+            new_rows = new_rows[self._alive[new_rows]]
+            ann.add(new_rows, self._rows_float32(new_rows))
+            self._ann_rows = self._count
+        return ann
+
+    def _refresh_prototypes(self) -> None:
+        """Dựng lại prototype cho các sinh viên có dòng thay đổi (gọi khi đang giữ lock)"""
+        if not self._dirty_labels:
+            return
+
+        n = self._count
+        labels = self._labels[:n]
+        alive = self._alive[:n]
+        for label in self._dirty_labels:
+            rows = np.flatnonzero((labels == label) & alive)
+            if rows.size == 0:
+                self._label_rows.pop(label, None)
+                self._label_protos.pop(label, None)
+                continue
+            self._label_rows[label] = rows
+            self._label_protos[label] = _spherical_kmeans(self._rows_float32(rows), config.PROTOTYPES_PER_STUDENT)
+        self._dirty_labels.clear()
+
+        # Ghép tất cả prototype thành một ma trận liên tục cho giai đoạn 1
+        ordered = sorted(self._label_protos)
+        if ordered:
+            self._proto_matrix = np.ascontiguousarray(np.vstack([self._label_protos[l] for l in ordered]))
+            self._proto_labels = np.concatenate([
+                np.full(self._label_protos[l].shape[0], l, dtype=np.int32) for l in ordered
+            ])
+        else:
+            self._proto_matrix = np.empty((0, self.dimension), dtype=np.float32)
+            self._proto_labels = np.empty(0, dtype=np.int32)
+
+    def _shortlist_rows(self, q: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        """Giai đoạn 1: chọn sinh viên gần nhất theo prototype, trả về các dòng của họ"""
+        if self._proto_matrix.shape[0] == 0:
+            return None
+
+        proto_sims = self._proto_matrix @ q
+        # Độ tương đồng của sinh viên = prototype gần nhất của sinh viên đó
+        order = np.argsort(-proto_sims, kind='stable')
+        shortlist_size = max(config.PROTOTYPE_SHORTLIST, top_k)
+        shortlist = []
+        seen = set()
+        for label in self._proto_labels[order]:
+            if label in seen:
+                continue
+            seen.add(label)
+            shortlist.append(self._label_rows[int(label)])
+            if len(shortlist) >= shortlist_size:
+                break
+        return np.concatenate(shortlist)
+
+    @staticmethod
+    def _prepare_query(query: np.ndarray) -> Tuple[Optional[np.ndarray], float]:
+        """Chuẩn hóa embedding truy vấn; trả về (None, 0) nếu không hợp lệ"""
+        q = np.asarray(query, dtype=np.float32).ravel()
+        q_norm = float(np.linalg.norm(q)) if q.size else 0.0
+        if q_norm == 0.0:
+            return None, 0.0
+        return q / q_norm, q_norm
+
+    def _to_distance(self, similarities: np.ndarray, q_norm: float, norms: np.ndarray) -> np.ndarray:
+        """Đổi cosine similarity sang khoảng cách theo DISTANCE_METRIC"""
+        if self.distance_metric == 'euclidean':
+            squared = q_norm ** 2 + norms ** 2 - 2.0 * similarities * q_norm * norms
+            return np.sqrt(np.maximum(squared, 0.0))
+        if self.distance_metric == 'euclidean_l2':
+            return np.sqrt(np.maximum(2.0 - 2.0 * similarities, 0.0))
+        # Mặc định: cosine
+        return 1.0 - similarities
+
+
+def _spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 5) -> np.ndarray:
+    """
+    Cluster L2-normalized vectors into at most k unit-length centroids
+    Gom các vector đã chuẩn hóa thành tối đa k tâm cụm (độ dài 1)
+
+    Khởi tạo bằng tâm trung bình rồi chọn lần lượt điểm xa nhất (tất định, không ngẫu nhiên).
+    """
+    n = vectors.shape[0]
+    # Ít mẫu: mỗi tâm cụm cần ít nhất vài mẫu để ổn định
+    k = max(1, min(k, math.ceil(n / 4)))
+
+    centroids = [_normalize_rows(vectors.mean(axis=0, keepdims=True))[0]]
+    while len(centroids) < k:
+        closest = (vectors @ np.array(centroids).T).max(axis=1)
+        centroids.append(vectors[int(np.argmin(closest))])
+    centroids = np.array(centroids, dtype=np.float32)
+
+    if k > 1:
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for j in range(k):
+                members = vectors[assignment == j]
+                if len(members):
+                    centroids[j] = _normalize_rows(members.mean(axis=0, keepdims=True))[0]
+
+    return centroids
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Chuẩn hóa L2 từng dòng của ma trận"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class GalleryManager:
+    """
+    Process-wide registry of embedding galleries (Singleton)
+    Quản lý các gallery dùng chung trong toàn bộ tiến trình
+    - Mỗi cặp (model, detector) có đúng một gallery
+    - Các service/controller khác nhau dùng chung gallery đã nạp
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(GalleryManager, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self._galleries: Dict[Tuple[str, str], EmbeddingGallery] = {}
+        self._invalidated: FrozenSet[str] = frozenset()  # Ảnh có nội dung đã đổi, gallery nạp sau sẽ embed lại
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def get_gallery(self, model_name: str, detection_backend: str, embed_fn: EmbedFunction) -> EmbeddingGallery:
+        """
+        Get the loaded gallery for a (model, detector) pair, building it on first use
+        Lấy gallery đã nạp cho cặp (model, detector), tạo mới ở lần dùng đầu tiên
+        """
+        key = (model_name, detection_backend)
+        with self._lock:
+            gallery = self._galleries.get(key)
+            if gallery is None:
+                gallery = EmbeddingGallery(model_name, detection_backend)
+                self._galleries[key] = gallery
+
+        gallery.load(embed_fn, self._invalidated)
+        return gallery
+
+    def loaded_galleries(self) -> List[EmbeddingGallery]:
+        """Danh sách các gallery đã nạp"""
+        with self._lock:
+            return [g for g in self._galleries.values() if g.is_loaded]
+
+    def sync_student(self, student_id: str) -> None:
+        """
+        Propagate one student's image changes to every loaded gallery
+        Cập nhật thay đổi ảnh của một sinh viên vào tất cả gallery đã nạp
+        (gallery chưa nạp sẽ tự đối chiếu ở lần nạp tiếp theo)
+        """
+        for gallery in self.loaded_galleries():
+            try:
+                gallery.sync_student(student_id)
+            except Exception as e:
+                print(f"⚠ Could not update {gallery.model_name} gallery for {student_id}: {str(e)}")
+
+    def invalidate(self, paths: Iterable[str]) -> None:
+        """
+        Mark images whose content changed (same path) for re-embedding
+        Đánh dấu các ảnh có nội dung đã đổi: gallery đang nạp bỏ dòng cũ ngay,
+        gallery nạp sau bỏ qua embedding đã cache của các ảnh này
+        """
+        paths = frozenset(paths)
+        if not paths:
+            return
+        with self._lock:
+            self._invalidated = self._invalidated | paths
+        for gallery in self.loaded_galleries():
+            gallery.invalidate(paths)
+
+
+# Global gallery manager instance
+gallery_manager = GalleryManager()
@@ -0,0 +1,289 @@
+"""
+Maintained manifest of student face images
+Danh mục ảnh khuôn mặt của sinh viên, được cập nhật khi ảnh thay đổi
+- Lưu số ảnh của mỗi sinh viên (tổng số và số ảnh tăng cường aug_*) trong một file JSON
+- "Có sinh viên nào có ảnh không" / "sinh viên nào chưa có ảnh" là phép tra cứu O(1),
+  không còn duyệt toàn bộ thư mục sinh viên ở mỗi lần nhận diện
+- StudentService và DataAugmentationController gọi refresh_student() sau khi thêm/xóa ảnh
+  (chỉ quét thư mục của sinh viên đó); chỉ quét toàn bộ khi chưa có file manifest
+- Mỗi ảnh được ghi (kích thước, mtime, SHA-1): scan_changes() dùng os.scandir so sánh kích thước/mtime
+  và chỉ tính hash cho file có dấu hiệu thay đổi, để phát hiện ảnh được thêm/sửa/xóa bằng tay
+  (copy trực tiếp vào data/students/<id>/, augment_dataset.py...)
+"""
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.config.config import config
+from src.gallery.embedding_gallery import IMAGE_EXTENSIONS
+
+# Số ảnh của một sinh viên: {'images': tổng số ảnh, 'augmented': số ảnh aug_*}
+ImageCounts = Dict[str, int]
+
+# Bản ghi của một ảnh: [kích thước (byte), mtime (ns), SHA-1 nội dung]
+FileRecord = List
+
+
+@dataclass
+class ManifestDiff:
+    """Các ảnh thay đổi so với manifest (đường dẫn đầy đủ)"""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)  # Nội dung khác (hash khác), không chỉ mtime
+    removed: List[str] = field(default_factory=list)
+    students: Set[str] = field(default_factory=set)  # Sinh viên có ảnh thay đổi
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return f"+{len(self.added)} added, ~{len(self.changed)} changed, -{len(self.removed)} removed"
+
+
+def file_hash(path: str) -> str:
+    """SHA-1 nội dung file (đọc theo khối 1 MB)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImageManifest:
+    """
+    Per-student image counts and per-file fingerprints, persisted to IMAGE_MANIFEST_PATH (Singleton)
+    Danh mục ảnh của từng sinh viên (số ảnh, kích thước/mtime/hash từng file), lưu trong IMAGE_MANIFEST_PATH
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ImageManifest, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.database_path = config.STUDENT_DATABASE_PATH
+        self.manifest_path = config.IMAGE_MANIFEST_PATH
+        # {mã sinh viên: {'images', 'augmented', 'files': {tên file: [size, mtime_ns, sha1]}}}
+        self._students: Dict[str, Dict] = {}
+        self._without_images = set()  # Sinh viên có thư mục nhưng chưa có ảnh
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._initialized = True
+
+    def has_images(self) -> bool:
+        """Có ít nhất một sinh viên có ảnh (O(1))"""
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._students) > len(self._without_images)
+
+    def students_without_images(self) -> List[str]:
+        """Các sinh viên có thư mục nhưng chưa có ảnh nào"""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(self._without_images)
+
+    def image_count(self, student_id: str) -> int:
+        """Số ảnh của một sinh viên (0 nếu chưa có)"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._students.get(student_id, {}).get('images', 0)
+
+    def counts(self) -> Dict[str, ImageCounts]:
+        """Số ảnh của mọi sinh viên: {mã sinh viên: {'images', 'augmented'}}"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                student_id: {'images': record['images'], 'augmented': record['augmented']}
+                for student_id, record in self._students.items()
+            }
+
+    def refresh_student(self, student_id: str) -> ImageCounts:
+        """
+        Rescan one student's folder after images were added or removed
+        Quét lại thư mục của một sinh viên (sau khi thêm/xóa ảnh) và lưu manifest
+
+        Returns:
+            Số ảnh mới của sinh viên (rỗng nếu thư mục đã bị xóa)
+        """
+        self.refresh_students([student_id])
+        with self._lock:
+            record = self._students.get(student_id)
+            return {'images': record['images'], 'augmented': record['augmented']} if record else {}
+
+    def refresh_students(self, student_ids: List[str]) -> ManifestDiff:
+        """
+        Rescan several student folders, saving the manifest once
+        Quét lại thư mục của nhiều sinh viên, lưu manifest một lần
+
+        Returns:
+            Các ảnh đã thay đổi của những sinh viên này
+        """
+        with self._lock:
+            self._ensure_loaded()
+            diff = ManifestDiff()
+            dirty = False
+            for student_id in student_ids:
+                dirty |= self._rescan(student_id, diff)
+            if dirty:
+                self._save()
+            return diff
+
+    def scan_changes(self) -> ManifestDiff:
+        """
+        Find images added, changed or removed since the manifest was written
+        Tìm các ảnh được thêm/sửa/xóa kể từ lần ghi manifest trước (kể cả thay đổi bằng tay)
+
+        - os.scandir mọi thư mục sinh viên, so sánh kích thước và mtime với manifest
+        - Chỉ tính hash cho file mới hoặc có kích thước/mtime khác; hash giống thì chỉ cập nhật mtime
+        - Chưa có manifest: dựng mới làm mốc, không báo thay đổi
+
+        Returns:
+            ManifestDiff (manifest đã được cập nhật theo thư mục)
+        """
+        with self._lock:
+            if not self._loaded and not os.path.exists(self.manifest_path):
+                self._ensure_loaded()
+                return ManifestDiff()
+            self._ensure_loaded()
+
+            student_ids = set(self._students)
+            if os.path.isdir(self.database_path):
+                with os.scandir(self.database_path) as it:
+                    student_ids.update(e.name for e in it if e.is_dir())
+
+            diff = ManifestDiff()
+            dirty = False
+            for student_id in sorted(student_ids):
+                dirty |= self._rescan(student_id, diff)
+            if dirty:
+                self._save()
+            return diff
+
+    def rebuild(self) -> Dict[str, ImageCounts]:
+        """
+        Rebuild the manifest from a full walk of the student database
+        Dựng lại manifest bằng cách quét toàn bộ thư mục sinh viên (tính lại hash mọi ảnh)
+        """
+        with self._lock:
+            self._students.clear()
+            self._without_images.clear()
+            self._loaded = True
+            student_ids = []
+            if os.path.isdir(self.database_path):
+                with os.scandir(self.database_path) as it:
+                    student_ids = [e.name for e in it if e.is_dir()]
+            for student_id in student_ids:
+                self._rescan(student_id, ManifestDiff())
+            self._save()
+            return self.counts()
+
+    def _ensure_loaded(self) -> None:
+        """Đọc file manifest ở lần dùng đầu tiên; chưa có file thì quét toàn bộ một lần"""
+        if self._loaded:
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for student_id, record in data.get('students', {}).items():
+                self._set(student_id, record)
+            self._loaded = True
+        except (OSError, ValueError):
+            print("🗂️  Building image manifest...")
+            self.rebuild()
+
+    def _rescan(self, student_id: str, diff: ManifestDiff) -> bool:
+        """
+        Cập nhật bản ghi của một sinh viên theo thư mục, ghi các ảnh thay đổi vào diff
+
+        Returns:
+            True nếu bản ghi thay đổi (kể cả khi chỉ mtime khác)
+        """
+        student_dir = os.path.join(self.database_path, student_id)
+        old = self._students.get(student_id)
+        known = old.get('files', {}) if old else {}
+        # Bản ghi của manifest phiên bản trước (chưa có thông tin từng file): chỉ ghi mốc, không báo thay đổi
+        legacy = old is not None and 'files' not in old
+
+        if not os.path.isdir(student_dir):
+            if old is None:
+                return False
+            removed = [os.path.join(student_dir, name) for name in known]
+            if removed:
+                diff.removed.extend(removed)
+                diff.students.add(student_id)
+            self._set(student_id, None)
+            return True
+
+        files: Dict[str, FileRecord] = {}
+        changes: List[Tuple[List[str], str]] = []
+        with os.scandir(student_dir) as it:
+            for entry in it:
+                if not (entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)):
+                    continue
+                stat = entry.stat()
+                previous = known.get(entry.name)
+                if previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime_ns:
+                    files[entry.name] = previous
+                    continue
+                # Mới hoặc kích thước/mtime khác: tính hash để biết nội dung có thật sự đổi không
+                try:
+                    digest = file_hash(entry.path)
+                except OSError:
+                    continue
+                files[entry.name] = [stat.st_size, stat.st_mtime_ns, digest]
+                if previous is None:
+                    changes.append((diff.added, entry.path))
+                elif previous[2] != digest:
+                    changes.append((diff.changed, entry.path))
+
+        removed = [os.path.join(student_dir, name) for name in known if name not in files]
+        if not legacy:
+            for target, path in changes:
+                target.append(path)
+            diff.removed.extend(removed)
+            if changes or removed:
+                diff.students.add(student_id)
+
+        record = {
+            'images': len(files),
+            'augmented': sum(1 for name in files if name.startswith('aug_')),
+            'files': files
+        }
+        if record == old:
+            return False
+        self._set(student_id, record)
+        return True
+
+    def _set(self, student_id: str, record: Optional[Dict]) -> None:
+        """Cập nhật bản ghi của một sinh viên (None = thư mục không còn)"""
+        if record is None:
+            self._students.pop(student_id, None)
+            self._without_images.discard(student_id)
+            return
+        self._students[student_id] = record
+        if record['images']:
+            self._without_images.discard(student_id)
+        else:
+            self._without_images.add(student_id)
+
+    def _save(self) -> None:
+        """Ghi manifest (ghi file tạm rồi đổi tên để không bao giờ để lại file hỏng)"""
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            tmp_file = self.manifest_path + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'students': self._students}, f, sort_keys=True)
+            os.replace(tmp_file, self.manifest_path)
+        except OSError as e:
+            print(f"⚠ Could not save image manifest: {str(e)}")
+
+
+# Global image manifest instance
+image_manifest = ImageManifest()
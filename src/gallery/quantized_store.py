@@ -0,0 +1,164 @@
+"""
+Quantized, memory-mapped embedding store
+Kho embedding lượng tử hóa trên đĩa, mở bằng np.memmap
+- float16: mỗi phần tử 2 byte (một nửa float32)
+- int8: mỗi phần tử 1 byte, kèm một hệ số tỉ lệ (scale) float32 cho mỗi vector
+- File .npy được ánh xạ bộ nhớ ở chế độ chỉ đọc: hệ điều hành chỉ nạp các trang cần dùng
+  và nhiều tiến trình mở cùng file dùng chung một bản trong page cache
+"""
+import os
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+
+# Kiểu lưu trữ được hỗ trợ (float32 = giữ nguyên trong RAM, không dùng store)
+STORE_DTYPES = {
+    'float16': np.float16,
+    'int8': np.int8
+}
+
+# Số dòng xử lý mỗi lần khi lượng tử hóa/tính tích vô hướng, giới hạn bộ nhớ tạm float32
+CHUNK_ROWS = 65536
+
+Index = Union[slice, np.ndarray]
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """
+    Quantize L2-normalized float32 rows
+    Lượng tử hóa các vector đã chuẩn hóa
+
+    Returns:
+        Tuple (ma trận lượng tử, scale float32 cho từng dòng)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return vectors.astype(STORE_DTYPES[dtype]), np.ones(vectors.shape[0], dtype=np.float32)
+
+
+def dequantize(matrix: np.ndarray, scales: np.ndarray, index: Index) -> np.ndarray:
+    """Đọc các dòng (slice hoặc mảng chỉ số) về float32"""
+    block = np.asarray(matrix[index], dtype=np.float32)
+    if matrix.dtype == np.int8:
+        block *= scales[index][:, None]
+    return block
+
+
+def dot(matrix: np.ndarray, scales: np.ndarray, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Dot products between stored rows and a float32 query
+    Tích vô hướng giữa các dòng (có thể lượng tử) và vector truy vấn
+
+    float32 dùng thẳng BLAS; kiểu lượng tử được đổi sang float32 theo từng khối CHUNK_ROWS
+    để không tạo bản sao float32 của toàn bộ gallery.
+    """
+    if matrix.dtype == np.float32:
+        return (matrix[rows] if rows is not None else matrix) @ q
+
+    total = rows.shape[0] if rows is not None else matrix.shape[0]
+    out = np.empty(total, dtype=np.float32)
+    for start in range(0, total, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, total)
+        index = rows[start:stop] if rows is not None else slice(start, stop)
+        out[start:stop] = np.asarray(matrix[index], dtype=np.float32) @ q
+    if matrix.dtype == np.int8:
+        out *= scales[rows] if rows is not None else scales[:total]
+    return out
+
+
+def write_store(
+    path: str,
+    read_rows: Callable[[slice], np.ndarray],
+    count: int,
+    dimension: int,
+    dtype: str
+) -> np.ndarray:
+    """
+    Write quantized rows to a .npy file chunk by chunk
+    Ghi các dòng đã lượng tử ra file .npy theo từng khối
+
+    Args:
+        path: File đích
+        read_rows: Hàm trả về các dòng float32 (đã chuẩn hóa) cho một slice
+        count: Số dòng
+        dimension: Số chiều
+        dtype: 'float16' hoặc 'int8'
+
+    Returns:
+        Mảng scale float32 của từng dòng
+    """
+    tmp_file = path + '.tmp'
+    out = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=STORE_DTYPES[dtype], shape=(count, dimension))
+    scales = np.ones(count, dtype=np.float32)
+    for start in range(0, count, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, count)
+        out[start:stop], scales[start:stop] = quantize(read_rows(slice(start, stop)), dtype)
+    out.flush()
+    del out
+    os.replace(tmp_file, path)
+    return scales
+
+
+def open_store(path: str) -> np.ndarray:
+    """Mở store ở chế độ chỉ đọc, ánh xạ bộ nhớ (các tiến trình dùng chung trang)"""
+    return np.load(path, mmap_mode='r')
+
+
+def remove_store(path: Optional[str]) -> None:
+    """Xóa file store cũ (best-effort: trên Windows file còn được tiến trình khác ánh xạ sẽ bị giữ lại)"""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def measure_recall(vectors: np.ndarray, dtype: str, num_queries: int = 200, top_k: int = 5) -> Dict[str, float]:
+    """
+    Compare top-k search on a quantized copy against the float32 path
+    So sánh kết quả tìm kiếm top-k giữa bản lượng tử và float32
+
+    Truy vấn là các dòng trong gallery có thêm nhiễu nhỏ (mô phỏng ảnh chụp mới của cùng người).
+
+    Args:
+        vectors: Ma trận float32 đã chuẩn hóa (N, D)
+        dtype: 'float16' hoặc 'int8'
+        num_queries: Số truy vấn
+        top_k: Số kết quả so sánh
+
+    Returns:
+        Dictionary: recall@1, recall@k, dung lượng (MB) của float32 và bản lượng tử
+    """
+    n = vectors.shape[0]
+    quantized, scales = quantize(vectors, dtype)
+    if n == 0:
+        return {'recall_at_1': 1.0, 'recall_at_k': 1.0, 'float32_mb': 0.0, 'quantized_mb': 0.0}
+
+    rng = np.random.default_rng(0)
+    picks = rng.choice(n, min(num_queries, n), replace=False)
+    # Nhiễu có độ dài khoảng 0.3 so với vector đơn vị
+    noise = rng.normal(scale=0.3 / np.sqrt(vectors.shape[1]), size=(picks.size, vectors.shape[1])).astype(np.float32)
+    queries = vectors[picks] + noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    k = min(top_k, n)
+    hits_1 = 0
+    hits_k = 0
+    for q in queries:
+        exact = np.argsort(-(vectors @ q), kind='stable')[:k]
+        approx = np.argsort(-dot(quantized, scales, q), kind='stable')[:k]
+        hits_1 += int(exact[0] == approx[0])
+        hits_k += len(set(exact) & set(approx))
+
+    extra = scales.nbytes if dtype == 'int8' else 0
+    return {
+        'recall_at_1': hits_1 / len(queries),
+        'recall_at_k': hits_k / (len(queries) * k),
+        'float32_mb': n * vectors.shape[1] * 4 / (1024 * 1024),
+        'quantized_mb': (quantized.nbytes + extra) / (1024 * 1024)
+    }
@@ -6,7 +6,7 @@ Mẫu Repository cho tầng truy cập dữ liệu
 """
 # Import các thư viện cần thiết
 from abc import ABC, abstractmethod  # Abstract Base Class để định nghĩa interface
-from typing import List, Optional  # Type hints
+from typing import List, Optional, Set  # Type hints
 from datetime import datetime, date  # Xử lý ngày giờ
 from sqlalchemy.exc import IntegrityError  # Exception khi vi phạm ràng buộc database
 
@@ -81,6 +81,44 @@ class StudentRepository(IRepository):
                 # Lỗi khi student_id đã tồn tại (vi phạm unique constraint)
                 raise ValueError(f"Student with ID {student.student_id} already exists")
 
+    def create_many(self, students: List[Student]) -> List[Student]:
+        """
+        Create many students in one transaction
+        Tạo nhiều sinh viên trong cùng một transaction (nhập hàng loạt)
+
+        Args:
+            students: Danh sách Student cần tạo
+
+        Returns:
+            Danh sách Student đã được tạo
+
+        Raises:
+            ValueError: Nếu có student_id đã tồn tại (không sinh viên nào được tạo)
+        """
+        with db_manager.get_session() as session:
+            try:
+                session.add_all(students)
+                session.flush()
+                for student in students:
+                    session.expunge(student)
+                return students
+            except IntegrityError:
+                raise ValueError("One or more student IDs already exist")
+
+    def get_existing_ids(self, student_ids: List[str]) -> Set[str]:
+        """
+        Get which of the given student IDs already exist
+        Lấy các mã sinh viên (trong danh sách) đã có trong database, một truy vấn cho mỗi 500 mã
+        """
+        existing = set()
+        with db_manager.get_session() as session:
+            for start in range(0, len(student_ids), 500):
+                rows = session.query(Student.student_id).filter(
+                    Student.student_id.in_(student_ids[start:start + 500])
+                ).all()
+                existing.update(row[0] for row in rows)
+        return existing
+
     def get_by_id(self, student_id: str) -> Optional[Student]:
         """
         Get student by student_id
@@ -216,6 +254,24 @@ class AttendanceRepository(IRepository):
             session.expunge(attendance)
             return attendance
 
+    def create_many(self, records: List[AttendanceRecord]) -> List[AttendanceRecord]:
+        """
+        Create many attendance records in one transaction
+        Tạo nhiều bản ghi điểm danh trong cùng một transaction
+
+        Args:
+            records: Danh sách AttendanceRecord cần tạo
+
+        Returns:
+            Danh sách AttendanceRecord đã được tạo
+        """
+        with db_manager.get_session() as session:
+            session.add_all(records)
+            session.flush()
+            for record in records:
+                session.expunge(record)
+            return records
+
     def get_by_id(self, record_id: int) -> Optional[AttendanceRecord]:
         """
         Get attendance record by ID
@@ -276,6 +332,23 @@ class AttendanceRepository(IRepository):
                 session.expunge(record)
             return records
 
+    def get_student_ids_by_date(self, session_date: str) -> Set[str]:
+        """
+        Get IDs of students already marked on a date
+        Lấy mã các sinh viên đã điểm danh trong ngày (một truy vấn duy nhất)
+
+        Args:
+            session_date: Ngày cần truy vấn (định dạng YYYY-MM-DD)
+
+        Returns:
+            Tập mã sinh viên
+        """
+        with db_manager.get_session() as session:
+            rows = session.query(AttendanceRecord.student_id).filter(
+                AttendanceRecord.session_date == session_date
+            ).all()
+            return {row[0] for row in rows}
+
     def get_by_student_and_date(self, student_id: str, session_date: str) -> Optional[AttendanceRecord]:
         """
         Check if student already has attendance for a specific date
@@ -0,0 +1,339 @@
+"""
+Bulk student enrollment from a CSV file
+Nhập sinh viên hàng loạt từ file CSV (student_id, full_name, class_name, email, image_glob)
+- validate: đọc CSV, loại dòng thiếu trường, trùng mã trong file, đã có trong database hoặc không khớp ảnh nào
+- embed: nhóm tiến trình (IMPORT_WORKERS, mỗi tiến trình nạp model một lần) copy ảnh vào thư mục sinh viên,
+  đánh giá chất lượng và trích xuất embedding
+- insert: mỗi lô IMPORT_CHUNK_SIZE sinh viên được ghi trong một transaction
+- gallery: embedding do các tiến trình trả về được thêm thẳng vào gallery, file gallery được lưu một lần mỗi lô
+- checkpoint: sau mỗi lô, mã các sinh viên đã nhập được ghi vào <csv>.checkpoint.json; chạy lại sẽ tiếp tục từ đó
+"""
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from src.config.config import config
+from src.factories.factory import FaceRecognitionStrategyFactory
+from src.gallery.embedding_gallery import EmbeddingGallery
+from src.gallery.image_manifest import image_manifest
+from src.models.models import Student
+from src.repositories.repositories import StudentRepository
+from src.utils.face_quality import assess_face_quality
+from src.utils.utils import ImageValidator
+
+# Các cột bắt buộc của file CSV (email không bắt buộc)
+REQUIRED_COLUMNS = ('student_id', 'full_name', 'class_name', 'image_glob')
+
+
+@dataclass
+class ImportRow:
+    """Một dòng hợp lệ của file CSV"""
+    line: int
+    student_id: str
+    full_name: str
+    class_name: str
+    email: Optional[str]
+    images: List[str]  # Ảnh khớp image_glob (đã sắp xếp)
+
+
+@dataclass
+class ImportSummary:
+    """Kết quả và thông lượng của một lần nhập"""
+    total_rows: int = 0
+    imported: int = 0
+    resumed: int = 0  # Đã nhập ở lần chạy trước (theo checkpoint)
+    rejected: Dict[str, str] = field(default_factory=dict)  # Mã sinh viên (hoặc "line N") -> lý do
+    images: int = 0  # Ảnh đã copy vào thư mục sinh viên
+    embedded: int = 0
+    invalid_images: int = 0  # Ảnh không đọc được, bị bỏ qua
+    warnings: int = 0  # Ảnh có cảnh báo chất lượng
+    elapsed: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def students_per_second(self) -> float:
+        return self.imported / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.imported} imported, {self.resumed} already done, {len(self.rejected)} rejected; "
+                f"{self.embedded}/{self.images} images embedded ({self.warnings} with warnings, "
+                f"{self.invalid_images} invalid) in {self.elapsed:.1f}s "
+                f"({self.students_per_second:.1f} students/s, {self.images_per_second:.1f} images/s)")
+
+
+# Strategy của tiến trình worker (nạp model một lần cho mỗi tiến trình)
+_worker_strategy = None
+
+
+def _init_worker(model_name: str) -> None:
+    """Khởi tạo tiến trình worker: nạp model nhận diện"""
+    global _worker_strategy
+    _worker_strategy = FaceRecognitionStrategyFactory.create_strategy(model_name)
+
+
+def _prepare_student(task: Tuple[str, List[str]]) -> Dict[str, Any]:
+    """
+    Copy, quality-check and embed one student's images (runs in a worker process)
+    Chạy trong tiến trình worker: copy ảnh vào thư mục sinh viên, đánh giá chất lượng, trích xuất embedding
+
+    Returns:
+        {'student_id', 'images': [(đường dẫn đã lưu, mtime, embedding, FaceQuality)], 'invalid': [ảnh nguồn lỗi]}
+    """
+    student_id, sources = task
+    student_dir = os.path.join(config.STUDENT_DATABASE_PATH, student_id)
+    os.makedirs(student_dir, exist_ok=True)
+
+    images, invalid = [], []
+    for idx, source in enumerate(sources):
+        if not ImageValidator.is_valid_image(source):
+            invalid.append(source)
+            continue
+        # Đặt tên giống StudentService._store_face_images: {student_id}_{idx}{ext}
+        dest_path = os.path.join(student_dir, f"{student_id}_{idx}{os.path.splitext(source)[1]}")
+        shutil.copy(source, dest_path)
+
+        # Detector chạy một lần: extract_embedding dùng lại kết quả trong detection_cache
+        quality = assess_face_quality(dest_path, _worker_strategy.detect_stage.detect_all(dest_path))
+        embedding = _worker_strategy.extract_embedding(dest_path, enforce_detection=False)
+        quality.embedded = embedding.size > 0
+        if not quality.embedded:
+            quality.issues.append('not embedded')
+        images.append((dest_path, os.stat(dest_path).st_mtime, embedding, quality))
+
+    return {'student_id': student_id, 'images': images, 'invalid': invalid}
+
+
+class BulkImportService:
+    """
+    Service for importing a whole intake of students from CSV
+    Dịch vụ nhập hàng loạt sinh viên từ CSV
+
+    Cách sử dụng:
+        summary = BulkImportService().import_csv("intake_2025.csv")
+        print(summary.summary())
+    """
+
+    def __init__(self, model_name: str = None):
+        """
+        Args:
+            model_name: Model dùng để embed (mặc định: DEFAULT_MODEL)
+        """
+        self.model_name = model_name or config.DEFAULT_MODEL
+        self.repository = StudentRepository()
+
+    def read_csv(self, csv_path: str) -> Tuple[List[ImportRow], Dict[str, str]]:
+        """
+        Read and validate the CSV file
+        Đọc và kiểm tra file CSV; image_glob tương đối được tính từ thư mục chứa file CSV
+
+        Returns:
+            Tuple (các dòng hợp lệ, {mã sinh viên hoặc "line N": lý do bị loại})
+
+        Raises:
+            ValueError: Nếu file thiếu cột bắt buộc
+        """
+        base_dir = os.path.dirname(os.path.abspath(csv_path))
+        rows: List[ImportRow] = []
+        rejected: Dict[str, str] = {}
+        seen: Set[str] = set()
+
+        # utf-8-sig: bỏ BOM của file CSV xuất từ Excel (tên tiếng Việt)
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+            for line, record in enumerate(reader, start=2):
+                values = {k: (v or '').strip() for k, v in record.items() if k}
+                student_id = values['student_id']
+                key = student_id or f"line {line}"
+                empty = [c for c in REQUIRED_COLUMNS if not values[c]]
+                if empty:
+                    rejected[key] = f"missing {', '.join(empty)}"
+                    continue
+                if student_id in seen:
+                    rejected[f"line {line}"] = f"duplicate student_id {student_id}"
+                    continue
+                seen.add(student_id)
+
+                pattern = values['image_glob']
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(base_dir, pattern)
+                images = sorted(
+                    p for p in glob.glob(pattern, recursive=True)
+                    if os.path.splitext(p)[1].lower() in ImageValidator.VALID_EXTENSIONS
+                )
+                if not images:
+                    rejected[student_id] = f"no image matches {values['image_glob']}"
+                    continue
+
+                rows.append(ImportRow(
+                    line=line,
+                    student_id=student_id,
+                    full_name=values['full_name'],
+                    class_name=values['class_name'],
+                    email=values.get('email') or None,
+                    images=images
+                ))
+        return rows, rejected
+
+    def import_csv(
+        self,
+        csv_path: str,
+        restart: bool = False,
+        progress: Callable[[int, int], bool] = None
+    ) -> ImportSummary:
+        """
+        Import every valid row of a CSV file
+        Nhập mọi dòng hợp lệ của file CSV, theo lô, có checkpoint để chạy tiếp khi bị ngắt
+
+        Args:
+            csv_path: File CSV (student_id, full_name, class_name, email, image_glob)
+            restart: Bỏ qua checkpoint của lần chạy trước
+            progress: Gọi với (số sinh viên đã xử lý, tổng số); trả về False để dừng sau lô hiện tại
+
+        Returns:
+            ImportSummary (số sinh viên/ảnh, các dòng bị loại, thông lượng)
+        """
+        start = time.time()
+        rows, rejected = self.read_csv(csv_path)
+        summary = ImportSummary(total_rows=len(rows) + len(rejected), rejected=rejected)
+
+        checkpoint_path = csv_path + '.checkpoint.json'
+        done = set() if restart else self._read_checkpoint(checkpoint_path)
+        pending = [row for row in rows if row.student_id not in done]
+        summary.resumed = len(rows) - len(pending)
+
+        existing = self.repository.get_existing_ids([row.student_id for row in pending])
+        for row in pending:
+            if row.student_id in existing:
+                rejected[row.student_id] = 'already exists'
+        pending = [row for row in pending if row.student_id not in existing]
+
+        if pending:
+            # Nạp gallery trước khi copy ảnh, để lần nạp này không tự embed (tuần tự) các ảnh đang nhập
+            gallery = FaceRecognitionStrategyFactory.create_strategy(self.model_name, load=False).get_gallery()
+            print(f"📥 Importing {len(pending)} student(s) with {max(config.IMPORT_WORKERS, 1)} worker(s)...")
+
+            executor = self._create_executor()
+            try:
+                chunk_size = max(config.IMPORT_CHUNK_SIZE, 1)
+                for chunk_start in range(0, len(pending), chunk_size):
+                    chunk = pending[chunk_start:chunk_start + chunk_size]
+                    tasks = [(row.student_id, row.images) for row in chunk]
+                    if executor is not None:
+                        results = list(executor.map(_prepare_student, tasks))
+                    else:
+                        results = [_prepare_student(task) for task in tasks]
+
+                    done.update(self._commit_chunk(chunk, results, gallery, summary))
+                    self._write_checkpoint(checkpoint_path, done)
+
+                    processed = chunk_start + len(chunk)
+                    print(f"   {processed}/{len(pending)} students "
+                          f"({processed / max(time.time() - start, 1e-6):.1f}/s)")
+                    if progress is not None and progress(processed, len(pending)) is False:
+                        summary.cancelled = True
+                        break
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+
+        summary.elapsed = time.time() - start
+        print(f"✓ Bulk import: {summary.summary()}")
+        return summary
+
+    def _create_executor(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Nhóm tiến trình embed; IMPORT_WORKERS <= 1 thì chạy tuần tự trong tiến trình hiện tại
+        (spawn: TensorFlow không an toàn khi fork tiến trình đã nạp model)
+        """
+        if config.IMPORT_WORKERS <= 1:
+            _init_worker(self.model_name)
+            return None
+        return ProcessPoolExecutor(
+            max_workers=config.IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name,)
+        )
+
+    def _commit_chunk(
+        self,
+        chunk: List[ImportRow],
+        results: List[Dict[str, Any]],
+        gallery: EmbeddingGallery,
+        summary: ImportSummary
+    ) -> List[str]:
+        """
+        Ghi một lô: một transaction cho các sinh viên, thêm embedding vào gallery và lưu gallery một lần
+
+        Returns:
+            Mã các sinh viên đã nhập
+        """
+        students: List[Student] = []
+        items = []
+        for row, result in zip(chunk, results):
+            summary.invalid_images += len(result['invalid'])
+            if not result['images']:
+                rejected_dir = os.path.join(config.STUDENT_DATABASE_PATH, row.student_id)
+                shutil.rmtree(rejected_dir, ignore_errors=True)
+                summary.rejected[row.student_id] = 'no readable image'
+                continue
+
+            students.append(Student(
+                student_id=row.student_id,
+                full_name=row.full_name,
+                class_name=row.class_name,
+                email=row.email,
+                face_encoding_path=result['images'][0][0]
+            ))
+            for path, mtime, embedding, quality in result['images']:
+                items.append((path, row.student_id, embedding, mtime))
+                summary.images += 1
+                if not quality.ok:
+                    summary.warnings += 1
+
+        student_ids = [student.student_id for student in students]
+        try:
+            self.repository.create_many(students)
+        except ValueError:
+            # Cả lô bị hủy: xóa ảnh đã copy để thư mục sinh viên khớp với database
+            for student_id in student_ids:
+                shutil.rmtree(os.path.join(config.STUDENT_DATABASE_PATH, student_id), ignore_errors=True)
+            raise
+
+        summary.embedded += gallery.add_embeddings(items)
+        gallery.save()
+        image_manifest.refresh_students(student_ids)
+        summary.imported += len(students)
+        return student_ids
+
+    @staticmethod
+    def _read_checkpoint(checkpoint_path: str) -> Set[str]:
+        """Mã các sinh viên đã nhập ở lần chạy trước (rỗng nếu chưa có checkpoint)"""
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                return set(json.load(f).get('done', []))
+        except (OSError, ValueError):
+            return set()
+
+    @staticmethod
+    def _write_checkpoint(checkpoint_path: str, done: Set[str]) -> None:
+        """Ghi checkpoint (ghi file tạm rồi đổi tên để không để lại file hỏng)"""
+        tmp_file = checkpoint_path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'done': sorted(done), 'updated': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+        os.replace(tmp_file, checkpoint_path)
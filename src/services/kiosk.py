@@ -0,0 +1,362 @@
+"""
+Continuous webcam attendance (kiosk mode)
+Chế độ kiosk: điểm danh liên tục từ webcam, không cần bấm phím
+- capture: một luồng đọc camera vào hàng đợi có giới hạn (đầy thì bỏ khung hình cũ nhất)
+- detect: phát hiện khuôn mặt trên khung hình đã thu nhỏ, căn chỉnh lại khuôn mặt trên khung hình gốc (như ảnh mẫu)
+- track: gán track ID cho từng khuôn mặt; chỉ khuôn mặt chưa nhận diện đủ tin cậy mới được gửi đi embedding
+- embed: nhóm luồng trích xuất embedding theo lô và tìm trong gallery thường trú
+- write: ghi điểm danh theo lô (một transaction mỗi KIOSK_WRITE_INTERVAL giây)
+Mỗi giai đoạn có bộ đếm (đã xử lý, bị bỏ, tốc độ) và độ sâu hàng đợi để theo dõi nghẽn.
+"""
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.config.config import config
+from src.models.models import FaceRecognitionResult
+from src.services.services import AttendanceService, FaceRecognitionService
+from src.utils.face_tracker import FaceTracker
+from src.utils.lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+
+
+@dataclass
+class StageCounter:
+    """Bộ đếm của một giai đoạn pipeline"""
+    processed: int = 0  # Số phần tử đã xử lý xong
+    dropped: int = 0  # Số phần tử bị bỏ do hàng đợi phía sau đầy
+    started: float = field(default_factory=time.time)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, processed: int = 0, dropped: int = 0) -> None:
+        with self._lock:
+            self.processed += processed
+            self.dropped += dropped
+
+    def snapshot(self) -> Dict[str, float]:
+        """Số liệu hiện tại kèm tốc độ trung bình (phần tử/giây)"""
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-6)
+            return {'processed': self.processed, 'dropped': self.dropped, 'rate': self.processed / elapsed}
+
+
+@dataclass
+class FaceCrop:
+    """Một khuôn mặt cắt từ khung hình, chờ nhận diện"""
+    face: np.ndarray  # Khuôn mặt đã căn chỉnh RGB (0-1), giống ảnh mẫu của gallery
+    facial_area: Dict[str, int]  # Tọa độ trên khung hình gốc
+    captured_at: float  # Thời điểm chụp khung hình
+    track_id: Optional[int] = None  # Track của khuôn mặt (kết quả nhận diện được ghi ngược lại vào track)
+
+
+class KioskPipeline:
+    """
+    Pipelined capture -> detect -> embed/search -> write attendance loop
+    Pipeline điểm danh liên tục cho kiosk đặt ở cửa lớp
+
+    Cách sử dụng:
+        kiosk = KioskPipeline(class_name="CS101")
+        kiosk.start()
+        ...  # hiển thị kiosk.latest_frame, kiosk.stats()
+        kiosk.stop()
+    """
+
+    def __init__(
+        self,
+        model_name: str = None,
+        class_name: str = None,
+        status: str = 'present',
+        camera_index: int = None,
+        on_marked: Optional[Callable[[FaceRecognitionResult], None]] = None
+    ):
+        """
+        Args:
+            model_name: Model nhận diện (mặc định: DEFAULT_MODEL)
+            class_name: Chỉ nhận diện sinh viên của lớp này (không bắt buộc)
+            status: Trạng thái điểm danh ghi vào database
+            camera_index: Chỉ số webcam (mặc định: KIOSK_CAMERA_INDEX)
+            on_marked: Được gọi (trên luồng ghi) cho mỗi sinh viên vừa được điểm danh
+        """
+        self.recognition_service = FaceRecognitionService(model_name)
+        self.attendance_service = AttendanceService()
+        self.roster = self.recognition_service.resolve_roster(class_name)
+        self.status = status
+        self.camera_index = config.KIOSK_CAMERA_INDEX if camera_index is None else camera_index
+        self.on_marked = on_marked
+
+        # Hàng đợi giữa các giai đoạn
+        self.frame_queue: "queue.Queue" = queue.Queue(maxsize=config.KIOSK_FRAME_QUEUE_SIZE)
+        self.face_queue: "queue.Queue" = queue.Queue(maxsize=config.KIOSK_FACE_QUEUE_SIZE)
+        self.result_queue: "queue.Queue" = queue.Queue()
+
+        self.counters = {name: StageCounter() for name in ('capture', 'detect', 'embed', 'write')}
+        self.tracker = FaceTracker()
+        self.marked: List[FaceRecognitionResult] = []  # Sinh viên đã được điểm danh trong phiên
+        self.last_error: Optional[str] = None
+        self.latest_frame: Optional[np.ndarray] = None  # Khung hình mới nhất (để hiển thị xem trước)
+        self.latest_faces: List[Dict[str, Any]] = []  # Khuôn mặt (kèm nhãn track) trên khung hình gần nhất
+
+        self._last_seen: Dict[str, float] = {}  # student_id -> lần nhận diện gần nhất (cooldown)
+        self._stop_event = threading.Event()
+        # Luồng ghi dừng riêng, sau khi các luồng embed đã kết thúc (không bỏ sót kết quả cuối cùng)
+        self._writer_stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop_event.is_set()
+
+    def start(self) -> None:
+        """Mở camera và khởi động mọi giai đoạn"""
+        if self.running:
+            return
+        capture = cv2.VideoCapture(self.camera_index)
+        if not capture.isOpened():
+            raise RuntimeError(f"Cannot open camera {self.camera_index}")
+
+        self._stop_event.clear()
+        self._writer_stop_event.clear()
+        for counter in self.counters.values():
+            counter.started = time.time()
+
+        self._threads = [threading.Thread(target=self._capture_loop, args=(capture,), name="kiosk-capture", daemon=True),
+                         threading.Thread(target=self._detect_loop, name="kiosk-detect", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._embed_loop, name=f"kiosk-embed-{i}", daemon=True)
+            for i in range(max(1, config.KIOSK_EMBED_WORKERS))
+        ]
+        self._threads.append(threading.Thread(target=self._write_loop, name="kiosk-write", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        print(f"🚪 Kiosk started: camera {self.camera_index}, model {self.recognition_service.context.get_model_name()}")
+
+    def stop(self, timeout: float = 5.0) -> Dict[str, Any]:
+        """
+        Stop every stage, flushing pending attendance writes
+        Dừng mọi giai đoạn (ghi nốt các kết quả đang chờ)
+
+        Returns:
+            Số liệu cuối cùng (giống stats())
+        """
+        self._stop_event.set()
+        writers = [thread for thread in self._threads if thread.name == "kiosk-write"]
+        for thread in self._threads:
+            if thread not in writers:
+                thread.join(timeout)
+        # Các luồng embed đã dừng: mọi kết quả đã nằm trong result_queue, luồng ghi ghi nốt rồi mới dừng
+        self._writer_stop_event.set()
+        for thread in writers:
+            thread.join(timeout)
+        self._threads = []
+        print(f"🚪 Kiosk stopped: {len(self.marked)} student(s) marked")
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per-stage counters and queue depths
+        Số liệu của từng giai đoạn: đã xử lý, bị bỏ, tốc độ, độ sâu hàng đợi đầu vào
+        """
+        stages = {name: counter.snapshot() for name, counter in self.counters.items()}
+        stages['detect']['queue'] = self.frame_queue.qsize()
+        stages['embed']['queue'] = self.face_queue.qsize()
+        stages['write']['queue'] = self.result_queue.qsize()
+        return {
+            'stages': stages,
+            'tracks': self.tracker.stats(),
+            'marked': len(self.marked),
+            'last_error': self.last_error
+        }
+
+    def status_lines(self) -> List[str]:
+        """Một dòng cho mỗi giai đoạn (hiển thị trên khung hình xem trước)"""
+        stats = self.stats()
+        lines = []
+        for name, stage in stats['stages'].items():
+            line = f"{name:<8}{stage['rate']:6.1f}/s"
+            if 'queue' in stage:
+                line += f"  queue {stage['queue']}"
+            if stage['dropped']:
+                line += f"  dropped {stage['dropped']}"
+            lines.append(line)
+        tracks = stats['tracks']
+        lines.append(f"tracks  {tracks['active']} active  embedded {tracks['recognitions']}  reused {tracks['reused']}")
+        lines.append(f"marked  {stats['marked']}")
+        return lines
+
+    def _capture_loop(self, capture: Any) -> None:
+        """Đọc camera liên tục; hàng đợi đầy thì bỏ khung hình cũ nhất để luôn xử lý hình mới"""
+        try:
+            while not self._stop_event.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    time.sleep(0.05)
+                    continue
+                self.latest_frame = frame
+                captured_at = time.time()
+                try:
+                    self.frame_queue.put_nowait((frame, captured_at))
+                except queue.Full:
+                    try:
+                        self.frame_queue.get_nowait()
+                        self.counters['capture'].add(dropped=1)
+                    except queue.Empty:
+                        pass
+                    self.frame_queue.put_nowait((frame, captured_at))
+                self.counters['capture'].add(processed=1)
+        finally:
+            capture.release()
+
+    def _detect_loop(self) -> None:
+        """
+        Phát hiện khuôn mặt trên khung hình thu nhỏ, ghép với các track hiện có
+        và chỉ căn chỉnh khuôn mặt (trên khung hình gốc) cho những track còn cần nhận diện
+        """
+        detect_stage = self.recognition_service.context.strategy.detect_stage
+        while not self._stop_event.is_set():
+            try:
+                frame, captured_at = self.frame_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            try:
+                # Chạy detector trên ảnh nhỏ (nhanh hơn nhiều), rồi đổi tọa độ về khung hình gốc
+                scale = min(1.0, config.KIOSK_DETECT_WIDTH / frame.shape[1])
+                small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+                detected = detect_stage.detect_frame(small)
+            except Exception as e:
+                self.last_error = f"detect: {str(e)}"
+                continue
+
+            areas, small_faces = [], []
+            for face in detected:
+                area = {key: int(round(face['facial_area'][key] / scale)) for key in ('x', 'y', 'w', 'h')}
+                if area['w'] >= config.KIOSK_MIN_FACE_SIZE:
+                    areas.append(area)
+                    small_faces.append(face['face'])
+
+            tracks = self.tracker.update(areas, captured_at)
+            for area, small_face, track in zip(areas, small_faces, tracks):
+                # Track đã nhận diện xong (hoặc đang chờ kết quả): chỉ cập nhật khung, không embedding lại
+                if not self.tracker.needs_recognition(track, captured_at):
+                    continue
+
+                # Căn chỉnh lại trên khung hình gốc (đủ chi tiết, cùng phân phối với ảnh mẫu của gallery);
+                # không thấy khuôn mặt trong vùng thì dùng khuôn mặt đã căn chỉnh trên ảnh nhỏ
+                try:
+                    aligned = detect_stage.align_region(frame, area)
+                except Exception as e:
+                    self.last_error = f"align: {str(e)}"
+                    aligned = None
+                face = aligned if aligned is not None else small_face
+                if face is None or face.size == 0:
+                    self.tracker.resolve(track.track_id)
+                    continue
+                try:
+                    self.face_queue.put_nowait(FaceCrop(face, area, captured_at, track.track_id))
+                except queue.Full:
+                    # Nhận diện không theo kịp: bỏ khuôn mặt, track sẽ được thử lại ở khung hình sau
+                    self.tracker.resolve(track.track_id)
+                    self.counters['detect'].add(dropped=1)
+
+            self.latest_faces = [dict(track.box, label=track.label) for track in tracks]
+            self.counters['detect'].add(processed=1)
+
+    def _embed_loop(self) -> None:
+        """Gom các khuôn mặt đang chờ thành lô, embedding và tìm trong gallery"""
+        batch_size = max(1, config.RECOGNITION_BATCH_SIZE)
+        while not self._stop_event.is_set():
+            try:
+                batch = [self.face_queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self.face_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.recognition_service.recognize_face_crops([crop.face for crop in batch], self.roster)
+            except Exception as e:
+                self.last_error = f"embed: {str(e)}"
+                for crop in batch:
+                    self.tracker.resolve(crop.track_id)
+                continue
+
+            for crop, result in zip(batch, results):
+                self.tracker.resolve(crop.track_id, result)
+                if result.success:
+                    self.result_queue.put(result)
+            self.counters['embed'].add(processed=len(batch))
+
+    def _write_loop(self) -> None:
+        """
+        Ghi điểm danh theo lô; bỏ qua sinh viên vừa được nhận diện trong KIOSK_COOLDOWN_SECONDS
+        Lô ghi lỗi (ví dụ SQLite đang bị khóa) được giữ lại và ghi lại ở lần flush sau
+        """
+        pending: Dict[str, FaceRecognitionResult] = {}
+        next_flush = time.time() + config.KIOSK_WRITE_INTERVAL
+        while True:
+            stopping = self._writer_stop_event.is_set()
+            try:
+                result = self.result_queue.get(timeout=0.2)
+                now = time.time()
+                if now - self._last_seen.get(result.student_id, 0) >= config.KIOSK_COOLDOWN_SECONDS:
+                    # Giữ kết quả tin cậy nhất của mỗi sinh viên trong lô
+                    best = pending.get(result.student_id)
+                    if best is None or result.confidence > best.confidence:
+                        pending[result.student_id] = result
+                else:
+                    self.counters['write'].add(dropped=1)
+            except queue.Empty:
+                pass
+
+            flush_due = time.time() >= next_flush
+            if pending and (flush_due or stopping):
+                if self._flush(list(pending.values())):
+                    pending.clear()
+                elif stopping and self.result_queue.empty():
+                    # Lần ghi cuối cùng vẫn lỗi: báo rõ các sinh viên chưa được ghi
+                    lost = ', '.join(sorted(pending))
+                    self.last_error = f"write: attendance not saved for {lost}"
+                    print(f"✗ Kiosk: attendance not saved for {lost}")
+            if flush_due:
+                next_flush = time.time() + config.KIOSK_WRITE_INTERVAL
+            if stopping and self.result_queue.empty():
+                break
+
+    def _flush(self, results: List[FaceRecognitionResult]) -> bool:
+        """
+        Ghi một lô điểm danh trong một transaction
+
+        Returns:
+            False nếu ghi lỗi (người gọi giữ lại lô để ghi lại)
+        """
+        try:
+            bulk = self.attendance_service.mark_attendance_bulk(results, status=self.status)
+        except Exception as e:
+            self.last_error = f"write: {str(e)}"
+            print(f"⚠ Kiosk: could not write {len(results)} attendance record(s), will retry: {str(e)}")
+            return False
+
+        # Cooldown chỉ áp dụng cho sinh viên đã thật sự được ghi
+        now = time.time()
+        marked_ids = {record.student_id for record in bulk['marked']}
+        for result in results:
+            if result.student_id not in marked_ids:
+                continue
+            self._last_seen[result.student_id] = now
+            self.marked.append(result)
+            print(f"✓ Kiosk: {result.student_name} ({result.student_id}) - {result.confidence:.2%}")
+            if self.on_marked:
+                try:
+                    self.on_marked(result)
+                except Exception as e:
+                    print(f"⚠ Kiosk callback failed: {str(e)}")
+        self.counters['write'].add(processed=len(bulk['marked']))
+        return True
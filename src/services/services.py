@@ -9,15 +9,19 @@ import os  # Thao tác với hệ điều hành (file, thư mục)
 import shutil  # Copy, di chuyển file
 from typing import List, Optional, Dict, Any  # Type hints
 from datetime import datetime, date  # Xử lý ngày giờ
-import cv2  # OpenCV để xử lý ảnh
 import numpy as np  # Xử lý mảng số
 
 # Import các thành phần nội bộ
 from src.models.models import Student, AttendanceRecord, FaceRecognitionResult  # Các model
 from src.repositories.repositories import StudentRepository, AttendanceRepository  # Các repository
 from src.strategies.face_recognition_strategy import FaceRecognitionContext  # Context cho strategy pattern
-from src.factories.factory import FaceRecognitionStrategyFactory  # Factory tạo strategy
+from src.factories.factory import FaceRecognitionStrategyFactory, model_warmup  # Factory tạo strategy, warm-up model
+from src.strategies.pipeline import get_detect_stage  # Stage phát hiện khuôn mặt dùng chung
+from src.gallery.embedding_gallery import gallery_manager  # Gallery embedding dùng chung
+from src.gallery.image_manifest import ManifestDiff, image_manifest  # Danh mục ảnh của từng sinh viên
 from src.config.config import config  # Cấu hình ứng dụng
+from src.utils.detection_cache import ImageSource  # Ảnh đầu vào: đường dẫn, mảng BGR hoặc bytes
+from src.utils.face_quality import FaceQuality, assess_face_quality  # Đánh giá chất lượng ảnh mẫu
 
 
 class StudentService:
@@ -32,6 +36,8 @@ class StudentService:
     def __init__(self):
         """Khởi tạo service với repository sinh viên"""
         self.repository = StudentRepository()
+        # Báo cáo chất lượng ảnh của lần đăng ký/thêm ảnh gần nhất (controller đọc để hiển thị)
+        self.last_enrollment: List[FaceQuality] = []
 
     def register_student(
         self,
@@ -57,29 +63,9 @@ class StudentService:
         Returns:
             Đối tượng Student đã được tạo
         """
-        # Tạo thư mục riêng cho sinh viên để lưu ảnh
-        student_dir = os.path.join(config.STUDENT_DATABASE_PATH, student_id)
-        os.makedirs(student_dir, exist_ok=True)  # Tạo thư mục nếu chưa tồn tại
-
-        face_encoding_path = None  # Đường dẫn đến ảnh khuôn mặt chính
-
-        # Xử lý trường hợp có nhiều ảnh (phương pháp ưu tiên)
-        if image_paths and len(image_paths) > 0:
-            # Copy tất cả ảnh vào thư mục sinh viên
-            for idx, img_path in enumerate(image_paths):
-                if os.path.exists(img_path):
-                    ext = os.path.splitext(img_path)[1]  # Lấy phần mở rộng file (.jpg, .png, etc.)
-                    dest_path = os.path.join(student_dir, f"{student_id}_{idx}{ext}")  # Đặt tên file mới
-                    shutil.copy(img_path, dest_path)  # Copy file ảnh
-                    # Sử dụng ảnh đầu tiên làm ảnh chính
-                    if idx == 0:
-                        face_encoding_path = dest_path
-        # Xử lý trường hợp một ảnh (tương thích ngược)
-        elif image_path and os.path.exists(image_path):
-            ext = os.path.splitext(image_path)[1]
-            dest_path = os.path.join(student_dir, f"{student_id}_0{ext}")
-            shutil.copy(image_path, dest_path)
-            face_encoding_path = dest_path
+        # Copy ảnh vào thư mục riêng của sinh viên, ảnh đầu tiên làm ảnh chính
+        stored_paths = self._store_face_images(student_id, image_path, image_paths)
+        face_encoding_path = stored_paths[0] if stored_paths else None
 
         # Tạo đối tượng Student
         student = Student(
@@ -91,7 +77,13 @@ class StudentService:
         )
 
         # Lưu vào database thông qua repository
-        return self.repository.create(student)
+        created = self.repository.create(student)
+
+        # Phát hiện, đánh giá và embed ảnh mẫu ngay khi đăng ký (lần điểm danh đầu tiên không phải chờ)
+        self.last_enrollment = self.enroll_face_images(student_id, stored_paths) if stored_paths else []
+        image_manifest.refresh_student(student_id)
+
+        return created
 
     def add_student_face_image(self, student_id: str, image_path: str = None, image_paths: List[str] = None) -> Student:
         """
@@ -114,35 +106,90 @@ class StudentService:
         if not student:
             raise ValueError(f"Student {student_id} not found")
 
-        # Tạo thư mục nếu chưa có
-        student_dir = os.path.join(config.STUDENT_DATABASE_PATH, student_id)
-        os.makedirs(student_dir, exist_ok=True)
-
-        face_encoding_path = None
-
-        # Xử lý nhiều ảnh
-        if image_paths and len(image_paths) > 0:
-            for idx, img_path in enumerate(image_paths):
-                if os.path.exists(img_path):
-                    ext = os.path.splitext(img_path)[1]
-                    dest_path = os.path.join(student_dir, f"{student_id}_{idx}{ext}")
-                    shutil.copy(img_path, dest_path)
-                    if idx == 0:
-                        face_encoding_path = dest_path
-        # Xử lý một ảnh
-        elif image_path and os.path.exists(image_path):
-            ext = os.path.splitext(image_path)[1]
-            dest_path = os.path.join(student_dir, f"{student_id}_0{ext}")
-            shutil.copy(image_path, dest_path)
-            face_encoding_path = dest_path
+        # Copy ảnh vào thư mục sinh viên
+        stored_paths = self._store_face_images(student_id, image_path, image_paths)
 
         # Cập nhật đường dẫn ảnh nếu có
-        if face_encoding_path:
-            student.face_encoding_path = face_encoding_path
-            return self.repository.update(student)
+        if stored_paths:
+            student.face_encoding_path = stored_paths[0]
+            updated = self.repository.update(student)
+            # Chỉ embed các ảnh mới/bị ghi đè, ảnh cũ giữ nguyên embedding
+            self.last_enrollment = self.enroll_face_images(student_id, stored_paths)
+            image_manifest.refresh_student(student_id)
+            return updated
 
         raise ValueError("No valid image provided")
 
+    def enroll_face_images(self, student_id: str, image_paths: List[str]) -> List[FaceQuality]:
+        """
+        Detect, quality-check and embed a student's new samples
+        Phát hiện, đánh giá chất lượng và embed các ảnh mẫu mới của sinh viên
+
+        - Phát hiện + căn chỉnh qua DetectStage dùng chung: kết quả nằm trong detection_cache,
+          gallery embed lại không phải chạy detector lần nữa
+        - Embed vào mọi gallery đang nạp; chưa có gallery nào thì không nạp model/gallery ở đây
+          (đăng ký chạy trên luồng GUI): ảnh mới được embed khi gallery nạp lần sau (quét mtime),
+          detector không phải chạy lại vì kết quả đã nằm trong detection_cache
+        - Ảnh kém chất lượng chỉ được cảnh báo, vẫn được lưu và embed
+        Tắt bằng ENROLL_EMBED_ON_REGISTER=false (khi đó chỉ cập nhật các gallery đang nạp).
+
+        Returns:
+            Báo cáo chất lượng của từng ảnh (theo thứ tự đầu vào)
+        """
+        if not config.ENROLL_EMBED_ON_REGISTER:
+            gallery_manager.sync_student(student_id)
+            return []
+
+        detect_stage = get_detect_stage(config.DETECTION_BACKEND)
+        reports = [assess_face_quality(path, detect_stage.detect_all(path)) for path in image_paths]
+
+        galleries = gallery_manager.loaded_galleries()
+        if galleries:
+            gallery_manager.sync_student(student_id)
+            for report in reports:
+                report.embedded = any(gallery.has_image(report.path) for gallery in galleries)
+                if not report.embedded:
+                    report.issues.append('not embedded')
+        else:
+            print(f"   ℹ No gallery loaded: samples of {student_id} will be embedded when the gallery loads")
+
+        flagged = [r for r in reports if not r.ok]
+        print(f"🧾 Enrolled {len(reports)} sample(s) for {student_id}: "
+              f"{len(reports) - len(flagged)} ok, {len(flagged)} with warnings")
+        for report in flagged:
+            print(f"   ⚠ {os.path.basename(report.path)}: {', '.join(report.issues)}")
+        return reports
+
+    def _store_face_images(self, student_id: str, image_path: str = None, image_paths: List[str] = None) -> List[str]:
+        """
+        Copy face image(s) into the student's folder
+        Copy ảnh khuôn mặt vào thư mục của sinh viên
+
+        Ảnh được đặt tên {student_id}_{idx}{ext}. Ảnh đã nằm sẵn đúng vị trí
+        (ví dụ ảnh chụp trực tiếp từ webcam) thì không copy lại.
+
+        Returns:
+            Danh sách đường dẫn ảnh đã lưu (theo thứ tự đầu vào)
+        """
+        # Tạo thư mục riêng cho sinh viên để lưu ảnh
+        student_dir = os.path.join(config.STUDENT_DATABASE_PATH, student_id)
+        os.makedirs(student_dir, exist_ok=True)  # Tạo thư mục nếu chưa tồn tại
+
+        # Ưu tiên danh sách nhiều ảnh, nếu không có thì dùng một ảnh (tương thích ngược)
+        sources = image_paths if image_paths else ([image_path] if image_path else [])
+
+        stored_paths = []
+        for idx, img_path in enumerate(sources):
+            if not os.path.exists(img_path):
+                continue
+            ext = os.path.splitext(img_path)[1]  # Lấy phần mở rộng file (.jpg, .png, etc.)
+            dest_path = os.path.join(student_dir, f"{student_id}_{idx}{ext}")  # Đặt tên file mới
+            if os.path.abspath(img_path) != os.path.abspath(dest_path):
+                shutil.copy(img_path, dest_path)  # Copy file ảnh
+            stored_paths.append(dest_path)
+
+        return stored_paths
+
     def get_student(self, student_id: str) -> Optional[Student]:
         """
         Get student by ID
@@ -209,7 +256,13 @@ class StudentService:
             shutil.rmtree(student_dir)  # Xóa thư mục và tất cả nội dung bên trong
 
         # Xóa sinh viên khỏi database
-        return self.repository.delete(student_id)
+        deleted = self.repository.delete(student_id)
+
+        # Đánh dấu xóa (tombstone) embedding của sinh viên trong các gallery đang nạp
+        gallery_manager.sync_student(student_id)
+        image_manifest.refresh_student(student_id)
+
+        return deleted
 
 
 class AttendanceService:
@@ -278,6 +331,59 @@ class AttendanceService:
         # Lưu vào database
         return self.repository.create(attendance)
 
+    def mark_attendance_bulk(
+        self,
+        results: List[FaceRecognitionResult],
+        status: str = 'present',
+        notes: str = None
+    ) -> Dict[str, Any]:
+        """
+        Mark attendance for many recognized students at once
+        Đánh dấu điểm danh cho nhiều sinh viên cùng lúc (một transaction)
+
+        Args:
+            results: Các kết quả nhận diện thành công
+            status: Trạng thái ('present', 'late', 'absent')
+            notes: Ghi chú thêm
+
+        Returns:
+            Dictionary {'marked': List[AttendanceRecord], 'skipped': List[Dict]} với lý do bỏ qua
+        """
+        today = date.today().strftime("%Y-%m-%d")
+        # Một truy vấn cho tất cả sinh viên đã điểm danh hôm nay, một truy vấn cho các sinh viên tồn tại
+        already_marked = self.repository.get_student_ids_by_date(today)
+        existing = self.student_repository.get_existing_ids(list({result.student_id for result in results}))
+
+        records = []
+        skipped = []
+        for result in results:
+            if result.student_id in already_marked:
+                skipped.append({
+                    'student_id': result.student_id,
+                    'message': f"Attendance already marked for student {result.student_id} today"
+                })
+                continue
+            if result.student_id not in existing:
+                skipped.append({
+                    'student_id': result.student_id,
+                    'message': f"Student {result.student_id} not found"
+                })
+                continue
+
+            already_marked.add(result.student_id)
+            records.append(AttendanceRecord(
+                student_id=result.student_id,
+                check_in_time=datetime.now(),
+                confidence=result.confidence,
+                model_used=result.model_used,
+                status=status,
+                session_date=today,
+                notes=notes
+            ))
+
+        marked = self.repository.create_many(records) if records else []
+        return {'marked': marked, 'skipped': skipped}
+
     def get_attendance_by_student(self, student_id: str) -> List[AttendanceRecord]:
         """
         Get all attendance records for a student
@@ -379,7 +485,8 @@ class FaceRecognitionService:
             model_name = config.DEFAULT_MODEL
 
         # Tạo strategy cho model được chọn thông qua Factory
-        strategy = FaceRecognitionStrategyFactory.create_strategy(model_name)
+        # (chưa nạp model: warm-up nạp trên luồng nền, hoặc lần nhận diện đầu tiên sẽ nạp)
+        strategy = FaceRecognitionStrategyFactory.create_strategy(model_name, load=False)
         # Tạo context để sử dụng strategy
         self.context = FaceRecognitionContext(strategy)
         # Repository để truy vấn thông tin sinh viên
@@ -396,18 +503,22 @@ class FaceRecognitionService:
         strategy = FaceRecognitionStrategyFactory.create_strategy(model_name)
         self.context.strategy = strategy
 
-    def recognize_student(self, image_path: str) -> FaceRecognitionResult:
+    def recognize_student(self, image_path: ImageSource, roster: List[str] = None) -> FaceRecognitionResult:
         """
         Recognize student from image
         Nhận diện sinh viên từ ảnh
 
         Args:
-            image_path: Đường dẫn đến ảnh chứa khuôn mặt
+            image_path: Đường dẫn ảnh, khung hình BGR (ndarray) hoặc ảnh đã mã hóa (bytes)
+            roster: Chỉ so khớp với các sinh viên này (danh sách lớp/buổi học), None = tất cả
 
         Returns:
             FaceRecognitionResult chứa kết quả nhận diện
         """
         try:
+            # Lấy lại strategy từ registry (nạp lại nếu model đã bị loại khỏi bộ nhớ)
+            self._ensure_model_resident()
+
             # Kiểm tra database có ảnh không
             if not self._validate_database_has_images():
                 return FaceRecognitionResult(
@@ -421,11 +532,8 @@ class FaceRecognitionService:
                     face_detected=True
                 )
 
-            # Thực hiện nhận diện khuôn mặt bằng DeepFace
-            results = self.context.recognize_face(
-                image_path=image_path,
-                database_path=config.STUDENT_DATABASE_PATH
-            )
+            # So khớp với gallery embedding thường trú (một phép nhân ma trận, không đọc lại pickle)
+            matches = self.context.match_face(image_path, config.GALLERY_TOP_K, roster)
 
             # Lấy thông tin model và ngưỡng
             model_name = self.context.get_model_name()
@@ -435,21 +543,22 @@ class FaceRecognitionService:
             print(f"\n🔍 Recognition Debug:")
             print(f"   Model: {model_name}")
             print(f"   Threshold: {threshold}")
-            print(f"   Results found: {len(results) if results else 0}")
+            if roster is not None:
+                print(f"   Roster: {len(roster)} students")
+            print(f"   Results found: {len(matches)}")
 
             # Kiểm tra có kết quả không
-            if results and len(results) > 0 and len(results[0]) > 0:
+            if matches:
                 # Lấy kết quả tốt nhất (khoảng cách nhỏ nhất)
-                best_match = results[0].iloc[0]
-                distance = best_match['distance']  # Khoảng cách giữa các vector đặc trưng
+                best_match = matches[0]
+                distance = best_match.distance  # Khoảng cách giữa các vector đặc trưng
                 confidence = 1 - distance  # Độ tin cậy = 1 - khoảng cách
 
                 print(f"   Best match distance: {distance:.4f}")
                 print(f"   Confidence: {confidence:.2%}")
 
-                # Trích xuất student_id từ đường dẫn ảnh
-                identity_path = best_match['identity']
-                matched_student_id = self._extract_student_id_from_path(identity_path)
+                # Mã sinh viên lấy trực tiếp từ nhãn của gallery
+                matched_student_id = best_match.student_id
 
                 print(f"   Matched ID: {matched_student_id}")
 
@@ -463,13 +572,11 @@ class FaceRecognitionService:
 
                         if student:
                             # Validation bổ sung: Kiểm tra tính nhất quán của top 3 kết quả
-                            if len(results[0]) > 1:
-                                top_matches = results[0].head(3)
+                            if len(matches) > 1:
                                 print(f"   📊 Top 3 matches:")
-                                for idx, row in top_matches.iterrows():
-                                    match_id = self._extract_student_id_from_path(row['identity'])
-                                    match_conf = 1 - row['distance']
-                                    print(f"      {idx+1}. {match_id}: {match_conf:.2%} (dist: {row['distance']:.4f})")
+                                for idx, match in enumerate(matches[:3]):
+                                    match_conf = 1 - match.distance
+                                    print(f"      {idx+1}. {match.student_id}: {match_conf:.2%} (dist: {match.distance:.4f})")
 
                             # Trả về kết quả thành công
                             return FaceRecognitionResult(
@@ -496,7 +603,7 @@ class FaceRecognitionService:
                                 face_detected=True
                             )
                     else:
-                        # Không trích xuất được student_id từ đường dẫn
+                        # Không xác định được mã sinh viên của mẫu khớp
                         print(f"   ⚠ WARNING: Could not extract student ID from path!")
                         return FaceRecognitionResult(
                             success=False,
@@ -553,65 +660,216 @@ class FaceRecognitionService:
                 face_detected=True
             )
 
-    def _extract_student_id_from_path(self, path: str) -> Optional[str]:
+    def recognize_students_batch(self, image_paths: List[str], roster: List[str] = None) -> List[FaceRecognitionResult]:
         """
-        Extract student ID from file path
-        Trích xuất mã sinh viên từ đường dẫn file
+        Recognize students in many images with batched embedding extraction
+        Nhận diện sinh viên trong nhiều ảnh, khuôn mặt được gộp thành lô cho mỗi lần suy luận
 
-        Đường dẫn có dạng: data/students/STUDENT_ID/STUDENT_ID.ext
+        Args:
+            image_paths: Danh sách đường dẫn ảnh
+            roster: Chỉ so khớp với các sinh viên này, None = tất cả
+
+        Returns:
+            FaceRecognitionResult cho từng ảnh theo thứ tự đầu vào
         """
-        # Chuẩn hóa đường dẫn (xử lý cả / và \)
-        normalized_path = path.replace('\\', '/')
-        parts = normalized_path.split('/')
+        self._ensure_model_resident()
+
+        if not self._validate_database_has_images():
+            return [
+                FaceRecognitionResult(
+                    success=False,
+                    student_id=None,
+                    student_name=None,
+                    confidence=0.0,
+                    distance=1.0,
+                    model_used=self.context.get_model_name(),
+                    error_message="No students with face images found in database. Please register students first.",
+                    face_detected=True
+                )
+                for _ in image_paths
+            ]
 
-        # Tìm phần "students" và lấy thư mục tiếp theo
-        for i, part in enumerate(parts):
-            if part == 'students' and i + 1 < len(parts):
-                student_id = parts[i + 1]
-                print(f"   Extracted student_id: {student_id}")
-                return student_id
+        results = self.context.recognize_batch(image_paths, roster)
 
-        # Fallback: thử trích xuất từ tên file
-        filename = os.path.basename(path)
-        if '_' in filename:
-            student_id = filename.split('_')[0]
-            print(f"   Extracted student_id from filename: {student_id}")
-            return student_id
+        # Điền tên sinh viên; mẫu khớp nhưng chưa đăng ký được đánh dấu thất bại
+        for result in results:
+            if not result.success:
+                if not result.face_detected:
+                    result.error_message = "No face detected in image"
+                continue
 
-        return None
+            student = self.student_repository.get_by_id(result.student_id)
+            if student:
+                result.student_name = student.full_name
+            else:
+                result.success = False
+                result.error_message = (
+                    f"Face recognized as {result.student_id} but student not registered in database. "
+                    "Please register this student first."
+                )
 
-    def _validate_database_has_images(self) -> bool:
+        return results
+
+    def recognize_students_in_group(self, image_path: ImageSource, roster: List[str] = None) -> List[FaceRecognitionResult]:
         """
-        Validate that database has at least one student with images
-        Kiểm tra database có ít nhất một sinh viên có ảnh không
-        Đồng thời in cảnh báo cho sinh viên không có ảnh
+        Recognize every student in a group photo
+        Nhận diện tất cả sinh viên trong một ảnh chụp cả lớp
+        - Phát hiện mọi khuôn mặt một lần và trích xuất embedding theo lô
+        - Gán danh tính một-một: hai khuôn mặt không thể cùng nhận một sinh viên
+
+        Args:
+            image_path: Ảnh chụp cả lớp (đường dẫn, ndarray BGR hoặc bytes)
+            roster: Chỉ so khớp với các sinh viên này, None = tất cả
 
         Returns:
-            True nếu có ít nhất một sinh viên có ảnh, False nếu không
+            FaceRecognitionResult cho từng khuôn mặt phát hiện được
         """
-        students_path = config.STUDENT_DATABASE_PATH
-        if not os.path.exists(students_path):
-            return False
+        self._ensure_model_resident()
+
+        if not self._validate_database_has_images():
+            raise ValueError("No students with face images found in database. Please register students first.")
 
-        has_images = False
-        students_without_images = []
+        model_name = self.context.get_model_name()
+        faces = self.context.match_all_faces(image_path, config.GROUP_CANDIDATES_PER_FACE, roster)
+        assignment = self._assign_identities([face['matches'] for face in faces], config.get_threshold(model_name))
 
-        # Duyệt qua từng thư mục sinh viên
-        for student_id in os.listdir(students_path):
-            student_dir = os.path.join(students_path, student_id)
+        print(f"\n👥 Group Recognition: {len(faces)} faces, {len(assignment)} assigned ({model_name})")
 
-            # Bỏ qua nếu không phải thư mục
-            if not os.path.isdir(student_dir):
+        results = []
+        for face_idx, face in enumerate(faces):
+            match = assignment.get(face_idx)
+            if match is None:
+                best = face['matches'][0] if face['matches'] else None
+                results.append(FaceRecognitionResult(
+                    success=False,
+                    student_id=None,
+                    student_name=None,
+                    confidence=1 - best.distance if best else 0.0,
+                    distance=best.distance if best else 1.0,
+                    model_used=model_name,
+                    error_message="No unique match for this face",
+                    face_detected=True
+                ))
                 continue
 
-            # Đếm số file ảnh
-            image_files = [f for f in os.listdir(student_dir)
-                          if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+            student = self.student_repository.get_by_id(match.student_id)
+            results.append(FaceRecognitionResult(
+                success=student is not None,
+                student_id=match.student_id,
+                student_name=student.full_name if student else None,
+                confidence=1 - match.distance,
+                distance=match.distance,
+                model_used=model_name,
+                error_message=None if student else f"Face recognized as {match.student_id} but student not registered in database.",
+                face_detected=True
+            ))
 
-            if len(image_files) == 0:
-                students_without_images.append(student_id)
-            else:
-                has_images = True
+        return results
+
+    def recognize_face_crops(self, faces: List[np.ndarray], roster: List[str] = None) -> List[FaceRecognitionResult]:
+        """
+        Recognize already detected face crops (e.g. from video frames)
+        Nhận diện các khuôn mặt đã được phát hiện (RGB, 0-1), embedding theo lô
+
+        Args:
+            faces: Các khuôn mặt đã cắt
+            roster: Chỉ so khớp với các sinh viên này, None = tất cả
+
+        Returns:
+            FaceRecognitionResult cho từng khuôn mặt theo thứ tự đầu vào
+        """
+        self._ensure_model_resident()
+
+        model_name = self.context.get_model_name()
+        threshold = config.get_threshold(model_name)
+        results = []
+        for matches in self.context.match_crops(faces, student_ids=roster):
+            best = matches[0] if matches else None
+            confidence = 1 - best.distance if best else 0.0
+            success = best is not None and best.distance < threshold and confidence >= config.MIN_CONFIDENCE_FOR_ATTENDANCE
+            student = self.student_repository.get_by_id(best.student_id) if success else None
+            results.append(FaceRecognitionResult(
+                success=student is not None,
+                student_id=best.student_id if best else None,
+                student_name=student.full_name if student else None,
+                confidence=confidence,
+                distance=best.distance if best else 1.0,
+                model_used=model_name,
+                error_message=None if student else "No student recognized",
+                face_detected=True
+            ))
+
+        return results
+
+    @staticmethod
+    def _assign_identities(face_matches: List[List[Any]], threshold: float) -> Dict[int, Any]:
+        """
+        Greedy one-to-one assignment of faces to students
+        Gán khuôn mặt cho sinh viên theo thứ tự khoảng cách tăng dần, mỗi sinh viên tối đa một khuôn mặt
+
+        Args:
+            face_matches: Danh sách GalleryMatch (đã sắp xếp) cho từng khuôn mặt
+            threshold: Ngưỡng khoảng cách của model
+
+        Returns:
+            Dictionary {chỉ số khuôn mặt: GalleryMatch được gán}
+        """
+        # Chỉ giữ mẫu gần nhất của mỗi sinh viên cho từng khuôn mặt
+        candidates = []
+        for face_idx, matches in enumerate(face_matches):
+            seen = set()
+            for match in matches:
+                if match.student_id in seen:
+                    continue
+                seen.add(match.student_id)
+                if match.distance < threshold and 1 - match.distance >= config.MIN_CONFIDENCE_FOR_ATTENDANCE:
+                    candidates.append((match.distance, face_idx, match))
+
+        candidates.sort(key=lambda item: item[0])
+
+        assignment: Dict[int, Any] = {}
+        taken = set()
+        for _, face_idx, match in candidates:
+            if face_idx in assignment or match.student_id in taken:
+                continue
+            assignment[face_idx] = match
+            taken.add(match.student_id)
+
+        return assignment
+
+    def resolve_roster(self, class_name: str = None, student_ids: List[str] = None) -> Optional[List[str]]:
+        """
+        Build the recognition roster for a class or session
+        Xác định danh sách sinh viên được phép so khớp
+
+        Args:
+            class_name: Tên lớp (lấy thành viên qua StudentRepository.get_by_class)
+            student_ids: Danh sách mã sinh viên của buổi học
+
+        Returns:
+            Danh sách mã sinh viên, hoặc None nếu không giới hạn (so khớp tất cả)
+        """
+        if not class_name and student_ids is None:
+            return None
+
+        roster = set(student_ids or [])
+        if class_name:
+            roster.update(student.student_id for student in self.student_repository.get_by_class(class_name))
+        return sorted(roster)
+
+    def _validate_database_has_images(self) -> bool:
+        """
+        Validate that database has at least one student with images
+        Kiểm tra database có ít nhất một sinh viên có ảnh không
+        Đồng thời in cảnh báo cho sinh viên không có ảnh
+
+        Tra cứu trong image manifest (O(1)), không duyệt thư mục ảnh ở mỗi lần nhận diện.
+
+        Returns:
+            True nếu có ít nhất một sinh viên có ảnh, False nếu không
+        """
+        has_images = image_manifest.has_images()
+        students_without_images = image_manifest.students_without_images()
 
         # In cảnh báo cho sinh viên không có ảnh
         if students_without_images:
@@ -622,13 +880,13 @@ class FaceRecognitionService:
 
         return has_images
 
-    def verify_student(self, image_path: str, student_id: str) -> Dict[str, Any]:
+    def verify_student(self, image_path: ImageSource, student_id: str) -> Dict[str, Any]:
         """
         Verify if image matches a specific student
         Xác minh ảnh có khớp với sinh viên cụ thể không
 
         Args:
-            image_path: Đường dẫn ảnh cần xác minh
+            image_path: Ảnh cần xác minh (đường dẫn, ndarray BGR hoặc bytes)
             student_id: Mã sinh viên cần so sánh
 
         Returns:
@@ -643,8 +901,13 @@ class FaceRecognitionService:
             }
 
         try:
-            # Thực hiện xác minh khuôn mặt
-            result = self.context.verify_face(image_path, student.face_encoding_path)
+            self._ensure_model_resident()
+
+            # So với các embedding mẫu của sinh viên trong gallery (không đọc lại ảnh đã đăng ký)
+            result = self.context.verify_against_gallery(image_path, student_id)
+            if result is None:
+                # Sinh viên chưa có mẫu trong gallery: so trực tiếp với ảnh chính
+                result = self.context.verify_face(image_path, student.face_encoding_path)
             return result
         except Exception as e:
             return {
@@ -658,3 +921,75 @@ class FaceRecognitionService:
         Lấy danh sách các model nhận diện có sẵn
         """
         return FaceRecognitionStrategyFactory.get_available_models()
+
+    def get_resident_models(self) -> List[Dict[str, Any]]:
+        """
+        Get models currently loaded in memory with their estimated size
+        Lấy danh sách model đang thường trú trong bộ nhớ và dung lượng ước tính
+        """
+        return FaceRecognitionStrategyFactory.get_resident_models()
+
+    def sync_image_changes(self) -> ManifestDiff:
+        """
+        Detect images added/changed/removed on disk and update only what they affect
+        Phát hiện ảnh được thêm/sửa/xóa trực tiếp trong thư mục sinh viên và chỉ cập nhật phần liên quan
+
+        - Gallery: embed lại đúng các ảnh thay đổi (kể cả khi ảnh bị ghi đè mà mtime giữ nguyên)
+        - Xóa cache .pkl của DeepFace.find trong thư mục sinh viên (không còn phải chạy clear_cache.bat)
+
+        Returns:
+            ManifestDiff (rỗng nếu không có gì thay đổi)
+        """
+        diff = image_manifest.scan_changes()
+        if not diff:
+            return diff
+
+        print(f"🗂️  Student images changed on disk: {diff.summary()}")
+        gallery_manager.invalidate(diff.changed)
+        for student_id in sorted(diff.students):
+            gallery_manager.sync_student(student_id)
+
+        # File representations_*.pkl của DeepFace.find không tự nhận ra ảnh thay đổi
+        students_path = config.STUDENT_DATABASE_PATH
+        for filename in os.listdir(students_path):
+            if filename.endswith('.pkl'):
+                try:
+                    os.remove(os.path.join(students_path, filename))
+                    print(f"   Removed stale DeepFace cache {filename}")
+                except OSError as e:
+                    print(f"⚠ Could not remove {filename}: {str(e)}")
+        return diff
+
+    def start_warmup(self, preload_all: bool = None) -> bool:
+        """
+        Start loading the current model (and optionally all models) in the background
+        Khởi động model hiện tại trên luồng nền (tùy chọn nạp trước mọi model)
+
+        Returns:
+            True nếu luồng warm-up được khởi động
+        """
+        return model_warmup.start(self.context.get_model_name(), preload_all)
+
+    def get_warmup_status(self) -> Dict[str, Any]:
+        """
+        Get the readiness of the current model and the warm-up state of every model
+        Lấy trạng thái sẵn sàng của model hiện tại và trạng thái warm-up của từng model
+        """
+        model_name = self.context.get_model_name()
+        states = model_warmup.status()
+        # Model đã được nạp bởi một lần nhận diện trước đó (không qua warm-up) cũng coi là sẵn sàng
+        for resident in FaceRecognitionStrategyFactory.get_resident_models():
+            if states.get(resident['model']) in (None, 'pending'):
+                states[resident['model']] = 'ready'
+        state = states.get(model_name, 'pending')
+        return {
+            'model': model_name,
+            'ready': state == 'ready',
+            'state': state,
+            'models': states
+        }
+
+    def _ensure_model_resident(self):
+        """Đảm bảo model hiện tại vẫn thường trú và cập nhật thứ tự LRU của registry"""
+        model_name = self.context.get_model_name()
+        self.context.strategy = FaceRecognitionStrategyFactory.create_strategy(model_name)
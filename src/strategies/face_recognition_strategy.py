@@ -3,14 +3,24 @@ Strategy là mẫu thiết kế cho phép chọn thuật toán tại thời đi
 Trong trường hợp này, chúng ta có thể chọn các chiến lược nhận diện khuôn mặt khác nhau như VGG-Face, Facenet, ArcFace, v.v.
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from dataclasses import replace
+from typing import List, Dict, Any, FrozenSet, Optional
 import os
+import threading
+import time
 import numpy as np
-from deepface import DeepFace
-import cv2
 
 from src.models.models import FaceRecognitionResult
 from src.config.config import config
+from src.gallery.embedding_gallery import EmbeddingGallery, GalleryMatch, gallery_manager
+from src.strategies.model_spec import ModelSpec, get_model_spec
+from src.strategies.pipeline import DetectStage, EmbedStage, SearchStage, get_detect_stage, get_embed_stage
+from src.utils.detection_cache import ImageSource, image_key
+from src.utils.lazy_import import lazy_module
+
+# DeepFace kéo theo TensorFlow (vài giây): chỉ import khi thật sự nhận diện
+DeepFace = lazy_module('deepface.DeepFace')
 
 """Lớp này là lớp cha cho tất cả các chiến lược nhận diện khuôn mặt."""
 class IFaceRecognitionStrategy(ABC):
@@ -29,7 +39,7 @@ class IFaceRecognitionStrategy(ABC):
         pass
 
     @abstractmethod
-    def extract_embedding(self, image_path: str) -> np.ndarray:
+    def extract_embedding(self, image_path: str, enforce_detection: bool = True) -> np.ndarray:
         """Extract face embedding from image"""
         pass
 
@@ -38,17 +48,352 @@ class IFaceRecognitionStrategy(ABC):
         """Get the model name"""
         pass
 
+    def network_names(self) -> List[str]:
+        """Tên các mạng nhận diện mà chiến lược giữ trong cache model của DeepFace"""
+        return [self.get_model_name()]
 
-class VGGFaceStrategy(IFaceRecognitionStrategy):
-    """Lớp con triển khai chiến lược nhận diện khuôn mặt VGG-Face, sẽ kế thừa từ IFaceRecognitionStrategy."""
+    # Các giai đoạn pipeline dùng chung (detect -> embed -> search)
+    @property
+    def detect_stage(self) -> DetectStage:
+        """Stage phát hiện khuôn mặt của detector hiện tại (dùng chung giữa các model)"""
+        return get_detect_stage(self.detection_backend)
 
-    #Khởi tạo các thuộc tính cụ thể cho chiến lược VGG-Face.
-    def __init__(self):
-        self.model_name = "VGG-Face"
+    @property
+    def embed_stage(self) -> EmbedStage:
+        """Stage trích xuất embedding của model"""
+        return get_embed_stage(get_model_spec(self.get_model_name()))
+
+    @property
+    def search_stage(self) -> SearchStage:
+        """Stage tìm kiếm trong gallery thường trú của model"""
+        return SearchStage(self.get_gallery())
+
+    # Các phương thức dùng chung cho mọi chiến lược, dựa trên gallery embedding thường trú
+    def get_gallery(self) -> EmbeddingGallery:
+        """
+        Get the resident embedding gallery of this model/detector
+        Lấy gallery embedding thường trú ứng với model và detector của chiến lược
+        (nạp một lần, dùng chung trong toàn bộ tiến trình)
+        """
+        return gallery_manager.get_gallery(
+            self.get_model_name(),
+            self.detection_backend,
+            lambda path: self.extract_embedding(path, enforce_detection=False)
+        )
+
+    def match_face(self, image_path: ImageSource, top_k: int = None, student_ids: List[str] = None) -> List[GalleryMatch]:
+        """
+        Match the face in an image against the resident gallery
+        So khớp khuôn mặt trong ảnh với gallery thường trú
+        (chỉ trong roster student_ids nếu được truyền vào)
+
+        Returns:
+            Danh sách GalleryMatch sắp xếp theo khoảng cách tăng dần (rỗng nếu không trích xuất được)
+        """
+        embedding = self._embed_image(image_path)
+        if embedding.size == 0:
+            return []
+        return self.get_gallery().search(embedding, top_k or config.GALLERY_TOP_K, student_ids=student_ids)
+
+    def verify_against_gallery(self, image_path: ImageSource, student_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Verify an image against a student's enrolled sample embeddings
+        Xác minh ảnh với các embedding mẫu đã đăng ký của một sinh viên trong gallery thường trú
+
+        Chỉ một lần suy luận cho ảnh cần xác minh; khoảng cách tới mọi mẫu của sinh viên
+        được tính trong một phép nhân ma trận, ảnh đã đăng ký không bị đọc lại.
+
+        Returns:
+            Dict giống DeepFace.verify (kèm 'identity' và 'samples_compared'),
+            hoặc None nếu sinh viên chưa có mẫu nào trong gallery
+        """
+        start = time.time()
+        gallery = self.get_gallery()
+        if not gallery.has_student(student_id):
+            return None
+
+        embedding = self._embed_image(image_path, enforce_detection=True)
+        if embedding.size == 0:
+            raise ValueError(f"Face could not be detected in {os.path.basename(image_path) if isinstance(image_path, str) else 'frame'}")
+
+        matches = gallery.search(embedding, top_k=gallery.size, student_ids=[student_id])
+        if not matches:
+            return None
+
+        best = matches[0]
+        threshold = config.get_threshold(self.get_model_name())
+        return {
+            "verified": best.distance < threshold,
+            "distance": best.distance,
+            "threshold": threshold,
+            "model": self.get_model_name(),
+            "detector_backend": self.detection_backend,
+            "similarity_metric": gallery.distance_metric,
+            "identity": best.identity,
+            "samples_compared": len(matches),
+            "time": round(time.time() - start, 2)
+        }
+
+    def extract_embeddings_batch(self, image_paths: List[ImageSource], enforce_detection: bool = False) -> List[np.ndarray]:
+        """
+        Extract embeddings for many images with batched forward passes
+        Trích xuất embedding cho nhiều ảnh, gộp các khuôn mặt đã căn chỉnh thành một tensor cho mỗi lần suy luận
+
+        Args:
+            image_paths: Danh sách đường dẫn ảnh
+            enforce_detection: Báo lỗi nếu không phát hiện khuôn mặt
+
+        Returns:
+            Danh sách embedding theo đúng thứ tự đầu vào (mảng rỗng nếu ảnh lỗi)
+        """
+        embeddings: List[np.ndarray] = [np.array([]) for _ in image_paths]
+        faces: List[np.ndarray] = []
+        owners: List[int] = []
+
+        # Phát hiện khuôn mặt từng ảnh (detector của DeepFace không hỗ trợ batch)
+        for idx, image_path in enumerate(image_paths):
+            detected = self.detect_stage.detect(image_path, enforce_detection)
+            if not detected:
+                continue
+
+            # Giống extract_embedding: chỉ dùng khuôn mặt đầu tiên
+            faces.append(detected[0]["face"])
+            owners.append(idx)
+
+        for owner, vector in zip(owners, self.embed_stage.embed(faces)):
+            embeddings[owner] = vector
+
+        return embeddings
+
+    def match_faces_batch(
+        self,
+        image_paths: List[ImageSource],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        """
+        Match many images against the resident gallery
+        So khớp nhiều ảnh với gallery thường trú (embedding trích xuất theo lô)
+
+        Returns:
+            Danh sách kết quả so khớp cho từng ảnh, theo thứ tự đầu vào
+        """
+        return self.search_stage.search(self.extract_embeddings_batch(image_paths), top_k, student_ids)
+
+    def match_crops(
+        self,
+        faces: List[np.ndarray],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        """
+        Match already detected face crops against the resident gallery
+        So khớp các khuôn mặt đã phát hiện (RGB, 0-1) với gallery, không chạy lại detector
+
+        Returns:
+            Danh sách kết quả so khớp cho từng khuôn mặt, theo thứ tự đầu vào
+        """
+        return self.search_stage.search(self.embed_stage.embed(faces), top_k, student_ids)
+
+    def recognize_batch(self, image_paths: List[ImageSource], student_ids: List[str] = None) -> List[FaceRecognitionResult]:
+        """
+        Recognize faces in many images at once
+        Nhận diện khuôn mặt trong nhiều ảnh cùng lúc
+
+        Returns:
+            FaceRecognitionResult cho từng ảnh (student_name do tầng service điền)
+        """
+        model_name = self.get_model_name()
+        threshold = config.get_threshold(model_name)
+        results = []
+
+        for matches in self.match_faces_batch(image_paths, student_ids=student_ids):
+            if not matches:
+                results.append(FaceRecognitionResult(
+                    success=False,
+                    student_id=None,
+                    student_name=None,
+                    confidence=0.0,
+                    distance=1.0,
+                    model_used=model_name,
+                    face_detected=False
+                ))
+                continue
+
+            best = matches[0]
+            confidence = 1 - best.distance
+            results.append(FaceRecognitionResult(
+                success=best.distance < threshold and confidence >= config.MIN_CONFIDENCE_FOR_ATTENDANCE,
+                student_id=best.student_id,
+                student_name=None,
+                confidence=confidence,
+                distance=best.distance,
+                model_used=model_name,
+                face_detected=True
+            ))
+
+        return results
+
+    def extract_face_embeddings(self, image_path: ImageSource) -> List[Dict[str, Any]]:
+        """
+        Detect every face in an image and embed them in one batch
+        Phát hiện tất cả khuôn mặt trong ảnh (ví dụ ảnh cả lớp) và trích xuất embedding theo lô
+
+        Returns:
+            Danh sách dict {'facial_area': ..., 'embedding': ...} cho từng khuôn mặt
+        """
+        faces = self.detect_stage.detect_all(image_path)
+        vectors = self.embed_stage.embed([face["face"] for face in faces])
+        return [
+            {'facial_area': face["facial_area"], 'embedding': vector}
+            for face, vector in zip(faces, vectors)
+        ]
+
+    def match_all_faces(
+        self,
+        image_path: ImageSource,
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Match every face in an image against the resident gallery
+        So khớp mọi khuôn mặt trong ảnh với gallery thường trú
+
+        Returns:
+            Danh sách dict {'facial_area': ..., 'matches': List[GalleryMatch]} cho từng khuôn mặt
+        """
+        faces = self.extract_face_embeddings(image_path)
+        matches = self.search_stage.search([face['embedding'] for face in faces], top_k, student_ids)
+        return [
+            {'facial_area': face['facial_area'], 'matches': face_matches}
+            for face, face_matches in zip(faces, matches)
+        ]
+
+    def _embed_image(self, image_path: ImageSource, enforce_detection: bool = False) -> np.ndarray:
+        """Embedding khuôn mặt đầu tiên trong ảnh, dùng kết quả phát hiện từ cache (mảng rỗng nếu không có)"""
+        faces = self.detect_stage.detect(image_path, enforce_detection)
+        if not faces:
+            return np.array([])
+        return self.embed_stage.embed_one(faces[0]["face"])
+
+    def _verify_detected(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
+        """
+        Verify two images using cached detections
+        Xác minh hai ảnh bằng kết quả phát hiện trong cache, embed mọi khuôn mặt của cả hai ảnh trong một lần suy luận
+
+        Giống DeepFace.verify(enforce_detection=True): báo lỗi nếu một ảnh không có khuôn mặt,
+        lấy cặp khuôn mặt gần nhất khi ảnh có nhiều khuôn mặt, kết quả có cùng các khóa.
+        Ngưỡng và phép so sánh giống verify_against_gallery (config.get_threshold, distance < threshold),
+        để kết quả không phụ thuộc vào việc sinh viên đã có mẫu trong gallery hay chưa.
+        """
+        start = time.time()
+        faces1 = self.detect_stage.detect(img1_path, enforce_detection=True)
+        faces2 = self.detect_stage.detect(img2_path, enforce_detection=True)
+        for path, faces in ((img1_path, faces1), (img2_path, faces2)):
+            if not faces:
+                raise ValueError(f"Face could not be detected in {os.path.basename(str(path))}")
+
+        vectors = np.asarray(self.embed_stage.embed([face["face"] for face in faces1 + faces2]))
+        distances = _pairwise_distances(vectors[:len(faces1)], vectors[len(faces1):], self.distance_metric)
+        i, j = np.unravel_index(int(np.argmin(distances)), distances.shape)
+        distance = float(distances[i, j])
+        threshold = config.get_threshold(self.get_model_name())
+
+        return {
+            "verified": distance < threshold,
+            "distance": distance,
+            "threshold": threshold,
+            "model": self.get_model_name(),
+            "detector_backend": self.detection_backend,
+            "similarity_metric": self.distance_metric,
+            "facial_areas": {"img1": faces1[i]["facial_area"], "img2": faces2[j]["facial_area"]},
+            "time": round(time.time() - start, 2)
+        }
+
+    def load_model(self) -> Dict[str, int]:
+        """
+        Load the recognition network and face detector into memory
+        Nạp mạng nhận diện và bộ phát hiện khuôn mặt vào bộ nhớ
+
+        Returns:
+            Dictionary kích thước thường trú ước tính (bytes): {'model': ..., 'detector': ...}
+        """
+        model = DeepFace.build_model(model_name=self.get_model_name())
+        sizes = {'model': _estimate_model_bytes(model), 'detector': 0}
+
+        # OpenCV Haar cascade không phải mạng nơ-ron, không cần nạp trước
+        if self.detection_backend not in ('opencv', 'skip'):
+            detector = DeepFace.build_model(model_name=self.detection_backend, task="face_detector")
+            sizes['detector'] = _estimate_model_bytes(detector)
+
+        return sizes
+
+    def unload_model(self, unload_detector: bool = False, keep_networks: FrozenSet[str] = frozenset()):
+        """
+        Drop the network from DeepFace's in-process model cache
+        Giải phóng mạng khỏi cache model của DeepFace (best-effort)
+
+        Args:
+            unload_detector: Giải phóng cả bộ phát hiện (chỉ khi không model nào khác dùng chung)
+            keep_networks: Các mạng vẫn đang được model thường trú khác dùng, không giải phóng
+        """
+        try:
+            from deepface.modules import modeling
+            cached = getattr(modeling, 'cached_models', {})
+            if self.get_model_name() not in keep_networks:
+                cached.get('facial_recognition', {}).pop(self.get_model_name(), None)
+            if unload_detector:
+                cached.get('face_detector', {}).pop(self.detection_backend, None)
+        except Exception as e:
+            print(f"⚠ Could not unload {self.get_model_name()}: {str(e)}")
+
+
+def _pairwise_distances(a: np.ndarray, b: np.ndarray, metric: str) -> np.ndarray:
+    """Ma trận khoảng cách giữa các dòng của a và b theo metric của DeepFace"""
+    if metric == 'euclidean':
+        return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2)
+
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    if metric == 'euclidean_l2':
+        return np.linalg.norm(a[:, None, :] - b[None, :, :], axis=2)
+    return 1 - a @ b.T
+
+
+def _estimate_model_bytes(client: Any) -> int:
+    """Ước tính dung lượng trọng số (float32) của một model DeepFace"""
+    keras_model = getattr(client, 'model', None)
+    try:
+        return int(keras_model.count_params()) * 4
+    except Exception:
+        return 0
+
+
+class RecognitionEngine(IFaceRecognitionStrategy):
+    """
+    Recognition engine parametrized by a ModelSpec
+    Engine nhận diện dùng chung cho mọi model, tham số hóa bởi ModelSpec
+    - Nạp model và chạy warm-up một lần (load_model)
+    - Trích xuất theo lô qua EmbedStage (kích thước đầu vào, chuẩn hóa lấy từ spec)
+    - Cache embedding theo nội dung ảnh (EMBEDDING_CACHE_SIZE ảnh gần nhất)
+    Tối ưu hóa mới chỉ cần viết một lần ở đây và áp dụng cho mọi model.
+    """
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.model_name = spec.name
         self.distance_metric = config.DISTANCE_METRIC # Khoảng cách để so sánh khuôn mặt lấy từ config
         self.detection_backend = config.DETECTION_BACKEND # Phương pháp phát hiện khuôn mặt lấy từ config
+        # Cache embedding: (hash nội dung ảnh, enforce_detection) -> embedding, phần tử đầu là ít dùng nhất
+        self._embeddings: "OrderedDict[tuple[str, bool], np.ndarray]" = OrderedDict()
+        self._embeddings_lock = threading.Lock()
 
-    #Phương thức nhận diện khuôn mặt sử dụng mô hình VGG-Face, tham số là đường dẫn hình ảnh và cơ sở dữ liệu.
+    @property
+    def embed_stage(self) -> EmbedStage:
+        """Stage trích xuất embedding theo spec của engine"""
+        return get_embed_stage(self.spec)
+
+    #Phương thức nhận diện khuôn mặt với DeepFace.find, tham số là đường dẫn hình ảnh và cơ sở dữ liệu.
     # Trả về danh sách kết quả nhận diện dưới dạng Dict hoặc mảng numpy.
     def recognize_face(self, image_path: str, database_path: str) -> List[Dict[str, Any]]:
         try:
@@ -56,7 +401,7 @@ class VGGFaceStrategy(IFaceRecognitionStrategy):
             result = DeepFace.find(
                 img_path=image_path,
                 db_path=database_path,
-                model_name=self.model_name, # Sử dụng mô hình VGG-Face
+                model_name=self.model_name,
                 distance_metric=self.distance_metric, # Sử dụng khoảng cách từ config
                 detector_backend=self.detection_backend, # Sử dụng backend phát hiện khuôn mặt từ config
                 enforce_detection=False,  # Cho phép xử lý hình ảnh chất lượng kém
@@ -76,277 +421,260 @@ class VGGFaceStrategy(IFaceRecognitionStrategy):
         except ValueError as e:
             error_msg = str(e)
             if "Face could not be detected" in error_msg:
-                print(f"⚠ No face detected in image with model {self.model_name}")
+                print(f"⚠ No face detected with {self.model_name}")
             else:
                 print(f"✗ Error: {error_msg}")
             return []
 
         except Exception as e:
             error_msg = str(e)
+            # Lỗi pandas khi không có kết quả - bình thường
             if "Length of values" in error_msg or "does not match" in error_msg:
                 return []
             else:
-                print(f"✗ Error in VGG-Face recognition: {error_msg}")
+                print(f"✗ Error in {self.model_name} recognition: {error_msg}")
             return []
 
     def verify_face(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
-        """Hàm xác minh khuôn mặt sử dụng mô hình VGG-Face, trả về kết quả dưới dạng Dict."""
+        """Hàm xác minh khuôn mặt, trả về kết quả dưới dạng Dict."""
         try:
-            result = DeepFace.verify(
-                img1_path=img1_path,
-                img2_path=img2_path,
-                model_name=self.model_name, # Sử dụng mô hình VGG-Face
-                distance_metric=self.distance_metric, # Sử dụng khoảng cách từ config
-                detector_backend=self.detection_backend, # Sử dụng backend phát hiện khuôn mặt từ config
-                enforce_detection=True # Bắt buộc phát hiện khuôn mặt trong cả hai hình ảnh
-            )
+            result = self._verify_detected(img1_path, img2_path)
             return result # Trả về kết quả xác minh
         except Exception as e:
-            print(f"Error in VGG-Face verification: {str(e)}")
+            print(f"Error in {self.model_name} verification: {str(e)}")
             return {"verified": False, "distance": 1.0} # Trả về kết quả mặc định nếu có lỗi, "verified" là False và khoảng cách là 1.0
 
-    def extract_embedding(self, image_path: str) -> np.ndarray:
-        """Trích xuất embedding khuôn mặt sử dụng mô hình VGG-Face, trả về embedding dưới dạng mảng numpy."""
+    def extract_embedding(self, image_path: str, enforce_detection: bool = True) -> np.ndarray:
+        """Trích xuất embedding khuôn mặt, trả về embedding dưới dạng mảng numpy."""
         try:
-            #represent trả về danh sách các embedding
-            embedding = DeepFace.represent(
-                img_path=image_path,
-                model_name=self.model_name,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return np.array(embedding[0]["embedding"])
+            # Phát hiện qua DetectStage (dùng chung, có cache), embed qua EmbedStage của model
+            return self._embed_image(image_path, enforce_detection)
         except Exception as e:
-            print(f"Error extracting VGG-Face embedding: {str(e)}")
+            print(f"Error extracting {self.model_name} embedding: {str(e)}")
             return np.array([])
 
     def get_model_name(self) -> str:
         return self.model_name
 
+    def load_model(self) -> Dict[str, int]:
+        """Nạp model và detector, sau đó chạy warm-up để lần nhận diện đầu tiên không bị chậm"""
+        sizes = super().load_model()
+        self.warm_up()
+        return sizes
 
-class FacenetStrategy(IFaceRecognitionStrategy):
-
-    def __init__(self):
-        self.model_name = "Facenet"
-        self.distance_metric = config.DISTANCE_METRIC
-        self.detection_backend = config.DETECTION_BACKEND
-
-    def recognize_face(self, image_path: str, database_path: str) -> List[Dict[str, Any]]:
+    def warm_up(self) -> None:
+        """Chạy một lần suy luận giả (best-effort)"""
         try:
-            # Use enforce_detection=False to handle poor quality images
-            result = DeepFace.find(
-                img_path=image_path,
-                db_path=database_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=False,
-                silent=True
-            )
+            self.embed_stage.warm_up()
+        except Exception as e:
+            print(f"⚠ Could not warm up {self.model_name}: {str(e)}")
 
-            # Validate result
-            if result and len(result) > 0:
-                df = result[0]
-                if hasattr(df, '__len__') and len(df) > 0:
-                    return result
-            return []
+    def _embed_image(self, image_path: ImageSource, enforce_detection: bool = False) -> np.ndarray:
+        """Embedding khuôn mặt đầu tiên trong ảnh, lấy từ cache nếu cùng nội dung ảnh đã được embed"""
+        key = image_key(image_path)
+        if key is None:
+            return super()._embed_image(image_path, enforce_detection)
 
-        except ValueError as e:
-            error_msg = str(e)
-            if "Face could not be detected" in error_msg:
-                print(f"⚠ No face detected with Facenet")
-            else:
-                print(f"✗ Error: {error_msg}")
-            return []
+        cache_key = (key, enforce_detection)
+        with self._embeddings_lock:
+            embedding = self._embeddings.get(cache_key)
+            if embedding is not None:
+                self._embeddings.move_to_end(cache_key)
+                return embedding
 
-        except Exception as e:
-            error_msg = str(e)
-            # Pandas error when no matches - this is normal
-            if "Length of values" in error_msg or "does not match" in error_msg:
-                return []
-            else:
-                print(f"✗ Error in Facenet recognition: {error_msg}")
-            return []
+        embedding = super()._embed_image(image_path, enforce_detection)
+        # Không cache kết quả rỗng (không thấy khuôn mặt hoặc detector lỗi): lần sau thử lại
+        if embedding.size == 0:
+            return embedding
 
-    def verify_face(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
-        try:
-            result = DeepFace.verify(
-                img1_path=img1_path,
-                img2_path=img2_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return result
-        except Exception as e:
-            print(f"Error in Facenet verification: {str(e)}")
-            return {"verified": False, "distance": 1.0}
+        with self._embeddings_lock:
+            self._embeddings[cache_key] = embedding
+            while len(self._embeddings) > max(config.EMBEDDING_CACHE_SIZE, 1):
+                self._embeddings.popitem(last=False)
+        return embedding
 
-    def extract_embedding(self, image_path: str) -> np.ndarray:
-        try:
-            embedding = DeepFace.represent(
-                img_path=image_path,
-                model_name=self.model_name,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return np.array(embedding[0]["embedding"])
-        except Exception as e:
-            print(f"Error extracting Facenet embedding: {str(e)}")
-            return np.array([])
 
-    def get_model_name(self) -> str:
-        return self.model_name
+# Các tên lớp cũ, giữ lại như các spec mỏng của RecognitionEngine
+class VGGFaceStrategy(RecognitionEngine):
+    """Chiến lược nhận diện khuôn mặt VGG-Face"""
+
+    def __init__(self):
+        super().__init__(get_model_spec('VGG-Face'))
 
 
-class ArcFaceStrategy(IFaceRecognitionStrategy):
+class FacenetStrategy(RecognitionEngine):
+    """Chiến lược nhận diện khuôn mặt Facenet"""
 
     def __init__(self):
-        self.model_name = "ArcFace"
-        self.distance_metric = config.DISTANCE_METRIC
-        self.detection_backend = config.DETECTION_BACKEND
+        super().__init__(get_model_spec('Facenet'))
 
-    def recognize_face(self, image_path: str, database_path: str) -> List[Dict[str, Any]]:
-        try:
-            result = DeepFace.find(
-                img_path=image_path,
-                db_path=database_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=False,
-                silent=True
-            )
 
-            # Validate result
-            if result and len(result) > 0:
-                df = result[0]
-                if hasattr(df, '__len__') and len(df) > 0:
-                    return result
-            return []
+class ArcFaceStrategy(RecognitionEngine):
+    """Chiến lược nhận diện khuôn mặt ArcFace"""
 
-        except ValueError as e:
-            error_msg = str(e)
-            if "Face could not be detected" in error_msg:
-                print(f"⚠ No face detected with ArcFace")
-            else:
-                print(f"✗ Error: {error_msg}")
-            return []
+    def __init__(self):
+        super().__init__(get_model_spec('ArcFace'))
 
-        except Exception as e:
-            error_msg = str(e)
-            # Pandas error when no matches - this is normal
-            if "Length of values" in error_msg or "does not match" in error_msg:
-                return []
-            else:
-                print(f"✗ Error in ArcFace recognition: {error_msg}")
-            return []
 
-    def verify_face(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
-        try:
-            result = DeepFace.verify(
-                img1_path=img1_path,
-                img2_path=img2_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return result
-        except Exception as e:
-            print(f"Error in ArcFace verification: {str(e)}")
-            return {"verified": False, "distance": 1.0}
+class Facenet512Strategy(RecognitionEngine):
+    """Chiến lược nhận diện khuôn mặt Facenet512"""
 
-    def extract_embedding(self, image_path: str) -> np.ndarray:
-        try:
-            embedding = DeepFace.represent(
-                img_path=image_path,
-                model_name=self.model_name,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return np.array(embedding[0]["embedding"])
-        except Exception as e:
-            print(f"Error extracting ArcFace embedding: {str(e)}")
-            return np.array([])
+    def __init__(self):
+        super().__init__(get_model_spec('Facenet512'))
 
-    def get_model_name(self) -> str:
-        return self.model_name
 
+class CascadeStrategy(IFaceRecognitionStrategy):
+    """
+    Cascade of a fast and a heavy model
+    Chiến lược phân tầng: chạy model nhanh (CASCADE_FAST_MODEL) trước,
+    chỉ chuyển sang model nặng (CASCADE_HEAVY_MODEL) khi kết quả mơ hồ
 
-class Facenet512Strategy(IFaceRecognitionStrategy):
+    - Kết quả rõ ràng: khoảng cách tới sinh viên khác gần nhất lớn hơn khoảng cách tốt nhất
+      ít nhất CASCADE_MARGIN -> chấp nhận với chi phí của model nhanh
+    - Kết quả mơ hồ: embed lại CÙNG khuôn mặt đã phát hiện bằng model nặng và tìm trong gallery của nó
+    - Khoảng cách của model nặng được nhân với heavy_distance_scale để quy đổi về thang ngưỡng
+      của model nhanh, nên tầng service dùng một ngưỡng duy nhất (RECOGNITION_THRESHOLD['Cascade']).
+      Mặc định hệ số là ngưỡng nhanh / ngưỡng nặng: ngưỡng nặng rơi đúng vào ngưỡng nhanh, nhưng
+      đây là phép quy đổi tuyến tính chưa hiệu chỉnh; đặt CASCADE_HEAVY_DISTANCE_SCALE để thay thế
+    """
 
     def __init__(self):
-        self.model_name = "Facenet512"
+        self.model_name = "Cascade"
         self.distance_metric = config.DISTANCE_METRIC
         self.detection_backend = config.DETECTION_BACKEND
+        self.fast = RecognitionEngine(get_model_spec(config.CASCADE_FAST_MODEL))
+        self.heavy = RecognitionEngine(get_model_spec(config.CASCADE_HEAVY_MODEL))
+        self.queries = 0  # Số khuôn mặt đã so khớp
+        self.escalations = 0  # Số khuôn mặt phải chuyển sang model nặng
 
     def recognize_face(self, image_path: str, database_path: str) -> List[Dict[str, Any]]:
-        try:
-            # Use enforce_detection=False to handle poor quality images
-            result = DeepFace.find(
-                img_path=image_path,
-                db_path=database_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=False,
-                silent=True
-            )
+        return self.fast.recognize_face(image_path, database_path)
 
-            if result and len(result) > 0:
-                df = result[0]
-                if hasattr(df, '__len__') and len(df) > 0:
-                    return result
-            return []
+    def verify_face(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
+        # Xác minh 1:1 ít khi dùng: ưu tiên độ chính xác của model nặng
+        return self.heavy.verify_face(img1_path, img2_path)
 
-        except ValueError as e:
-            error_msg = str(e)
-            if "Face could not be detected" in error_msg:
-                print(f"⚠ No face detected with Facenet512")
-            else:
-                print(f"✗ Error: {error_msg}")
-            return []
+    def verify_against_gallery(self, image_path: ImageSource, student_id: str) -> Optional[Dict[str, Any]]:
+        return self.heavy.verify_against_gallery(image_path, student_id)
 
-        except Exception as e:
-            error_msg = str(e)
-            if "Length of values" in error_msg or "does not match" in error_msg:
-                return []
-            else:
-                print(f"✗ Error in Facenet512 recognition: {error_msg}")
+    def extract_embedding(self, image_path: str, enforce_detection: bool = True) -> np.ndarray:
+        return self.fast.extract_embedding(image_path, enforce_detection)
+
+    def get_model_name(self) -> str:
+        return self.model_name
+
+    def get_gallery(self) -> EmbeddingGallery:
+        """Gallery của model nhanh (gallery của model nặng chỉ được nạp khi cần chuyển tầng)"""
+        return self.fast.get_gallery()
+
+    @property
+    def escalation_rate(self) -> float:
+        """Tỉ lệ khuôn mặt phải chạy model nặng"""
+        return self.escalations / self.queries if self.queries else 0.0
+
+    def match_face(self, image_path: ImageSource, top_k: int = None, student_ids: List[str] = None) -> List[GalleryMatch]:
+        return self.match_faces_batch([image_path], top_k, student_ids)[0]
+
+    def match_faces_batch(
+        self,
+        image_paths: List[ImageSource],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        results: List[List[GalleryMatch]] = [[] for _ in image_paths]
+        crops: List[np.ndarray] = []
+        owners: List[int] = []
+        for idx, image_path in enumerate(image_paths):
+            faces = self.detect_stage.detect(image_path, enforce_detection=False)
+            if faces:
+                crops.append(faces[0]["face"])
+                owners.append(idx)
+
+        for owner, matches in zip(owners, self.match_crops(crops, top_k, student_ids)):
+            results[owner] = matches
+        return results
+
+    def match_all_faces(
+        self,
+        image_path: ImageSource,
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        faces = self.detect_stage.detect_all(image_path)
+        matches = self.match_crops([face["face"] for face in faces], top_k, student_ids)
+        return [
+            {'facial_area': face["facial_area"], 'matches': face_matches}
+            for face, face_matches in zip(faces, matches)
+        ]
+
+    def match_crops(
+        self,
+        faces: List[np.ndarray],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        """So khớp các khuôn mặt đã căn chỉnh: model nhanh cho tất cả, model nặng cho các khuôn mặt mơ hồ"""
+        if not faces:
             return []
+        top_k = top_k or config.GALLERY_TOP_K
+        # Lấy nhiều ứng viên hơn top_k để tìm được sinh viên khác gần nhất khi tính margin
+        pool = max(top_k, config.CASCADE_CANDIDATES)
 
-    def verify_face(self, img1_path: str, img2_path: str) -> Dict[str, Any]:
-        try:
-            result = DeepFace.verify(
-                img1_path=img1_path,
-                img2_path=img2_path,
-                model_name=self.model_name,
-                distance_metric=self.distance_metric,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return result
-        except Exception as e:
-            print(f"Error in Facenet512 verification: {str(e)}")
-            return {"verified": False, "distance": 1.0}
+        results = self._search_crops(self.fast, faces, pool, student_ids)
+        ambiguous = [i for i, matches in enumerate(results) if self._is_ambiguous(matches)]
 
-    def extract_embedding(self, image_path: str) -> np.ndarray:
-        try:
-            embedding = DeepFace.represent(
-                img_path=image_path,
-                model_name=self.model_name,
-                detector_backend=self.detection_backend,
-                enforce_detection=True
-            )
-            return np.array(embedding[0]["embedding"])
-        except Exception as e:
-            print(f"Error extracting Facenet512 embedding: {str(e)}")
-            return np.array([])
+        if ambiguous:
+            print(f"   ↗ Cascade: {len(ambiguous)}/{len(faces)} face(s) ambiguous with "
+                  f"{self.fast.get_model_name()}, escalating to {self.heavy.get_model_name()}")
+            scale = self.heavy_distance_scale
+            heavy_results = self._search_crops(self.heavy, [faces[i] for i in ambiguous], pool, student_ids)
+            for i, matches in zip(ambiguous, heavy_results):
+                results[i] = [replace(match, distance=match.distance * scale) for match in matches]
 
-    def get_model_name(self) -> str:
-        return self.model_name
+        self.queries += len(faces)
+        self.escalations += len(ambiguous)
+        return [matches[:top_k] for matches in results]
+
+    @property
+    def heavy_distance_scale(self) -> float:
+        """Hệ số quy đổi khoảng cách model nặng về thang model nhanh (CASCADE_HEAVY_DISTANCE_SCALE hoặc tỉ lệ ngưỡng)"""
+        if config.CASCADE_HEAVY_DISTANCE_SCALE > 0:
+            return config.CASCADE_HEAVY_DISTANCE_SCALE
+        return config.get_threshold(self.fast.get_model_name()) / config.get_threshold(self.heavy.get_model_name())
+
+    @staticmethod
+    def _search_crops(
+        strategy: IFaceRecognitionStrategy,
+        faces: List[np.ndarray],
+        top_k: int,
+        student_ids: Optional[List[str]]
+    ) -> List[List[GalleryMatch]]:
+        """Embed các khuôn mặt bằng model của strategy (theo lô) và tìm trong gallery của model đó"""
+        return strategy.search_stage.search(strategy.embed_stage.embed(faces), top_k, student_ids)
+
+    @staticmethod
+    def _is_ambiguous(matches: List[GalleryMatch]) -> bool:
+        """Mơ hồ khi sinh viên khác gần nhất cách kết quả tốt nhất chưa tới CASCADE_MARGIN"""
+        if not matches:
+            return False
+        best = matches[0]
+        rival = next((m for m in matches[1:] if m.student_id != best.student_id), None)
+        # Mọi ứng viên đều là cùng một sinh viên: thắng rõ ràng
+        return rival is not None and rival.distance - best.distance < config.CASCADE_MARGIN
+
+    def load_model(self) -> Dict[str, int]:
+        fast_sizes = self.fast.load_model()
+        heavy_sizes = self.heavy.load_model()
+        # Hai model dùng chung detector, chỉ tính một lần
+        return {'model': fast_sizes['model'] + heavy_sizes['model'], 'detector': fast_sizes['detector']}
+
+    def network_names(self) -> List[str]:
+        return [self.fast.get_model_name(), self.heavy.get_model_name()]
+
+    def unload_model(self, unload_detector: bool = False, keep_networks: FrozenSet[str] = frozenset()):
+        # Model con vẫn được đăng ký riêng trong ModelRegistry (ví dụ Facenet) thì giữ lại
+        self.fast.unload_model(unload_detector=False, keep_networks=keep_networks)
+        self.heavy.unload_model(unload_detector=unload_detector, keep_networks=keep_networks)
 
 
 class FaceRecognitionContext:
@@ -375,9 +703,54 @@ class FaceRecognitionContext:
         return self._strategy.verify_face(img1_path, img2_path)
 
     # Phương thức để trích xuất embedding khuôn mặt, ủy quyền cho chiến lược hiện tại.
-    def extract_embedding(self, image_path: str) -> np.ndarray:
+    def extract_embedding(self, image_path: str, enforce_detection: bool = True) -> np.ndarray:
         """Delegate embedding extraction to strategy"""
-        return self._strategy.extract_embedding(image_path)
+        return self._strategy.extract_embedding(image_path, enforce_detection)
+
+    # Phương thức để so khớp khuôn mặt với gallery thường trú, ủy quyền cho chiến lược hiện tại.
+    def match_face(self, image_path: ImageSource, top_k: int = None, student_ids: List[str] = None) -> List[GalleryMatch]:
+        """Delegate gallery matching to strategy"""
+        return self._strategy.match_face(image_path, top_k, student_ids)
+
+    # Phương thức để xác minh ảnh với các mẫu đã đăng ký của sinh viên, ủy quyền cho chiến lược hiện tại.
+    def verify_against_gallery(self, image_path: ImageSource, student_id: str) -> Optional[Dict[str, Any]]:
+        """Delegate gallery-based verification to strategy"""
+        return self._strategy.verify_against_gallery(image_path, student_id)
+
+    # Phương thức để so khớp nhiều ảnh cùng lúc, ủy quyền cho chiến lược hiện tại.
+    def match_faces_batch(
+        self,
+        image_paths: List[ImageSource],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        """Delegate batched gallery matching to strategy"""
+        return self._strategy.match_faces_batch(image_paths, top_k, student_ids)
+
+    # Phương thức để so khớp các khuôn mặt đã phát hiện, ủy quyền cho chiến lược hiện tại.
+    def match_crops(
+        self,
+        faces: List[np.ndarray],
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[List[GalleryMatch]]:
+        """Delegate face-crop matching to strategy"""
+        return self._strategy.match_crops(faces, top_k, student_ids)
+
+    # Phương thức để nhận diện nhiều ảnh cùng lúc, ủy quyền cho chiến lược hiện tại.
+    def recognize_batch(self, image_paths: List[ImageSource], student_ids: List[str] = None) -> List[FaceRecognitionResult]:
+        """Delegate batched recognition to strategy"""
+        return self._strategy.recognize_batch(image_paths, student_ids)
+
+    # Phương thức để so khớp mọi khuôn mặt trong một ảnh, ủy quyền cho chiến lược hiện tại.
+    def match_all_faces(
+        self,
+        image_path: ImageSource,
+        top_k: int = None,
+        student_ids: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Delegate multi-face gallery matching to strategy"""
+        return self._strategy.match_all_faces(image_path, top_k, student_ids)
 
     # Phương thức để lấy tên mô hình hiện tại, ủy quyền cho chiến lược hiện tại.
     def get_model_name(self) -> str:
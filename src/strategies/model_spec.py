@@ -0,0 +1,64 @@
+"""
+Model specifications for the recognition engine
+Thông số của các model nhận diện, dùng để tham số hóa RecognitionEngine
+- Mỗi model chỉ là một ModelSpec: kích thước đầu vào, số chiều embedding, chuẩn hóa, ngưỡng
+- Thêm model mới = đăng ký một ModelSpec, không cần viết thêm lớp strategy
+"""
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from src.config.config import config
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Thông số của một model nhận diện"""
+    name: str  # Tên model trong DeepFace
+    input_size: Tuple[int, int]  # Kích thước đầu vào (cao, rộng)
+    embedding_dim: int  # Số chiều embedding
+    normalization: str = 'base'  # Kiểu chuẩn hóa đầu vào của DeepFace (preprocessing.normalize_input)
+    l2_normalize: bool = False  # Chuẩn hóa L2 đầu ra (giống forward() của client DeepFace)
+    threshold: float = 0.4  # Ngưỡng khoảng cách nhận diện
+
+
+MODEL_SPECS: Dict[str, ModelSpec] = {
+    'VGG-Face': ModelSpec(
+        name='VGG-Face',
+        input_size=(224, 224),
+        embedding_dim=4096,
+        l2_normalize=True,  # VggFaceClient.forward chuẩn hóa L2 đầu ra
+        threshold=config.get_threshold('VGG-Face')
+    ),
+    'Facenet': ModelSpec(
+        name='Facenet',
+        input_size=(160, 160),
+        embedding_dim=128,
+        threshold=config.get_threshold('Facenet')
+    ),
+    'Facenet512': ModelSpec(
+        name='Facenet512',
+        input_size=(160, 160),
+        embedding_dim=512,
+        threshold=config.get_threshold('Facenet512')
+    ),
+    'ArcFace': ModelSpec(
+        name='ArcFace',
+        input_size=(112, 112),
+        embedding_dim=512,
+        threshold=config.get_threshold('ArcFace')
+    )
+}
+
+
+def get_model_spec(model_name: str) -> ModelSpec:
+    """Lấy thông số của một model đã đăng ký"""
+    spec = MODEL_SPECS.get(model_name)
+    if spec is None:
+        raise ValueError(f"No model spec registered for '{model_name}'")
+    return spec
+
+
+def register_model_spec(spec: ModelSpec) -> None:
+    """Đăng ký (hoặc thay thế) thông số model; ngưỡng được đưa vào config để tầng service dùng"""
+    MODEL_SPECS[spec.name] = spec
+    config.RECOGNITION_THRESHOLD[spec.name] = spec.threshold
@@ -0,0 +1,228 @@
+"""
+Recognition pipeline stages shared by every strategy
+Các giai đoạn của pipeline nhận diện, dùng chung cho mọi chiến lược
+- DetectStage: phát hiện + căn chỉnh khuôn mặt (một instance cho mỗi detector, kết quả qua detection_cache)
+- EmbedStage: đưa các khuôn mặt đã căn chỉnh qua mạng nhận diện theo lô (một instance cho mỗi ModelSpec)
+- SearchStage: tìm các embedding trong gallery thường trú của model
+
+Detector không còn chạy bên trong DeepFace.represent/verify của từng model: khuôn mặt phát hiện
+một lần có thể được embed bởi nhiều model, hoặc bởi cùng một model nhiều lần.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config.config import config
+from src.gallery.embedding_gallery import EmbeddingGallery, GalleryMatch
+from src.strategies.model_spec import ModelSpec
+from src.utils.detection_cache import DetectedFace, ImageSource, decode_image, detection_cache
+from src.utils.lazy_import import lazy_module
+
+# DeepFace kéo theo TensorFlow: chỉ import ở lần phát hiện/trích xuất đầu tiên
+DeepFace = lazy_module('deepface.DeepFace')
+
+
+class DetectStage:
+    """Giai đoạn phát hiện và căn chỉnh khuôn mặt cho một detector"""
+
+    def __init__(self, detection_backend: str):
+        self.detection_backend = detection_backend
+
+    def detect(self, image: ImageSource, enforce_detection: bool = False) -> List[DetectedFace]:
+        """
+        Detect and align faces, reusing cached results for the same image content
+        Phát hiện và căn chỉnh khuôn mặt, dùng lại kết quả đã có của cùng nội dung ảnh
+
+        Args:
+            image: Đường dẫn ảnh, mảng BGR hoặc ảnh đã mã hóa (bytes)
+            enforce_detection: Bỏ kết quả "cả ảnh" (confidence 0) khi không thấy khuôn mặt
+
+        Returns:
+            Danh sách khuôn mặt (rỗng nếu lỗi hoặc không thấy khuôn mặt với enforce_detection)
+        """
+        try:
+            faces = detection_cache.detect(image, self.detection_backend, self._run_detector)
+        except Exception as e:
+            # Lỗi detector không được lưu vào cache: lần sau sẽ chạy lại thay vì nhớ "không có khuôn mặt"
+            print(f"⚠ No face extracted from {_describe(image)}: {str(e)}")
+            return []
+
+        # Cache lưu kết quả enforce_detection=False (cả ảnh, confidence 0, khi không thấy khuôn mặt)
+        if enforce_detection and self.detection_backend != 'skip':
+            faces = [face for face in faces if face["confidence"] > 0]
+            if not faces:
+                print(f"⚠ No face extracted from {_describe(image)}: Face could not be detected")
+        return faces
+
+    def detect_all(self, image: ImageSource) -> List[DetectedFace]:
+        """Mọi khuôn mặt thật trong ảnh (bỏ kết quả "cả ảnh" khi không thấy khuôn mặt)"""
+        faces = self.detect(image, enforce_detection=False)
+        if self.detection_backend != 'skip':
+            faces = [face for face in faces if face.get("confidence", 0) > 0]
+        return faces
+
+    def detect_frame(self, frame: np.ndarray) -> List[DetectedFace]:
+        """
+        Detect faces in a video frame without the detection cache
+        Phát hiện khuôn mặt trong một khung hình video (không qua cache: khung hình không lặp lại)
+
+        Returns:
+            Các khuôn mặt thật trong khung hình (bỏ kết quả "cả ảnh" khi không thấy khuôn mặt)
+        """
+        try:
+            faces = self._run_detector(frame)
+        except Exception as e:
+            print(f"⚠ Face detection failed on frame: {str(e)}")
+            return []
+        if self.detection_backend != 'skip':
+            faces = [face for face in faces if face.get("confidence", 0) > 0]
+        return faces
+
+    def align_region(self, frame: np.ndarray, area: Dict[str, int]) -> Optional[np.ndarray]:
+        """
+        Align the face inside a region of a full-resolution frame
+        Căn chỉnh khuôn mặt trong một vùng của khung hình gốc (có lề), giống ảnh mẫu trong gallery
+
+        Returns:
+            Khuôn mặt căn chỉnh lớn nhất trong vùng (RGB, 0-1), None nếu không thấy
+        """
+        # Thêm lề để detector thấy đủ khuôn mặt (mắt, cằm) khi căn chỉnh
+        pad_x, pad_y = area['w'] // 4, area['h'] // 4
+        top, left = max(area['y'] - pad_y, 0), max(area['x'] - pad_x, 0)
+        region = frame[top:area['y'] + area['h'] + pad_y, left:area['x'] + area['w'] + pad_x]
+        if region.size == 0:
+            return None
+        faces = self.detect_frame(np.ascontiguousarray(region))
+        if not faces:
+            return None
+        return max(faces, key=lambda f: f['facial_area']['w'] * f['facial_area']['h'])['face']
+
+    def warm_up(self) -> None:
+        """Chạy detector một lần trên ảnh trống (không lưu vào cache) để nạp sẵn model phát hiện"""
+        if self.detection_backend != 'skip':
+            self._run_detector(np.zeros((160, 160, 3), dtype=np.uint8))
+
+    def _run_detector(self, image: ImageSource) -> List[DetectedFace]:
+        """
+        Chạy detector của DeepFace (chỉ được gọi khi cache trượt)
+        Lỗi được ném ra để detection_cache không lưu kết quả của lần chạy thất bại
+        """
+        # DeepFace nhận đường dẫn hoặc mảng BGR; bytes được giải mã trong bộ nhớ, không ghi ra file tạm
+        return DeepFace.extract_faces(
+            img_path=decode_image(image),
+            detector_backend=self.detection_backend,
+            enforce_detection=False,
+            align=True
+        )
+
+
+class EmbedStage:
+    """Giai đoạn trích xuất embedding cho một model, tham số hóa bởi ModelSpec"""
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.model_name = spec.name
+
+    @property
+    def model(self) -> Any:
+        """Model DeepFace (DeepFace tự giữ cache nên chỉ nạp một lần)"""
+        return DeepFace.build_model(model_name=self.model_name)
+
+    def embed(self, faces: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Embed aligned face crops in batches of RECOGNITION_BATCH_SIZE
+        Trích xuất embedding cho các khuôn mặt đã căn chỉnh (RGB, 0-1), theo lô
+
+        Returns:
+            Danh sách embedding theo thứ tự đầu vào
+        """
+        if not faces:
+            return []
+        model = self.model
+        crops = [self.prepare(face) for face in faces]
+
+        vectors: List[np.ndarray] = []
+        batch_size = max(1, config.RECOGNITION_BATCH_SIZE)
+        for start in range(0, len(crops), batch_size):
+            batch = np.concatenate(crops[start:start + batch_size], axis=0)
+            vectors.extend(self._forward(model, batch))
+        return vectors
+
+    def embed_one(self, face: np.ndarray) -> np.ndarray:
+        """Embedding của một khuôn mặt đã căn chỉnh"""
+        return self.embed([face])[0]
+
+    def warm_up(self) -> None:
+        """Chạy một lần suy luận trên ảnh rỗng để TensorFlow dựng sẵn đồ thị tính toán"""
+        height, width = self.spec.input_size
+        self._forward(self.model, np.zeros((1, height, width, 3), dtype=np.float32))
+
+    def prepare(self, face: np.ndarray) -> np.ndarray:
+        """Đổi RGB -> BGR, resize về kích thước đầu vào và chuẩn hóa theo spec, giống DeepFace.represent"""
+        from deepface.modules import preprocessing
+
+        # input_size là (cao, rộng), resize_image nhận (rộng, cao)
+        height, width = self.spec.input_size
+        img = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(width, height))
+        return preprocessing.normalize_input(img=img, normalization=self.spec.normalization)
+
+    def _forward(self, model: Any, batch: np.ndarray) -> np.ndarray:
+        """Chạy một lần suy luận cho cả lô khuôn mặt, trả về ma trận (số ảnh, số chiều)"""
+        vectors = np.asarray(model.model(batch, training=False))
+        if self.spec.l2_normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+
+class SearchStage:
+    """Giai đoạn tìm kiếm trong gallery thường trú"""
+
+    def __init__(self, gallery: EmbeddingGallery):
+        self.gallery = gallery
+
+    def search(
+        self,
+        embeddings: List[np.ndarray],
+        top_k: int = None,
+        student_ids: Optional[List[str]] = None
+    ) -> List[List[GalleryMatch]]:
+        """Top-k mẫu gần nhất cho từng embedding (rỗng với embedding rỗng)"""
+        top_k = top_k or config.GALLERY_TOP_K
+        return [
+            self.gallery.search(embedding, top_k, student_ids=student_ids) if embedding.size > 0 else []
+            for embedding in embeddings
+        ]
+
+
+# Mỗi detector/model có đúng một stage, dùng chung giữa các strategy
+_detect_stages: Dict[str, DetectStage] = {}
+_embed_stages: Dict[str, EmbedStage] = {}
+_stages_lock = threading.Lock()
+
+
+def get_detect_stage(detection_backend: str) -> DetectStage:
+    """Lấy stage phát hiện dùng chung của một detector"""
+    with _stages_lock:
+        stage = _detect_stages.get(detection_backend)
+        if stage is None:
+            stage = DetectStage(detection_backend)
+            _detect_stages[detection_backend] = stage
+        return stage
+
+
+def get_embed_stage(spec: ModelSpec) -> EmbedStage:
+    """Lấy stage trích xuất embedding dùng chung của một model"""
+    with _stages_lock:
+        stage = _embed_stages.get(spec.name)
+        if stage is None or stage.spec != spec:
+            stage = EmbedStage(spec)
+            _embed_stages[spec.name] = stage
+        return stage
+
+
+def _describe(image: ImageSource) -> str:
+    """Tên ngắn của ảnh để in thông báo"""
+    return os.path.basename(image) if isinstance(image, str) else "frame"
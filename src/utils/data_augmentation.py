@@ -10,6 +10,8 @@ import os
 from typing import List, Tuple
 import random
 
+from src.utils.face_detector import detector_registry
+
 
 class FaceDataAugmentation:
     """
@@ -193,13 +195,8 @@ class VGGFace2Inspired:
         Face alignment - căn chỉnh khuôn mặt theo landmark
         Technique từ VGGFace2
         """
-        # Detect face
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        # Detect face (Haar cascade dùng chung, không nạp lại cho mỗi ảnh)
+        faces = detector_registry.detect(image, 'haar', scale_factor=1.1, min_neighbors=4, min_size=1)
 
         if len(faces) > 0:
             # Lấy face đầu tiên
@@ -268,13 +265,14 @@ class VGGFace2Inspired:
         return normalized
 
 
-def augment_existing_dataset(data_dir: str, augmentation_per_image: int = 5) -> dict:
+def augment_existing_dataset(data_dir: str, augmentation_per_image: int = 5, progress=None) -> dict:
     """
     Augment toàn bộ dataset hiện có
 
     Args:
         data_dir: Thư mục chứa data/students
         augmentation_per_image: Số ảnh augmented từ mỗi ảnh gốc
+        progress: Hàm nhận (số sinh viên đã xử lý, tổng số); trả về False để dừng
 
     Returns:
         Dict với thống kê
@@ -285,7 +283,8 @@ def augment_existing_dataset(data_dir: str, augmentation_per_image: int = 5) ->
         'students_processed': 0,
         'original_images': 0,
         'augmented_images': 0,
-        'errors': []
+        'errors': [],
+        'cancelled': False
     }
 
     # Duyệt qua tất cả student folders
@@ -293,11 +292,14 @@ def augment_existing_dataset(data_dir: str, augmentation_per_image: int = 5) ->
         print(f"Error: {data_dir} does not exist")
         return stats
 
-    for student_id in os.listdir(data_dir):
+    student_ids = [name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name))]
+    for index, student_id in enumerate(student_ids):
         student_dir = os.path.join(data_dir, student_id)
 
-        if not os.path.isdir(student_dir):
-            continue
+        # Dừng nếu người dùng hủy
+        if progress and progress(index, len(student_ids)) is False:
+            stats['cancelled'] = True
+            break
 
         try:
             # Đếm ảnh gốc
@@ -322,6 +324,9 @@ def augment_existing_dataset(data_dir: str, augmentation_per_image: int = 5) ->
             stats['errors'].append(error_msg)
             print(f"✗ {error_msg}")
 
+    if progress and not stats['cancelled']:
+        progress(len(student_ids), len(student_ids))
+
     return stats
 
 
@@ -0,0 +1,231 @@
+"""
+Detection-result cache keyed by image content hash
+Bộ nhớ đệm kết quả phát hiện khuôn mặt, khóa theo hash nội dung ảnh
+- Một ảnh chụp thường đi qua nhiều bước: ImageValidator (Haar), nhận diện (detector), xác minh (detector)
+- Mỗi bước lấy lại khung khuôn mặt và ảnh khuôn mặt đã căn chỉnh thay vì chạy lại detector
+- Khóa là SHA-1 nội dung file (không phải đường dẫn): ảnh chụp mới ghi đè cùng tên vẫn được phát hiện lại
+- Tầng bộ nhớ: LRU tối đa DETECTION_CACHE_SIZE ảnh
+- Tầng đĩa (tùy chọn, DETECTION_CACHE_PATH): file .npz cho mỗi (ảnh, detector), dùng lại giữa các lần chạy
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from src.config.config import config
+from src.utils.lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+
+# Một khuôn mặt: {'face': ảnh RGB đã căn chỉnh (hoặc None nếu chỉ có khung), 'facial_area': {...}, 'confidence': float}
+DetectedFace = Dict[str, Any]
+
+# Ảnh đầu vào: đường dẫn file, mảng BGR đã đọc (khung hình webcam) hoặc ảnh đã mã hóa (JPEG/PNG bytes)
+ImageSource = Union[str, np.ndarray, bytes]
+
+
+def image_key(image: ImageSource) -> Optional[str]:
+    """
+    Content hash of an image file or array
+    Hash nội dung của ảnh (None nếu không đọc được file)
+    """
+    digest = hashlib.sha1()
+    if isinstance(image, (bytes, bytearray)):
+        # Cùng hash với file có cùng nội dung
+        digest.update(image)
+        return digest.hexdigest()
+    if isinstance(image, np.ndarray):
+        digest.update(str(image.shape).encode())
+        digest.update(np.ascontiguousarray(image).tobytes())
+        return digest.hexdigest()
+
+    try:
+        with open(image, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def decode_image(image: ImageSource) -> Union[str, np.ndarray]:
+    """
+    Decode encoded image bytes into a BGR array
+    Giải mã ảnh dạng bytes thành mảng BGR (đường dẫn và mảng được giữ nguyên)
+    """
+    if isinstance(image, (bytes, bytearray)):
+        decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if decoded is None:
+            raise ValueError("Cannot decode image bytes")
+        return decoded
+    return image
+
+
+class DetectionCache:
+    """
+    Process-wide cache of detected faces (Singleton)
+    Bộ nhớ đệm dùng chung cho kết quả phát hiện khuôn mặt
+    - Khóa theo (hash nội dung ảnh, detector): các model dùng chung detector dùng chung kết quả
+    - Khuôn mặt đã căn chỉnh được lưu dạng float32 để giảm một nửa bộ nhớ
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DetectionCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # OrderedDict: phần tử đầu là ảnh ít được dùng gần đây nhất
+        self._entries: "OrderedDict[tuple[str, str], List[DetectedFace]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = config.DETECTION_CACHE_SIZE
+        self.disk_path = config.DETECTION_CACHE_PATH
+        self.hits = 0
+        self.misses = 0
+        self._initialized = True
+
+    def detect(
+        self,
+        image: ImageSource,
+        detector: str,
+        detect_fn: Callable[[ImageSource], List[DetectedFace]]
+    ) -> List[DetectedFace]:
+        """
+        Return cached faces for an image, running the detector only on a miss
+        Lấy kết quả phát hiện từ cache, chỉ chạy detector khi chưa có
+
+        Args:
+            image: Đường dẫn ảnh, mảng BGR hoặc ảnh đã mã hóa (bytes)
+            detector: Tên detector (ví dụ 'opencv', 'retinaface', 'haar')
+            detect_fn: Hàm phát hiện khuôn mặt, chỉ được gọi khi cache trượt
+
+        Returns:
+            Danh sách khuôn mặt (dùng chung giữa các lần gọi, không được sửa tại chỗ)
+        """
+        key = image_key(image)
+        if key is None:
+            return detect_fn(image)
+
+        faces = self.get(key, detector)
+        if faces is not None:
+            return faces
+
+        return self.put(key, detector, detect_fn(image))
+
+    def get(self, key: str, detector: str) -> Optional[List[DetectedFace]]:
+        """Tra cứu tầng bộ nhớ rồi tầng đĩa; None nếu chưa có"""
+        with self._lock:
+            faces = self._entries.get((key, detector))
+            if faces is not None:
+                self._entries.move_to_end((key, detector))
+                self.hits += 1
+                return faces
+
+        faces = self._read_disk(key, detector)
+        with self._lock:
+            if faces is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, detector, faces)
+        return faces
+
+    def put(self, key: str, detector: str, faces: List[DetectedFace]) -> List[DetectedFace]:
+        """Lưu kết quả phát hiện vào cả hai tầng, trả về bản đã lưu"""
+        faces = [
+            {
+                'face': np.asarray(face['face'], dtype=np.float32) if face.get('face') is not None else None,
+                'facial_area': dict(face.get('facial_area', {})),
+                'confidence': float(face.get('confidence', 0) or 0)
+            }
+            for face in faces
+        ]
+        with self._lock:
+            self._remember(key, detector, faces)
+        self._write_disk(key, detector, faces)
+        return faces
+
+    def clear(self) -> None:
+        """Xóa tầng bộ nhớ (tầng đĩa giữ nguyên)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Số lần trúng/trượt và số ảnh đang được giữ trong bộ nhớ"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _remember(self, key: str, detector: str, faces: List[DetectedFace]) -> None:
+        """Thêm vào LRU và loại các ảnh ít dùng nhất khi vượt DETECTION_CACHE_SIZE (gọi khi đang giữ lock)"""
+        self._entries[(key, detector)] = faces
+        self._entries.move_to_end((key, detector))
+        while len(self._entries) > max(self.max_entries, 1):
+            self._entries.popitem(last=False)
+
+    def _disk_file(self, key: str, detector: str) -> str:
+        return os.path.join(self.disk_path, f"{key}_{detector}.npz")
+
+    def _read_disk(self, key: str, detector: str) -> Optional[List[DetectedFace]]:
+        """Đọc kết quả từ tầng đĩa (None nếu tắt, chưa có hoặc file hỏng)"""
+        if not self.disk_path:
+            return None
+        cache_file = self._disk_file(key, detector)
+        if not os.path.exists(cache_file):
+            return None
+        try:
+            with np.load(cache_file) as data:
+                meta = json.loads(str(data['meta']))
+                return [
+                    {
+                        'face': data[f'face_{i}'] if f'face_{i}' in data.files else None,
+                        'facial_area': item['facial_area'],
+                        'confidence': item['confidence']
+                    }
+                    for i, item in enumerate(meta)
+                ]
+        except Exception as e:
+            print(f"⚠ Detection cache entry unreadable, detecting again: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, detector: str, faces: List[DetectedFace]) -> None:
+        """Ghi kết quả ra tầng đĩa (ghi tạm rồi thay thế để không hỏng file)"""
+        if not self.disk_path:
+            return
+        try:
+            os.makedirs(self.disk_path, exist_ok=True)
+            meta = [
+                {
+                    'facial_area': {k: _to_builtin(v) for k, v in face['facial_area'].items()},
+                    'confidence': face['confidence']
+                }
+                for face in faces
+            ]
+            arrays = {f'face_{i}': face['face'] for i, face in enumerate(faces) if face['face'] is not None}
+            cache_file = self._disk_file(key, detector)
+            tmp_file = cache_file + '.tmp.npz'
+            np.savez(tmp_file, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            print(f"⚠ Could not write detection cache: {str(e)}")
+
+
+def _to_builtin(value: Any) -> Any:
+    """Đổi số NumPy (và tuple tọa độ mắt) sang kiểu Python để ghi JSON"""
+    if isinstance(value, (tuple, list)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# Global detection cache instance
+detection_cache = DetectionCache()
@@ -0,0 +1,255 @@
+"""
+Shared face detectors (Haar cascade, OpenCV DNN)
+Bộ phát hiện khuôn mặt dùng chung cho toàn tiến trình
+- Detector được nạp một lần cho mỗi luồng (cv2.CascadeClassifier / cv2.dnn.Net không an toàn
+  khi nhiều luồng gọi cùng lúc), không còn tạo lại và kiểm tra file ở mỗi khung hình
+- Haar: luôn có (file XML đi kèm OpenCV)
+- DNN (SSD ResNet-10 của OpenCV): chính xác hơn với mặt nghiêng/thiếu sáng, cần file model trong data/models;
+  thiếu file thì tự dùng Haar
+- FrameDetector: phát hiện trên khung hình thu nhỏ và chỉ tìm quanh vị trí khuôn mặt ở khung hình trước (ROI)
+"""
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.config.config import config
+from src.utils.lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+
+# Khung khuôn mặt (x, y, w, h)
+FaceBox = Tuple[int, int, int, int]
+
+
+class HaarDetector:
+    """Haar cascade detector (nhanh, chỉ phát hiện tốt mặt nhìn thẳng)"""
+    name = 'haar'
+
+    def __init__(self):
+        self.classifier = cv2.CascadeClassifier(config.get_haar_cascade_path())
+        if self.classifier.empty():
+            raise RuntimeError("Cannot load Haar cascade")
+
+    def detect(
+        self,
+        image: np.ndarray,
+        scale_factor: float = 1.1,
+        min_neighbors: int = 5,
+        min_size: int = 30
+    ) -> List[FaceBox]:
+        """Phát hiện khuôn mặt trên ảnh BGR hoặc ảnh xám"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        faces = self.classifier.detectMultiScale(
+            gray,
+            scaleFactor=scale_factor,
+            minNeighbors=min_neighbors,
+            minSize=(min_size, min_size)
+        )
+        return [(int(x), int(y), int(w), int(h)) for (x, y, w, h) in faces]
+
+
+class DnnDetector:
+    """OpenCV DNN face detector (SSD ResNet-10, đầu vào 300x300)"""
+    name = 'dnn'
+
+    def __init__(self):
+        self.net = cv2.dnn.readNetFromCaffe(config.DNN_FACE_PROTO_PATH, config.DNN_FACE_MODEL_PATH)
+
+    def detect(
+        self,
+        image: np.ndarray,
+        scale_factor: float = 1.1,
+        min_neighbors: int = 5,
+        min_size: int = 30
+    ) -> List[FaceBox]:
+        """Phát hiện khuôn mặt trên ảnh BGR (scale_factor/min_neighbors chỉ dùng cho Haar, được bỏ qua)"""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()
+
+        faces = []
+        for i in range(detections.shape[2]):
+            if detections[0, 0, i, 2] < config.DNN_FACE_CONFIDENCE:
+                continue
+            x1, y1, x2, y2 = (detections[0, 0, i, 3:7] * np.array([width, height, width, height])).astype(int)
+            x1, y1 = max(x1, 0), max(y1, 0)
+            w, h = min(x2, width) - x1, min(y2, height) - y1
+            if w >= min_size and h >= min_size:
+                faces.append((int(x1), int(y1), int(w), int(h)))
+        return faces
+
+
+class DetectorRegistry:
+    """
+    Process-wide registry of face detectors (Singleton)
+    Quản lý các detector dùng chung: mỗi luồng có bản riêng, nạp một lần rồi dùng lại
+    """
+    _instance = None
+    _detector_classes = {'haar': HaarDetector, 'dnn': DnnDetector}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DetectorRegistry, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # Mỗi luồng giữ các detector của riêng nó: {tên detector: detector}
+        self._local = threading.local()
+        self._unavailable: Dict[str, str] = {}  # Detector không nạp được -> lý do (chỉ báo lỗi một lần)
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def available(self, name: str) -> bool:
+        """Detector có dùng được không (DNN cần file model trong data/models)"""
+        if name == 'dnn':
+            return os.path.exists(config.DNN_FACE_PROTO_PATH) and os.path.exists(config.DNN_FACE_MODEL_PATH)
+        return name in self._detector_classes
+
+    def get(self, name: str = None):
+        """
+        Detector of the calling thread, loaded on first use
+        Lấy detector của luồng hiện tại (nạp ở lần dùng đầu tiên)
+
+        Args:
+            name: 'haar' hoặc 'dnn' (mặc định: FACE_DETECTOR); DNN không dùng được thì trả về Haar
+        """
+        name = name or config.FACE_DETECTOR
+        if name not in self._detector_classes:
+            raise ValueError(f"Unknown face detector: {name}")
+        if name != 'haar' and (name in self._unavailable or not self.available(name)):
+            self._mark_unavailable(name, "model files not found")
+            name = 'haar'
+
+        detectors = getattr(self._local, 'detectors', None)
+        if detectors is None:
+            detectors = self._local.detectors = {}
+        detector = detectors.get(name)
+        if detector is None:
+            try:
+                detector = self._detector_classes[name]()
+            except Exception as e:
+                if name == 'haar':
+                    raise
+                self._mark_unavailable(name, str(e))
+                return self.get('haar')
+            detectors[name] = detector
+        return detector
+
+    def preload(self, names: List[str] = None) -> None:
+        """Nạp trước detector cho luồng hiện tại (tránh trễ ở khung hình đầu tiên)"""
+        for name in names or [config.FACE_DETECTOR]:
+            self.get(name)
+
+    def detect(
+        self,
+        image: np.ndarray,
+        name: str = None,
+        max_width: int = None,
+        scale_factor: float = 1.1,
+        min_neighbors: int = 5,
+        min_size: int = 30
+    ) -> List[FaceBox]:
+        """
+        Detect faces, optionally on a downscaled copy
+        Phát hiện khuôn mặt (có thể trên ảnh thu nhỏ), tọa độ trả về theo ảnh gốc
+
+        Args:
+            image: Ảnh BGR
+            name: Detector ('haar', 'dnn'; mặc định: FACE_DETECTOR)
+            max_width: Thu nhỏ ảnh về chiều rộng này trước khi phát hiện (None = giữ nguyên)
+            min_size: Kích thước khuôn mặt tối thiểu (pixel trên ảnh gốc)
+        """
+        detector = self.get(name)
+        scale = min(1.0, max_width / image.shape[1]) if max_width else 1.0
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = detector.detect(
+            image,
+            scale_factor=scale_factor,
+            min_neighbors=min_neighbors,
+            min_size=max(1, int(min_size * scale))
+        )
+        if scale < 1.0:
+            faces = [tuple(int(round(v / scale)) for v in face) for face in faces]
+        return faces
+
+    def _mark_unavailable(self, name: str, reason: str) -> None:
+        """Ghi nhận detector không dùng được (chỉ in cảnh báo lần đầu)"""
+        with self._lock:
+            if name in self._unavailable:
+                return
+            self._unavailable[name] = reason
+        print(f"⚠ Face detector '{name}' unavailable ({reason}), using Haar cascade")
+
+
+class FrameDetector:
+    """
+    Per-stream face detection with downscaling and ROI reuse
+    Phát hiện khuôn mặt cho một luồng video (webcam)
+    - Khung hình được thu nhỏ về DETECT_PREVIEW_WIDTH trước khi phát hiện
+    - Khi khung hình trước có khuôn mặt, chỉ tìm trong vùng quanh đó (ROI) thay vì cả khung hình
+    - Tìm lại toàn khung hình khi ROI không còn khuôn mặt hoặc sau mỗi DETECT_FULL_FRAME_INTERVAL khung hình
+      (để thấy người mới bước vào)
+    """
+
+    def __init__(self, name: str = None, max_width: int = None, scale_factor: float = 1.3, min_size: int = 30):
+        self.name = name
+        self.max_width = config.DETECT_PREVIEW_WIDTH if max_width is None else max_width
+        self.scale_factor = scale_factor
+        self.min_size = min_size
+        self.previous: List[FaceBox] = []
+        self.frames = 0
+        self.roi_hits = 0  # Số khung hình chỉ cần tìm trong ROI
+
+    def detect(self, frame: np.ndarray) -> List[FaceBox]:
+        """Phát hiện khuôn mặt trên một khung hình BGR, tọa độ theo khung hình gốc"""
+        self.frames += 1
+        full_frame = not self.previous or self.frames % config.DETECT_FULL_FRAME_INTERVAL == 0
+
+        if not full_frame:
+            # ROI được thu nhỏ cùng tỉ lệ với cả khung hình
+            x, y, w, h = self._roi(frame.shape)
+            roi_width = max(1, int(w * self.max_width / frame.shape[1])) if self.max_width else None
+            faces = detector_registry.detect(
+                frame[y:y + h, x:x + w], self.name, roi_width,
+                scale_factor=self.scale_factor, min_size=self.min_size
+            )
+            if faces:
+                self.roi_hits += 1
+                self.previous = [(fx + x, fy + y, fw, fh) for (fx, fy, fw, fh) in faces]
+                return self.previous
+
+        self.previous = detector_registry.detect(
+            frame, self.name, self.max_width, scale_factor=self.scale_factor, min_size=self.min_size
+        )
+        return self.previous
+
+    def reset(self) -> None:
+        """Quên vị trí khuôn mặt trước (ví dụ khi đổi camera)"""
+        self.previous = []
+
+    def _roi(self, shape: Tuple[int, ...]) -> FaceBox:
+        """Vùng bao các khuôn mặt của khung hình trước, nới rộng DETECT_ROI_MARGIN mỗi phía"""
+        height, width = shape[:2]
+        x1 = min(x for x, _, _, _ in self.previous)
+        y1 = min(y for _, y, _, _ in self.previous)
+        x2 = max(x + w for x, _, w, _ in self.previous)
+        y2 = max(y + h for _, y, _, h in self.previous)
+        margin_x = int((x2 - x1) * config.DETECT_ROI_MARGIN)
+        margin_y = int((y2 - y1) * config.DETECT_ROI_MARGIN)
+        x1, y1 = max(x1 - margin_x, 0), max(y1 - margin_y, 0)
+        x2, y2 = min(x2 + margin_x, width), min(y2 + margin_y, height)
+        return x1, y1, x2 - x1, y2 - y1
+
+
+# Global detector registry instance
+detector_registry = DetectorRegistry()
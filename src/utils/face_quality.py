@@ -0,0 +1,89 @@
+"""
+Face sample quality checks at enrollment time
+Đánh giá chất lượng ảnh mẫu khi đăng ký sinh viên
+- Dựa trên khuôn mặt đã phát hiện và căn chỉnh (DetectStage), không chạy lại detector
+- Kiểm tra: số khuôn mặt, kích thước khuôn mặt, độ nét (phương sai Laplacian), độ sáng
+- Chỉ báo cáo, không loại ảnh: ảnh kém chất lượng vẫn được lưu và embed như trước
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config.config import config
+from src.utils.lazy_import import lazy_module
+
+cv2 = lazy_module('cv2')
+
+
+@dataclass
+class FaceQuality:
+    """Báo cáo chất lượng của một ảnh mẫu"""
+    path: str
+    faces: int = 0  # Số khuôn mặt phát hiện được
+    face_size: int = 0  # Cạnh nhỏ nhất của khuôn mặt chính (pixel)
+    sharpness: float = 0.0  # Phương sai Laplacian (càng lớn càng nét)
+    brightness: float = 0.0  # Độ sáng trung bình (0-255)
+    embedded: bool = False  # Đã có embedding trong gallery
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'faces': self.faces,
+            'face_size': self.face_size,
+            'sharpness': round(self.sharpness, 1),
+            'brightness': round(self.brightness, 1),
+            'embedded': self.embedded,
+            'issues': list(self.issues)
+        }
+
+
+def assess_face_quality(path: str, faces: List[Dict[str, Any]]) -> FaceQuality:
+    """
+    Assess one enrollment image from its detected faces
+    Đánh giá một ảnh mẫu từ các khuôn mặt đã phát hiện (kết quả của DetectStage.detect_all)
+
+    Khuôn mặt chính là khuôn mặt lớn nhất (giống khuôn mặt được embed vào gallery).
+    """
+    quality = FaceQuality(path=path, faces=len(faces))
+    if not faces:
+        quality.issues.append('no face detected')
+        return quality
+    if len(faces) > 1:
+        quality.issues.append(f'{len(faces)} faces in image')
+
+    main = max(faces, key=lambda f: f['facial_area']['w'] * f['facial_area']['h'])
+    area = main['facial_area']
+    quality.face_size = int(min(area['w'], area['h']))
+
+    # Khuôn mặt căn chỉnh của DeepFace là RGB, giá trị 0-1
+    gray = _to_gray(main['face'])
+    if gray is not None:
+        quality.sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        quality.brightness = float(gray.mean())
+
+    if quality.face_size < config.ENROLL_MIN_FACE_SIZE:
+        quality.issues.append(f'face too small ({quality.face_size}px)')
+    if gray is not None:
+        if quality.sharpness < config.ENROLL_MIN_SHARPNESS:
+            quality.issues.append(f'blurry (sharpness {quality.sharpness:.0f})')
+        min_brightness, max_brightness = config.ENROLL_BRIGHTNESS_RANGE
+        if quality.brightness < min_brightness:
+            quality.issues.append(f'too dark (brightness {quality.brightness:.0f})')
+        elif quality.brightness > max_brightness:
+            quality.issues.append(f'too bright (brightness {quality.brightness:.0f})')
+    return quality
+
+
+def _to_gray(face: np.ndarray) -> Optional[np.ndarray]:
+    """Ảnh xám uint8 của khuôn mặt (None nếu crop rỗng)"""
+    if face is None or face.size == 0:
+        return None
+    if face.dtype != np.uint8:
+        face = np.clip(face * 255.0 if face.max() <= 1.0 else face, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(face, cv2.COLOR_RGB2GRAY) if face.ndim == 3 else face
@@ -0,0 +1,192 @@
+"""
+Lightweight face tracker for video streams
+Theo dõi khuôn mặt giữa các khung hình (IoU, dự phòng bằng khoảng cách tâm)
+- Mỗi khuôn mặt phát hiện được gán một track ID ổn định khi người đó còn trong khung hình
+- Nhận diện (embedding) chỉ chạy cho track chưa có danh tính đủ tin cậy,
+  các khung hình sau chỉ cập nhật khung khuôn mặt
+"""
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.config.config import config
+
+# Khung khuôn mặt: {'x', 'y', 'w', 'h'}
+Box = Dict[str, int]
+
+
+@dataclass
+class Track:
+    """Một khuôn mặt được theo dõi qua nhiều khung hình"""
+    track_id: int
+    box: Box
+    first_seen: float
+    last_seen: float
+    hits: int = 1  # Số khung hình có khuôn mặt này
+    student_id: Optional[str] = None  # Danh tính đã xác nhận (None = chưa nhận diện được)
+    student_name: Optional[str] = None
+    confidence: float = 0.0
+    attempts: int = 0  # Số lần đã gửi đi nhận diện
+    pending: bool = False  # Đang chờ kết quả nhận diện
+    last_attempt: float = 0.0
+    result: Any = field(default=None, repr=False)  # FaceRecognitionResult tốt nhất
+
+    @property
+    def resolved(self) -> bool:
+        """Đã có danh tính với độ tin cậy đủ (TRACK_MIN_CONFIDENCE)"""
+        return self.student_id is not None and self.confidence >= config.TRACK_MIN_CONFIDENCE
+
+    @property
+    def label(self) -> str:
+        """Nhãn hiển thị trên khung hình xem trước"""
+        if self.student_id:
+            return f"#{self.track_id} {self.student_id} {self.confidence:.0%}"
+        return f"#{self.track_id} ?"
+
+
+def iou(a: Box, b: Box) -> float:
+    """Tỉ lệ giao trên hợp của hai khung"""
+    x1, y1 = max(a['x'], b['x']), max(a['y'], b['y'])
+    x2 = min(a['x'] + a['w'], b['x'] + b['w'])
+    y2 = min(a['y'] + a['h'], b['y'] + b['h'])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a['w'] * a['h'] + b['w'] * b['h'] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centroid_distance(a: Box, b: Box) -> float:
+    """Khoảng cách giữa tâm hai khung, chia cho kích thước khung a"""
+    dx = (a['x'] + a['w'] / 2) - (b['x'] + b['w'] / 2)
+    dy = (a['y'] + a['h'] / 2) - (b['y'] + b['h'] / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max(a['w'], a['h'], 1)
+
+
+class FaceTracker:
+    """
+    IoU/centroid tracker that decides which faces still need recognition
+    Bộ theo dõi khuôn mặt: quyết định khuôn mặt nào cần chạy nhận diện
+
+    An toàn đa luồng: update() được gọi từ luồng phát hiện, resolve() từ các luồng nhận diện.
+    """
+
+    def __init__(self):
+        self._tracks: Dict[int, Track] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.created = 0  # Tổng số track đã tạo
+        self.recognitions = 0  # Số khuôn mặt đã gửi đi nhận diện
+        self.reused = 0  # Số khuôn mặt chỉ cập nhật khung (không nhận diện)
+
+    def update(self, boxes: List[Box], now: float = None) -> List[Track]:
+        """
+        Match detected boxes to tracks and create tracks for new faces
+        Ghép các khuôn mặt vừa phát hiện với track hiện có, tạo track mới cho khuôn mặt mới
+
+        Args:
+            boxes: Các khung khuôn mặt của khung hình hiện tại
+            now: Thời điểm khung hình (mặc định: bây giờ)
+
+        Returns:
+            Track tương ứng với từng khung, theo thứ tự đầu vào
+        """
+        now = now or time.time()
+        with self._lock:
+            # Bỏ các track đã rời khỏi khung hình quá TRACK_MAX_MISSED_SECONDS
+            for track_id in [tid for tid, t in self._tracks.items() if now - t.last_seen > config.TRACK_MAX_MISSED_SECONDS]:
+                del self._tracks[track_id]
+
+            # Ghép tham lam theo IoU giảm dần; khuôn mặt di chuyển nhanh được ghép theo khoảng cách tâm
+            pairs = []
+            for box_idx, box in enumerate(boxes):
+                for track in self._tracks.values():
+                    overlap = iou(track.box, box)
+                    if overlap >= config.TRACK_IOU_THRESHOLD:
+                        pairs.append((overlap, box_idx, track))
+                    elif centroid_distance(track.box, box) <= config.TRACK_MAX_CENTROID_SHIFT:
+                        pairs.append((0.0, box_idx, track))
+            pairs.sort(key=lambda item: item[0], reverse=True)
+
+            assigned: Dict[int, Track] = {}
+            used = set()
+            for _, box_idx, track in pairs:
+                if box_idx in assigned or track.track_id in used:
+                    continue
+                assigned[box_idx] = track
+                used.add(track.track_id)
+
+            tracks = []
+            for box_idx, box in enumerate(boxes):
+                track = assigned.get(box_idx)
+                if track is None:
+                    track = Track(track_id=next(self._ids), box=box, first_seen=now, last_seen=now)
+                    self._tracks[track.track_id] = track
+                    self.created += 1
+                else:
+                    track.box = box
+                    track.last_seen = now
+                    track.hits += 1
+                tracks.append(track)
+            return tracks
+
+    def needs_recognition(self, track: Track, now: float = None) -> bool:
+        """
+        Whether a face crop of this track should be embedded now
+        Track có cần nhận diện ở khung hình này không (và đánh dấu đang chờ nếu có)
+
+        - Đã có danh tính đủ tin cậy, hoặc đang chờ kết quả: không
+        - Chưa nhận diện được: thử lại sau TRACK_RETRY_INTERVAL giây, tối đa TRACK_MAX_ATTEMPTS lần
+        """
+        now = now or time.time()
+        with self._lock:
+            if track.resolved or track.pending or track.attempts >= config.TRACK_MAX_ATTEMPTS:
+                self.reused += 1
+                return False
+            if track.attempts and now - track.last_attempt < config.TRACK_RETRY_INTERVAL:
+                self.reused += 1
+                return False
+            track.pending = True
+            track.attempts += 1
+            track.last_attempt = now
+            self.recognitions += 1
+            return True
+
+    def resolve(self, track_id: int, result: Any = None) -> Optional[Track]:
+        """
+        Record a recognition result for a track
+        Ghi kết quả nhận diện cho track (giữ kết quả tin cậy nhất)
+
+        Args:
+            track_id: ID của track
+            result: FaceRecognitionResult (None nếu nhận diện lỗi)
+
+        Returns:
+            Track (None nếu track đã hết hạn)
+        """
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None:
+                return None
+            track.pending = False
+            if result is not None and result.success and result.confidence > track.confidence:
+                track.student_id = result.student_id
+                track.student_name = result.student_name
+                track.confidence = result.confidence
+                track.result = result
+            return track
+
+    def active_tracks(self) -> List[Track]:
+        """Các track đang còn trong khung hình"""
+        with self._lock:
+            return list(self._tracks.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Số track đang hoạt động/đã tạo, số lần nhận diện và số lần chỉ cập nhật khung"""
+        with self._lock:
+            return {
+                'active': len(self._tracks),
+                'created': self.created,
+                'recognitions': self.recognitions,
+                'reused': self.reused
+            }
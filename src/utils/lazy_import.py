@@ -0,0 +1,49 @@
+"""
+Lazy imports for heavy dependencies
+Import trễ các thư viện nặng (deepface/tensorflow, cv2, pandas)
+- Module chỉ thật sự được import ở lần truy cập thuộc tính đầu tiên
+- Menu, danh sách sinh viên, báo cáo... không phải chờ TensorFlow khởi động
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """
+    Module proxy that imports the real module on first attribute access
+    Đại diện cho một module, chỉ import module thật khi được dùng lần đầu
+
+    Ví dụ: cv2 = lazy_module('cv2') rồi dùng cv2.imread(...) như bình thường.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        """Import module thật (chỉ một lần, an toàn giữa các luồng)"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        """Module đã được import hay chưa"""
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    """Tạo proxy import trễ cho một module (ví dụ 'cv2', 'deepface.DeepFace')"""
+    return LazyModule(name)
@@ -1,12 +1,18 @@
 """
 Utility functions for camera and image processing
 """
-import cv2
 import os
-from typing import Optional, Tuple, List
+from typing import Callable, Optional, Tuple, List
 import numpy as np
 import time
 
+from src.utils.detection_cache import detection_cache
+from src.utils.face_detector import FrameDetector, detector_registry
+from src.utils.lazy_import import lazy_module
+
+# OpenCV chỉ được import khi mở camera hoặc đọc ảnh lần đầu
+cv2 = lazy_module('cv2')
+
 
 class CameraUtility:
     """Utility class for camera operations"""
@@ -23,6 +29,27 @@ class CameraUtility:
         Returns:
             Path to saved image or None if cancelled
         """
+        captured_image = CameraUtility.capture_frame_from_webcam(window_name)
+
+        if captured_image is not None and save_path:
+            return CameraUtility.save_frame(captured_image, save_path)
+
+        return None
+
+    @staticmethod
+    def capture_frame_from_webcam(window_name: str = "Capture Face") -> Optional[np.ndarray]:
+        """
+        Capture a single frame from webcam and keep it in memory
+
+        Recognition accepts the BGR array directly, so a check-in does not need
+        to encode the frame to JPEG, write it to disk and decode it again.
+
+        Args:
+            window_name: Name of the capture window
+
+        Returns:
+            Captured BGR frame or None if cancelled
+        """
         cap = cv2.VideoCapture(0)
 
         if not cap.isOpened():
@@ -45,12 +72,13 @@ class CameraUtility:
                 print("Error: Cannot read frame")
                 break
 
-            # Display instructions on frame
-            cv2.putText(frame, "Press SPACE to capture, ESC to cancel",
+            # Display instructions on a copy (the captured frame stays clean for recognition)
+            display_frame = frame.copy()
+            cv2.putText(display_frame, "Press SPACE to capture, ESC to cancel",
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
             # Show frame
-            cv2.imshow(window_name, frame)
+            cv2.imshow(window_name, display_frame)
 
             key = cv2.waitKey(1) & 0xFF
 
@@ -68,14 +96,67 @@ class CameraUtility:
         cap.release()
         cv2.destroyAllWindows()
 
-        if captured_image is not None and save_path:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            cv2.imwrite(save_path, captured_image)
-            print(f"✓ Image saved to: {save_path}")
-            return save_path
+        return captured_image
 
-        return None
+    @staticmethod
+    def save_frame(image, save_path: str) -> Optional[str]:
+        """
+        Save a BGR frame or encoded image bytes to disk
+
+        Args:
+            image: BGR array or encoded image bytes (JPEG/PNG)
+            save_path: Destination path
+
+        Returns:
+            save_path, or None if the image could not be written
+        """
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        if isinstance(image, (bytes, bytearray)):
+            with open(save_path, 'wb') as f:
+                f.write(image)
+        elif not cv2.imwrite(save_path, image):
+            print(f"Error: Cannot write image to {save_path}")
+            return None
+        print(f"✓ Image saved to: {save_path}")
+        return save_path
+
+    @staticmethod
+    def show_live_preview(
+        get_frame: Callable[[], Optional[np.ndarray]],
+        get_faces: Callable[[], List[dict]] = None,
+        get_status: Callable[[], List[str]] = None,
+        window_name: str = "Kiosk Mode"
+    ):
+        """
+        Show frames produced elsewhere (e.g. the kiosk capture thread) until ESC is pressed
+
+        Args:
+            get_frame: Returns the latest BGR frame (or None if not available yet)
+            get_faces: Returns face boxes {'x', 'y', 'w', 'h'} to draw (optional 'label' is drawn above the box)
+            get_status: Returns status lines drawn on the frame
+            window_name: Name of the preview window
+        """
+        print("Press ESC to stop")
+        while True:
+            frame = get_frame()
+            if frame is not None:
+                display_frame = frame.copy()
+                for area in (get_faces() if get_faces else []):
+                    cv2.rectangle(display_frame, (area['x'], area['y']),
+                                  (area['x'] + area['w'], area['y'] + area['h']), (0, 255, 0), 2)
+                    if area.get('label'):
+                        cv2.putText(display_frame, area['label'], (area['x'], max(area['y'] - 8, 12)),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 255, 0), 2)
+                for i, line in enumerate(get_status() if get_status else []):
+                    cv2.putText(display_frame, line, (10, 25 + 22 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 255, 0), 2)
+                cv2.imshow(window_name, display_frame)
+
+            # ESC key - stop
+            if cv2.waitKey(30) & 0xFF == 27:
+                break
+
+        cv2.destroyAllWindows()
 
     @staticmethod
     def capture_multiple_from_webcam(
@@ -113,6 +194,8 @@ class CameraUtility:
         print("="*60)
 
         os.makedirs(save_dir, exist_ok=True)
+        # Detector dùng chung (nạp một lần), chạy trên khung hình thu nhỏ và chỉ tìm quanh khuôn mặt trước đó
+        frame_detector = FrameDetector()
         captured_images = []
         capturing = False
         capture_count = 0
@@ -140,14 +223,7 @@ class CameraUtility:
                            (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
 
             # Draw face detection box
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            # Use local cascade file to avoid Unicode path issues
-            cascade_path = os.path.join('data', 'models', 'haarcascade_frontalface_default.xml')
-            if not os.path.exists(cascade_path):
-                # Fallback to OpenCV default path
-                cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            face_cascade = cv2.CascadeClassifier(cascade_path)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            faces = frame_detector.detect(frame)
 
             for (x, y, w, h) in faces:
                 cv2.rectangle(display_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
@@ -203,30 +279,52 @@ class CameraUtility:
         Returns:
             Number of faces detected
         """
-        try:
-            # Load cascade classifier - use local path to avoid Unicode issues
-            cascade_path = os.path.join('data', 'models', 'haarcascade_frontalface_default.xml')
-            if not os.path.exists(cascade_path):
-                # Fallback to OpenCV default path
-                cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            face_cascade = cv2.CascadeClassifier(cascade_path)
-
-            # Read image
-            image = cv2.imread(image_path)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return len(CameraUtility.detect_face_boxes(image_path))
 
-            # Detect faces
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
+    @staticmethod
+    def detect_face_boxes(image_path: str) -> List[Tuple[int, int, int, int]]:
+        """
+        Detect face boxes (x, y, w, h) with the Haar cascade
 
-            return len(faces)
+        Results are cached by image content, so validating the same capture
+        again (or after a retry) does not rerun the cascade.
+
+        Args:
+            image_path: Path to the image
+
+        Returns:
+            List of face boxes (empty if detection failed; failures are not cached)
+        """
+        try:
+            faces = detection_cache.detect(image_path, 'haar', CameraUtility._run_haar_cascade)
         except Exception as e:
             print(f"Error detecting faces: {str(e)}")
-            return 0
+            return []
+        return [
+            (face['facial_area']['x'], face['facial_area']['y'], face['facial_area']['w'], face['facial_area']['h'])
+            for face in faces
+        ]
+
+    @staticmethod
+    def _run_haar_cascade(image_path: str) -> List[dict]:
+        """
+        Run the Haar cascade on an image (called on detection cache misses only)
+
+        Errors propagate so that a failed run is never cached as "no face".
+        """
+        # Read image
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+
+        # Detect faces with the shared (per-thread, preloaded) Haar cascade
+        faces = detector_registry.detect(image, 'haar', scale_factor=1.1, min_neighbors=5, min_size=30)
+
+        # Only boxes are cached for Haar (no aligned crop)
+        return [
+            {'face': None, 'facial_area': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)}, 'confidence': 1.0}
+            for (x, y, w, h) in faces
+        ]
 
     @staticmethod
     def show_image(image_path: str, window_name: str = "Image", wait_key: bool = True):
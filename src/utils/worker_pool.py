@@ -0,0 +1,202 @@
+"""
+Worker pool for long-running GUI operations
+Nhóm luồng nền cho các thao tác lâu (nhận diện, tăng cường dữ liệu, liệt kê)
+- Công việc chạy trên ThreadPoolExecutor nên luồng giao diện không bị treo
+- Kết quả và tiến độ được đưa vào hàng đợi, callback chỉ chạy trên luồng gọi pump()
+  (Tkinter: pump() được lên lịch bằng root.after vì widget không an toàn đa luồng)
+- Hủy: công việc đang chờ bị bỏ ngay, công việc đang chạy dừng ở lần báo tiến độ kế tiếp
+"""
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class TaskCancelled(Exception):
+    """Công việc bị người dùng hủy"""
+    pass
+
+
+class WorkerTask:
+    """
+    Handle of a submitted task
+    Một công việc đã gửi vào WorkerPool (trạng thái, tiến độ, hủy)
+    """
+
+    def __init__(self, task_id: int, name: str):
+        self.id = task_id
+        self.name = name
+        self.state = 'queued'  # queued, running, done, failed, cancelled
+        self.done = 0
+        self.total = 0
+        self.message = ''
+        self._cancel_event = threading.Event()
+        self._future = None
+        self._pool: Optional['WorkerPool'] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Người dùng đã yêu cầu hủy hay chưa"""
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        """Yêu cầu hủy (công việc chưa chạy sẽ không bao giờ chạy)"""
+        self._cancel_event.set()
+        if self.state == 'queued' and self._future is not None and self._future.cancel():
+            self._pool._post(self, 'cancelled', None)
+
+    def report_progress(self, done: int, total: int, message: str = '') -> bool:
+        """
+        Report progress from the worker thread
+        Báo tiến độ từ luồng nền (dùng được làm progress callback của controller)
+
+        Returns:
+            False nếu công việc đã bị hủy (controller dừng lại và trả kết quả đến thời điểm đó)
+        """
+        self.done, self.total, self.message = done, total, message
+        self._pool._post(self, 'progress', (done, total, message))
+        return not self.cancelled
+
+    def check_cancelled(self) -> None:
+        """Ném TaskCancelled nếu công việc đã bị hủy"""
+        if self.cancelled:
+            raise TaskCancelled(self.name)
+
+
+class WorkerPool:
+    """
+    Thread pool whose callbacks are marshalled back to the caller thread
+    Nhóm luồng nền, callback được chuyển về luồng gọi pump()
+
+    Cách sử dụng (Tkinter):
+        pool = WorkerPool(2)
+        pool.submit("Recognize", lambda task: controller.recognize(...), on_done=show_result)
+        root.after(50, pump_loop)  # pump_loop gọi pool.pump() rồi tự lên lịch lại
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="gui-worker")
+        self._events: "queue.Queue" = queue.Queue()
+        self._callbacks: Dict[int, Dict[str, Optional[Callable]]] = {}
+        self._tasks: Dict[int, WorkerTask] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        name: str,
+        fn: Callable[[WorkerTask], Any],
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        on_progress: Optional[Callable[[int, int, str], None]] = None,
+        on_cancel: Optional[Callable[[], None]] = None
+    ) -> WorkerTask:
+        """
+        Queue a task; callbacks run later on the thread calling pump()
+        Đưa công việc vào hàng đợi; callback chạy trên luồng gọi pump()
+
+        Args:
+            name: Tên hiển thị của công việc
+            fn: Hàm chạy trên luồng nền, nhận WorkerTask (để báo tiến độ/kiểm tra hủy)
+            on_done: Nhận kết quả của fn
+            on_error: Nhận exception nếu fn lỗi
+            on_progress: Nhận (done, total, message) (chỉ lần báo mới nhất giữa hai lần pump)
+            on_cancel: Gọi khi công việc bị hủy trước khi chạy hoặc fn ném TaskCancelled
+
+        Returns:
+            WorkerTask để theo dõi hoặc hủy
+        """
+        task = WorkerTask(next(self._ids), name)
+        task._pool = self
+        with self._lock:
+            self._tasks[task.id] = task
+            self._callbacks[task.id] = {
+                'done': on_done,
+                'failed': on_error,
+                'progress': on_progress,
+                'cancelled': on_cancel
+            }
+        task._future = self._executor.submit(self._run, task, fn)
+        return task
+
+    def pump(self) -> int:
+        """
+        Dispatch queued results and progress on the calling thread
+        Gọi các callback đang chờ trên luồng hiện tại
+
+        Returns:
+            Số sự kiện đã xử lý
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+
+        # Chỉ giữ lần báo tiến độ mới nhất của mỗi công việc
+        latest_progress = {}
+        for index, (task, kind, _) in enumerate(events):
+            if kind == 'progress':
+                latest_progress[task.id] = index
+
+        for index, (task, kind, payload) in enumerate(events):
+            if kind == 'progress' and latest_progress.get(task.id) != index:
+                continue
+            with self._lock:
+                callbacks = self._callbacks.get(task.id, {})
+                if kind != 'progress':
+                    # Công việc đã kết thúc, bỏ theo dõi
+                    self._callbacks.pop(task.id, None)
+                    self._tasks.pop(task.id, None)
+            callback = callbacks.get(kind)
+            if callback is None:
+                continue
+            try:
+                if kind == 'progress':
+                    callback(*payload)
+                elif kind == 'cancelled':
+                    callback()
+                else:
+                    callback(payload)
+            except Exception as e:
+                print(f"⚠ Worker callback for '{task.name}' failed: {str(e)}")
+        return len(events)
+
+    def active_tasks(self) -> List[WorkerTask]:
+        """Các công việc đang chờ hoặc đang chạy"""
+        with self._lock:
+            return list(self._tasks.values())
+
+    def cancel_all(self) -> None:
+        """Yêu cầu hủy mọi công việc chưa kết thúc"""
+        for task in self.active_tasks():
+            task.cancel()
+
+    def shutdown(self) -> None:
+        """Hủy mọi công việc và dừng nhóm luồng (không chờ công việc đang chạy)"""
+        self.cancel_all()
+        self._executor.shutdown(wait=False)
+
+    def _run(self, task: WorkerTask, fn: Callable[[WorkerTask], Any]) -> None:
+        """Chạy công việc trên luồng nền và gửi kết quả về hàng đợi"""
+        if task.cancelled:
+            self._post(task, 'cancelled', None)
+            return
+        task.state = 'running'
+        try:
+            result = fn(task)
+        except TaskCancelled:
+            self._post(task, 'cancelled', None)
+        except Exception as e:
+            self._post(task, 'failed', e)
+        else:
+            # Công việc bị hủy giữa chừng vẫn trả kết quả đến thời điểm dừng
+            self._post(task, 'done', result)
+
+    def _post(self, task: WorkerTask, kind: str, payload: Any) -> None:
+        """Đưa một sự kiện vào hàng đợi (an toàn đa luồng)"""
+        if kind != 'progress':
+            task.state = kind
+        self._events.put((task, kind, payload))
@@ -41,19 +41,20 @@ class TkinterView:
         self._input_callback = None  # Hàm callback khi có input
         self._input_result = None  # Kết quả input từ người dùng
 
-    def display_menu(self, callback: Callable[[str], None]):
+    def display_menu(self, callback: Callable[[str], None], model_status: Dict[str, Any] = None):
         """
         Hiển thị menu chính dưới dạng các nút bấm
 
         Args:
             callback: Hàm callback được gọi khi người dùng chọn một menu
+            model_status: Trạng thái sẵn sàng của model nhận diện (hiển thị dưới tiêu đề)
         """
         # Xóa tất cả các widget hiện tại trên cửa sổ
         for widget in self.root.winfo_children():
             widget.destroy()
 
         # Tạo khung tiêu đề ở đầu cửa sổ
-        title_frame = tk.Frame(self.root, bg=self.primary_color, height=60)
+        title_frame = tk.Frame(self.root, bg=self.primary_color, height=80)
         title_frame.pack(fill=tk.X)  # Lấp đầy theo chiều ngang
         title_frame.pack_propagate(False)  # Không cho frame tự động thay đổi kích thước
 
@@ -65,7 +66,18 @@ class TkinterView:
             bg=self.primary_color,
             fg="white"
         )
-        title_label.pack(pady=15)
+        title_label.pack(pady=(15, 0))
+
+        # Nhãn trạng thái model (cập nhật khi warm-up trên luồng nền hoàn tất)
+        self.model_status_label = tk.Label(
+            title_frame,
+            text="",
+            font=("Arial", 9),
+            bg=self.primary_color,
+            fg="white"
+        )
+        self.model_status_label.pack()
+        self.update_model_status(model_status)
 
         # Container chính với thanh cuộn
         main_container = tk.Frame(self.root, bg=self.bg_color)
@@ -105,6 +117,9 @@ class TkinterView:
             ("ATTENDANCE", [  # Điểm danh
                 ("7", "Take attendance from image", self.success_color),  # Điểm danh từ ảnh
                 ("8", "Take attendance from webcam", self.success_color),  # Điểm danh từ webcam
+                ("19", "Take attendance from folder", self.success_color),  # Điểm danh hàng loạt từ thư mục
+                ("20", "Take attendance from group photo", self.success_color),  # Điểm danh cả lớp từ một ảnh
+                ("21", "Kiosk mode (continuous webcam)", self.success_color),  # Điểm danh liên tục từ webcam
                 ("9", "View today's attendance", self.primary_color),  # Xem điểm danh hôm nay
                 ("10", "View attendance by date", self.primary_color),  # Xem điểm danh theo ngày
                 ("11", "View student attendance history", self.primary_color),  # Xem lịch sử điểm danh
@@ -155,6 +170,27 @@ class TkinterView:
                 )
                 btn.pack(fill=tk.X, padx=10, pady=5)
 
+    def update_model_status(self, model_status: Dict[str, Any] = None):
+        """
+        Cập nhật nhãn trạng thái sẵn sàng của model
+
+        Args:
+            model_status: Kết quả AttendanceController.get_model_status()
+        """
+        label = getattr(self, 'model_status_label', None)
+        if label is None or not label.winfo_exists():
+            return
+        if not model_status or not model_status.get('success'):
+            label.config(text="")
+            return
+
+        text = {
+            'ready': "✓ ready",
+            'loading': "⏳ warming up...",
+            'failed': "✗ warm-up failed (loads on first use)"
+        }.get(model_status['state'], "… loads on first use")
+        label.config(text=f"Model: {model_status['model']} - {text}")
+
     def display_success(self, message: str):
         """
         Hiển thị thông báo thành công
@@ -606,14 +642,16 @@ class TkinterView:
         )
         close_btn.pack(pady=10)
 
-    def display_models_list(self, models: List[str], current: str = None):
+    def display_models_list(self, models: List[str], current: str = None, resident: Dict[str, float] = None):
         """
         Hiển thị danh sách các mô hình nhận diện có sẵn
 
         Args:
             models: Danh sách tên các mô hình
             current: Mô hình đang được sử dụng hiện tại
+            resident: Dung lượng (MB) của các mô hình đang nạp trong bộ nhớ
         """
+        resident = resident or {}
         win = tk.Toplevel(self.root)
         win.title("Available Models")
         win.geometry("500x400")
@@ -637,7 +675,8 @@ class TkinterView:
         # Hiển thị từng mô hình
         for i, model in enumerate(models, 1):
             marker = " (current)" if model == current else ""  # Đánh dấu mô hình hiện tại
-            model_text = f"{i}. {model}{marker}"
+            loaded = f"  [loaded, {resident[model]:.0f} MB]" if model in resident else ""  # Model đang thường trú
+            model_text = f"{i}. {model}{marker}{loaded}"
 
             # Làm nổi bật mô hình hiện tại bằng màu khác
             if model == current:
@@ -673,13 +712,77 @@ class TkinterView:
         )
         close_btn.pack(pady=10)
 
-    def show_processing(self, message: str = "Processing... Please wait."):
+    def show_processing(self, message: str = "Processing... Please wait.", on_cancel: Callable[[], None] = None) -> tk.Toplevel:
         """
-        Hiển thị thông báo đang xử lý
+        Hiển thị cửa sổ tiến độ không chặn (cửa sổ chính vẫn dùng được)
 
         Args:
             message: Thông điệp xử lý
+            on_cancel: Hàm được gọi khi bấm nút Cancel (không có = không hiện nút)
+
+        Returns:
+            tk.Toplevel: Cửa sổ tiến độ, dùng cho update_processing/close_processing
+        """
+        win = tk.Toplevel(self.root)
+        win.title("Processing")
+        win.geometry("360x140")
+        win.configure(bg=self.bg_color)
+        win.transient(self.root)  # Luôn nằm trên cửa sổ chính nhưng không chặn thao tác
+
+        # Nhãn thông điệp
+        win.message_label = tk.Label(win, text=message, font=("Arial", 10), bg=self.bg_color, wraplength=330)
+        win.message_label.pack(pady=(15, 5))
+
+        # Thanh tiến độ: chạy liên tục cho tới khi biết tổng số
+        win.progress_bar = ttk.Progressbar(win, mode='indeterminate', length=300)
+        win.progress_bar.pack(pady=5)
+        win.progress_bar.start(15)
+
+        if on_cancel:
+            def cancel():
+                cancel_btn.config(state=tk.DISABLED, text="Cancelling...")
+                on_cancel()
+
+            cancel_btn = tk.Button(
+                win,
+                text="Cancel",
+                command=cancel,
+                bg=self.error_color,
+                fg="white",
+                font=("Arial", 10),
+                cursor="hand2",
+                padx=20
+            )
+            cancel_btn.pack(pady=5)
+            # Đóng cửa sổ bằng nút X cũng là hủy
+            win.protocol("WM_DELETE_WINDOW", cancel)
+        else:
+            win.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        return win
+
+    def update_processing(self, win: tk.Toplevel, done: int, total: int, message: str = None):
         """
-        # Tạo cửa sổ thông tin đơn giản
-        self.display_info(message)
+        Cập nhật tiến độ của cửa sổ xử lý
+
+        Args:
+            win: Cửa sổ trả về từ show_processing
+            done: Số phần đã xong
+            total: Tổng số phần (0 = chưa biết)
+            message: Thông điệp mới (không bắt buộc)
+        """
+        if win is None or not win.winfo_exists():
+            return
+        if total > 0:
+            if str(win.progress_bar['mode']) != 'determinate':
+                win.progress_bar.stop()
+                win.progress_bar.config(mode='determinate', maximum=total)
+            win.progress_bar.config(value=done)
+        if message:
+            win.message_label.config(text=message)
+
+    def close_processing(self, win: tk.Toplevel):
+        """Đóng cửa sổ xử lý (bỏ qua nếu đã đóng)"""
+        if win is not None and win.winfo_exists():
+            win.destroy()
 
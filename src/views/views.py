@@ -12,10 +12,12 @@ class ConsoleView:
     """Lớp View hiển thị thông tin trên Console/Terminal"""
 
     @staticmethod
-    def display_menu():
-        """Hiển thị menu chính"""
+    def display_menu(model_status: Dict[str, Any] = None):
+        """Hiển thị menu chính (kèm trạng thái sẵn sàng của model nếu có)"""
         print("\n" + "="*60)
         print("  FACE RECOGNITION ATTENDANCE SYSTEM")
+        if model_status and model_status.get('success'):
+            print(f"  Model: {model_status['model']} - {ConsoleView.format_model_state(model_status['state'])}")
         print("="*60)
         print("\n[STUDENT MANAGEMENT]")  # Quản lý sinh viên
         print("1. Register new student")
@@ -32,6 +34,9 @@ class ConsoleView:
         print("10. View attendance by date")
         print("11. View student attendance history")
         print("12. Generate attendance report")
+        print("16. Take attendance from folder")
+        print("17. Take attendance from group photo")
+        print("18. Kiosk mode (continuous webcam attendance)")
 
         print("\n[SETTINGS]")  # Cài đặt
         print("13. Change recognition model")
@@ -42,6 +47,15 @@ class ConsoleView:
         print("0. Exit")
         print("="*60)
 
+    @staticmethod
+    def format_model_state(state: str) -> str:
+        """Mô tả ngắn trạng thái warm-up của model"""
+        return {
+            'ready': "✓ ready",
+            'loading': "⏳ warming up...",
+            'failed': "✗ warm-up failed (loads on first use)"
+        }.get(state, "… loads on first use")
+
     @staticmethod
     def display_success(message: str):
         """Hiển thị thông báo thành công"""
@@ -172,14 +186,47 @@ class ConsoleView:
         print("-"*60)
 
     @staticmethod
-    def display_models_list(models: List[str], current: str = None):
+    def display_batch_attendance(result: Dict[str, Any]):
+        """Hiển thị kết quả điểm danh hàng loạt"""
+        print("\n" + "-"*60)
+        print(f"BATCH ATTENDANCE ({result['total']} items, {result['elapsed']:.1f}s)")
+        print("-"*60)
+        for item in result['marked']:
+            print(f"✓ {item['image']}: {item['student_name']} ({item['student_id']}) - {item['confidence']:.2%}")
+        for item in result['failed']:
+            print(f"✗ {item['image']}: {item['message']}")
+        print("-"*60)
+
+    @staticmethod
+    def display_kiosk_summary(result: Dict[str, Any]):
+        """Hiển thị kết quả và số liệu từng giai đoạn của phiên kiosk"""
+        print("\n" + "-"*60)
+        print(f"KIOSK SESSION ({len(result['marked'])} students marked)")
+        print("-"*60)
+        for item in result['marked']:
+            print(f"✓ {item['student_name']} ({item['student_id']}) - {item['confidence']:.2%}")
+        print(f"\n{'Stage':<10}{'Processed':>10}{'Dropped':>10}{'Rate/s':>10}")
+        for name, stage in result['stages'].items():
+            print(f"{name:<10}{stage['processed']:>10}{stage['dropped']:>10}{stage['rate']:>10.1f}")
+        tracks = result.get('tracks')
+        if tracks:
+            print(f"\nTracks: {tracks['created']} faces, {tracks['recognitions']} embedded, "
+                  f"{tracks['reused']} reused (box update only)")
+        if result.get('last_error'):
+            print(f"\n⚠ Last error: {result['last_error']}")
+        print("-"*60)
+
+    @staticmethod
+    def display_models_list(models: List[str], current: str = None, resident: Dict[str, float] = None):
         """Hiển thị danh sách các mô hình nhận diện có sẵn"""
+        resident = resident or {}
         print("\n" + "="*60)
         print("AVAILABLE FACE RECOGNITION MODELS")
         print("="*60)
         for i, model in enumerate(models, 1):
             marker = " (current)" if model == current else ""
-            print(f"{i}. {model}{marker}")
+            loaded = f" [loaded, {resident[model]:.0f} MB]" if model in resident else ""
+            print(f"{i}. {model}{marker}{loaded}")
         print("="*60)
 
     @staticmethod